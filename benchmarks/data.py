@@ -0,0 +1,146 @@
+"""Generators of synthetic datasets for the benchmarks.
+
+All datasets are generated with a fixed seed, so that runs on different machines (or commits) process
+exactly the same data.
+"""
+import random
+import zipfile
+from math import cos, sin, pi
+from os import path, listdir
+
+import numpy
+from osgeo import ogr, osr, gdal
+
+# Extent (in the CRS units, traditional axis order) of the generated data, for each supported source CRS.
+EXTENTS = {
+    4326: (19.5, 34.8, 28.2, 41.7),
+    2100: (100000, 3850000, 900000, 4600000),
+    3857: (2170000, 4140000, 3140000, 5120000),
+}
+GEOMETRIES = {
+    'point': ogr.wkbPoint,
+    'line': ogr.wkbLineString,
+    'polygon': ogr.wkbPolygon,
+}
+FIELD_TYPES = [ogr.OFTString, ogr.OFTInteger, ogr.OFTReal, ogr.OFTDate]
+
+def spatialReference(epsg):
+    """Creates the spatial reference of an EPSG code, with the traditional (x, y) axis order."""
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+def _geometry(geometry, rng, extent, vertices):
+    """Creates a random geometry inside extent."""
+    minx, miny, maxx, maxy = extent
+    step = (maxx - minx) / 1000
+    x = rng.uniform(minx, maxx - step)
+    y = rng.uniform(miny, maxy - step)
+    if geometry == 'point':
+        geom = ogr.Geometry(ogr.wkbPoint)
+        geom.AddPoint_2D(x, y)
+        return geom
+    if geometry == 'line':
+        geom = ogr.Geometry(ogr.wkbLineString)
+        for i in range(0, vertices):
+            geom.AddPoint_2D(x + step * i / vertices, y + step * rng.random())
+        return geom
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for i in range(0, vertices):
+        angle = 2 * pi * i / vertices
+        radius = step * (0.5 + rng.random() / 2)
+        ring.AddPoint_2D(x + radius * cos(angle), y + radius * sin(angle))
+    ring.CloseRings()
+    geom = ogr.Geometry(ogr.wkbPolygon)
+    geom.AddGeometry(ring)
+    return geom
+
+def vector(filename, features, geometry='point', fields=10, epsg=2100, driver='GPKG', vertices=16, seed=0):
+    """Generates a vector dataset with random geometries and attributes.
+    Parameters:
+        filename (string): Full path of the dataset.
+        features (int): Number of features.
+        geometry (string): One of point, line, polygon.
+        fields (int): Number of attribute fields (strings, integers, reals and dates, in turn).
+        epsg (int): The CRS of the dataset; one of EXTENTS.
+        driver (string): The GDAL short name of the vector driver.
+        vertices (int): Number of vertices of each line or polygon.
+        seed (int): The seed of the random generator.
+    Returns:
+        (string) The filename.
+    """
+    rng = random.Random(seed)
+    extent = EXTENTS[epsg]
+    options = ['GEOMETRY=AS_WKT'] if driver == 'CSV' else []
+    ds = ogr.GetDriverByName(driver).CreateDataSource(filename)
+    layer = ds.CreateLayer(path.splitext(path.basename(filename))[0], srs=spatialReference(epsg), geom_type=GEOMETRIES[geometry], options=options)
+    for i in range(0, fields):
+        layer.CreateField(ogr.FieldDefn('field_%d' % (i), FIELD_TYPES[i % len(FIELD_TYPES)]))
+    defn = layer.GetLayerDefn()
+    transactions = ds.TestCapability(ogr.ODsCTransactions)
+    if transactions:
+        ds.StartTransaction()
+    feature = ogr.Feature(defn)
+    for n in range(0, features):
+        feature.SetFID(ogr.NullFID)
+        for i in range(0, fields):
+            field_type = FIELD_TYPES[i % len(FIELD_TYPES)]
+            if field_type == ogr.OFTString:
+                feature.SetField(i, 'value %d' % (rng.randrange(1000000)))
+            elif field_type == ogr.OFTInteger:
+                feature.SetField(i, rng.randrange(1000000))
+            elif field_type == ogr.OFTReal:
+                feature.SetField(i, rng.random() * 1000)
+            else:
+                feature.SetField(i, 2000 + rng.randrange(30), 1 + rng.randrange(12), 1 + rng.randrange(28), 0, 0, 0, 0)
+        feature.SetGeometry(_geometry(geometry, rng, extent, vertices))
+        layer.CreateFeature(feature)
+        if transactions and (n + 1) % 100000 == 0:
+            ds.CommitTransaction()
+            ds.StartTransaction()
+    if transactions:
+        ds.CommitTransaction()
+    ds = None
+    return filename
+
+def raster(filename, size, bands=1, dataType='Byte', epsg=2100, driver='GTiff', seed=0):
+    """Generates a raster with random values, georeferenced inside the extent of its CRS.
+    Parameters:
+        filename (string): Full path of the raster.
+        size (int): Width and height in pixels.
+        bands (int): Number of bands.
+        dataType (string): The GDAL data type name (e.g. Byte, UInt16, Float32).
+        epsg (int): The CRS of the raster; one of EXTENTS.
+        driver (string): The GDAL short name of a raster driver supporting Create.
+        seed (int): The seed of the random generator.
+    Returns:
+        (string) The filename.
+    """
+    rng = numpy.random.RandomState(seed)
+    data_type = gdal.GetDataTypeByName(dataType)
+    ds = gdal.GetDriverByName(driver).Create(filename, size, size, bands, data_type, options=['TILED=YES'] if driver == 'GTiff' else [])
+    minx, miny, maxx, maxy = EXTENTS[epsg]
+    # Half of the extent width, so that the raster does not cross the limits of any target CRS.
+    resolution = (maxx - minx) / 2 / size
+    ds.SetGeoTransform([minx, resolution, 0, maxy, 0, -resolution])
+    ds.SetSpatialRef(spatialReference(epsg))
+    rows = max(1, min(size, 4 * 1024 * 1024 // size))
+    for b in range(1, bands + 1):
+        band = ds.GetRasterBand(b)
+        for row in range(0, size, rows):
+            height = min(rows, size - row)
+            if dataType in ['Float32', 'Float64']:
+                block = rng.random_sample((height, size)) * 1000
+            else:
+                block = rng.randint(0, 255, (height, size))
+            band.WriteArray(block, 0, row)
+    ds = None
+    return filename
+
+def archive(filename, directory):
+    """Packs the files of directory in a zip archive, as uploaded by clients."""
+    with zipfile.ZipFile(filename, 'w', compression=zipfile.ZIP_DEFLATED) as handle:
+        for name in sorted(listdir(directory)):
+            handle.write(path.join(directory, name), arcname=name)
+    return filename
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""Benchmark suite of the transform engines.
+
+Generates synthetic vector and raster datasets (see benchmarks.data) and runs vectorTransform, rasterTransform
+and transformProcess (on zipped shapefiles) over a matrix of sizes, geometry types, formats and CRS pairs.
+Each case runs in a fresh process, so that its peak RSS is not inflated by the previous cases; wall time,
+throughput and peak RSS of each case are reported as JSON. Generated datasets are kept in the data directory
+and reused by later runs.
+
+Usage:
+    python -m benchmarks.suite run [--preset small|medium|large] [--repeat N] [--output results.json] [--filter REGEX]
+    python -m benchmarks.suite compare baseline.json current.json [--threshold 0.1] [--rss-threshold 0.2]
+"""
+import argparse
+import json
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import multiprocessing
+from datetime import datetime
+from os import path, makedirs, environ, cpu_count
+from shutil import rmtree
+from tempfile import mkdtemp, gettempdir
+from time import perf_counter
+
+from . import data
+
+# Sizes of the generated datasets: number of features of the vector datasets, width (and height) of the rasters.
+PRESETS = {
+    'small': {'features': [1000, 100000], 'rasters': [1024]},
+    'medium': {'features': [1000, 100000, 1000000], 'rasters': [1024, 4096]},
+    'large': {'features': [1000, 100000, 1000000, 10000000], 'rasters': [1024, 4096, 16384]},
+}
+GEOMETRIES = ['point', 'line', 'polygon']
+VECTOR_FORMATS = ['GPKG', 'ESRI Shapefile', 'CSV', 'GeoJSON']
+RASTER_FORMATS = ['GTiff', 'PNG']
+RASTER_BANDS = [1, 3]
+RASTER_TYPES = ['Byte', 'Float32']
+CRS_PAIRS = ['2100:4326', '4326:3857']
+FIELDS = 20
+
+def cases(args):
+    """Forms the matrix of benchmark cases."""
+    preset = PRESETS[args.preset]
+    pairs = [tuple(int(code) for code in pair.split(':')) for pair in args.crs]
+    matrix = []
+    for features in preset['features']:
+        for geometry in args.geometries:
+            for src_crs, tgt_crs in pairs:
+                for format in args.vector_formats:
+                    matrix.append({'engine': 'vector', 'features': features, 'geometry': geometry, 'format': format, 'src_crs': src_crs, 'tgt_crs': tgt_crs})
+                matrix.append({'engine': 'process', 'features': features, 'geometry': geometry, 'format': args.vector_formats[0], 'src_crs': src_crs, 'tgt_crs': tgt_crs})
+    for size in preset['rasters']:
+        for bands in RASTER_BANDS:
+            for data_type in RASTER_TYPES:
+                for src_crs, tgt_crs in pairs:
+                    for format in args.raster_formats:
+                        if format == 'PNG' and data_type != 'Byte':
+                            continue
+                        matrix.append({'engine': 'raster', 'size': size, 'bands': bands, 'type': data_type, 'format': format, 'src_crs': src_crs, 'tgt_crs': tgt_crs})
+    for case in matrix:
+        case['id'] = caseId(case)
+    if args.filter:
+        matrix = [case for case in matrix if re.search(args.filter, case['id'])]
+    return matrix
+
+def caseId(case):
+    """Identifies a case across runs."""
+    if case['engine'] == 'raster':
+        dataset = '%dpx/%db/%s' % (case['size'], case['bands'], case['type'])
+    else:
+        dataset = '%s/%d' % (case['geometry'], case['features'])
+    return '%s/%s/%s/%d-%d' % (case['engine'], dataset, case['format'].replace(' ', '_'), case['src_crs'], case['tgt_crs'])
+
+def source(case, data_dir):
+    """Generates (once) the source dataset of a case.
+    Returns:
+        (string) Full path of the dataset.
+    """
+    if case['engine'] == 'raster':
+        filename = path.join(data_dir, 'raster_%d_%d_%s_%d.tif' % (case['size'], case['bands'], case['type'], case['src_crs']))
+        if not path.isfile(filename):
+            data.raster(filename, case['size'], bands=case['bands'], dataType=case['type'], epsg=case['src_crs'])
+        return filename
+    name = '%s_%d_%d' % (case['geometry'], case['features'], case['src_crs'])
+    if case['engine'] == 'vector':
+        filename = path.join(data_dir, name + '.gpkg')
+        if not path.isfile(filename):
+            data.vector(filename, case['features'], geometry=case['geometry'], fields=FIELDS, epsg=case['src_crs'])
+        return filename
+    filename = path.join(data_dir, name + '.zip')
+    if not path.isfile(filename):
+        directory = path.join(data_dir, name)
+        makedirs(directory, exist_ok=True)
+        data.vector(path.join(directory, name + '.shp'), case['features'], geometry=case['geometry'], fields=FIELDS, epsg=case['src_crs'], driver='ESRI Shapefile')
+        data.archive(filename, directory)
+        rmtree(directory)
+    return filename
+
+def runCase(case, src, packaging, queue):
+    """Runs a case in the current (fresh) process, and puts its measurements in queue."""
+    from osgeo import gdal
+    gdal.UseExceptions()
+    environ.setdefault('OUTPUT_DIR', gettempdir())
+    from transform.gdal_transform import vectorTransform, rasterTransform
+    working_path = mkdtemp()
+    tgt = path.join(working_path, 'results', 'benchmark')
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        start = perf_counter()
+        if case['engine'] == 'vector':
+            vectorTransform(src, tgt, srcCRS=case['src_crs'], tgtCRS=case['tgt_crs'], tgtFormat=case['format'], packaging=packaging)
+        elif case['engine'] == 'raster':
+            rasterTransform(src, tgt, srcCRS=case['src_crs'], tgtCRS=case['tgt_crs'], tgtFormat=case['format'], packaging=packaging)
+        else:
+            from transform.app import transformProcess
+            makedirs(path.join(working_path, 'src'))
+            gdal_params = {'type': 'vector', 'srcCRS': case['src_crs'], 'tgtCRS': case['tgt_crs'], 'tgtFormat': case['format'], 'packaging': packaging}
+            transformProcess(src, working_path, 'benchmark', gdal_params)
+        wall_time = perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put({'wall_time': wall_time, 'peak_rss_mb': peak / 1024, 'rss_growth_mb': (peak - baseline) / 1024})
+    except Exception as e:
+        queue.put({'error': str(e)})
+    finally:
+        rmtree(working_path, ignore_errors=True)
+
+def measure(case, src, packaging, repeat):
+    """Runs a case repeat times, each one in a fresh process.
+    Returns:
+        (dict) The case with its median wall time, throughput and maximum peak RSS.
+    """
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for i in range(0, repeat):
+        queue = context.Queue()
+        process = context.Process(target=runCase, args=(case, src, packaging, queue))
+        process.start()
+        run = queue.get()
+        process.join()
+        if 'error' in run:
+            return dict(case, error=run['error'])
+        runs.append(run)
+    wall_time = statistics.median(run['wall_time'] for run in runs)
+    result = dict(case, wall_time=round(wall_time, 4), runs=[round(run['wall_time'], 4) for run in runs],
+        peak_rss_mb=round(max(run['peak_rss_mb'] for run in runs), 1), rss_growth_mb=round(max(run['rss_growth_mb'] for run in runs), 1))
+    if case['engine'] == 'raster':
+        result['throughput'] = round(case['size'] * case['size'] * case['bands'] / wall_time / 1e6, 3)
+        result['throughput_unit'] = 'Mpixels/s'
+    else:
+        result['throughput'] = round(case['features'] / wall_time, 1)
+        result['throughput_unit'] = 'features/s'
+    return result
+
+def metadata(args):
+    """Describes the environment of a run."""
+    from osgeo import gdal
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'gdal': gdal.VersionInfo('RELEASE_NAME'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': cpu_count(),
+        'preset': args.preset,
+        'repeat': args.repeat,
+        'packaging': args.packaging,
+    }
+
+def run(args):
+    data_dir = args.data_dir or path.join(gettempdir(), 'transform-benchmarks')
+    makedirs(data_dir, exist_ok=True)
+    results = []
+    for case in cases(args):
+        src = source(case, data_dir)
+        result = measure(case, src, args.packaging, args.repeat)
+        print('%-60s %s' % (case['id'], result.get('error') or '%.3fs %s %s, %.1f MB' % (result['wall_time'], result['throughput'], result['throughput_unit'], result['peak_rss_mb'])), file=sys.stderr)
+        results.append(result)
+    report = json.dumps({'meta': metadata(args), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(report)
+    else:
+        print(report)
+
+def compare(args):
+    """Compares two runs; exits with status 1 if any case has regressed."""
+    with open(args.baseline) as handle:
+        baseline = {result['id']: result for result in json.load(handle)['results']}
+    with open(args.current) as handle:
+        current = {result['id']: result for result in json.load(handle)['results']}
+    regressions = 0
+    for id in sorted(set(baseline) | set(current)):
+        old = baseline.get(id)
+        new = current.get(id)
+        if old is None or new is None:
+            print('%-60s %s' % (id, 'new' if old is None else 'missing'))
+            continue
+        if 'error' in old or 'error' in new:
+            print('%-60s error: %s' % (id, new.get('error') or old.get('error')))
+            continue
+        time_ratio = new['wall_time'] / old['wall_time'] if old['wall_time'] > 0 else 1
+        rss_ratio = new['peak_rss_mb'] / old['peak_rss_mb'] if old['peak_rss_mb'] > 0 else 1
+        flags = []
+        if time_ratio > 1 + args.threshold:
+            flags.append('SLOWER')
+        if rss_ratio > 1 + args.rss_threshold:
+            flags.append('MORE MEMORY')
+        if len(flags) > 0:
+            regressions += 1
+        print('%-60s time %+.1f%% (%.3fs -> %.3fs), rss %+.1f%% %s' % (id, (time_ratio - 1) * 100, old['wall_time'], new['wall_time'], (rss_ratio - 1) * 100, ' '.join(flags)))
+    print('%d regressions.' % (regressions))
+    sys.exit(1 if regressions > 0 else 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the transform engines.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--preset', choices=PRESETS.keys(), default='small', help='Dataset sizes.')
+    run_parser.add_argument('--repeat', type=int, default=3, help='Runs of each case; the median wall time is reported.')
+    run_parser.add_argument('--geometries', nargs='+', choices=GEOMETRIES, default=GEOMETRIES)
+    run_parser.add_argument('--vector-formats', nargs='+', default=VECTOR_FORMATS)
+    run_parser.add_argument('--raster-formats', nargs='+', default=RASTER_FORMATS)
+    run_parser.add_argument('--crs', nargs='+', default=CRS_PAIRS, help='Source:target EPSG codes; sources one of %s.' % (', '.join(str(code) for code in data.EXTENTS)))
+    run_parser.add_argument('--packaging', default='tar', help='The packaging codec of the results.')
+    run_parser.add_argument('--filter', help='Run only the cases whose id matches this regular expression.')
+    run_parser.add_argument('--data-dir', help='Where the generated datasets are kept.')
+    run_parser.add_argument('--output', help='Write the JSON report to this file.')
+    compare_parser = subparsers.add_parser('compare', help='Compare two runs.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='Relative wall time increase considered a regression.')
+    compare_parser.add_argument('--rss-threshold', type=float, default=0.2, help='Relative peak RSS increase considered a regression.')
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+if __name__ == '__main__':
+    main()
@@ -34,10 +34,26 @@ export FLASK_APP="transform"
 export DATABASE="./transform.sqlite"
 export SECRET_KEY="$(cat ${SECRET_KEY_FILE})"
 
+# Metrics of all processes are aggregated through this directory
+
+if [ -z "${PROMETHEUS_MULTIPROC_DIR}" ]; then
+    export PROMETHEUS_MULTIPROC_DIR="/tmp/transform-metrics"
+fi
+if [ "${1}" != "worker" ]; then
+    rm -rf ${PROMETHEUS_MULTIPROC_DIR}
+fi
+mkdir -p ${PROMETHEUS_MULTIPROC_DIR}
+
 # Initialize database
 
 flask init-db
 
+# Run standalone workers for the database job queue
+
+if [ "${1}" = "worker" ]; then
+    exec flask transform-worker --concurrency ${WORKER_CONCURRENCY:-2}
+fi
+
 # Configure and start WSGI server
 
 if [ "${FLASK_ENV}" == "development" ]; then
@@ -46,6 +62,8 @@ if [ "${FLASK_ENV}" == "development" ]; then
 fi
 
 num_workers="4"
+# Threads per worker; long-poll and event stream status requests hold a thread while waiting.
+num_threads="${GUNICORN_THREADS:-16}"
 server_port="5000"
 gunicorn_ssl_options=
 if [ -n "${TLS_CERTIFICATE}" ] && [ -n "${TLS_KEY}" ]; then
@@ -54,6 +72,7 @@ if [ -n "${TLS_CERTIFICATE}" ] && [ -n "${TLS_KEY}" ]; then
 fi
 
 exec gunicorn --log-config ${LOGGING_FILE_CONFIG} --access-logfile - \
-  --workers ${num_workers} \
+  --config python:transform.gunicorn_config \
+  --workers ${num_workers} --threads ${num_threads} \
   --bind "0.0.0.0:${server_port}" ${gunicorn_ssl_options} \
   transform.app:app
@@ -1,9 +1,15 @@
 import logging
 import json
+import io
+import tarfile
 from os import path, getenv
 from time import sleep
+from tempfile import gettempdir
 
 from transform.app import app
+from transform import db
+from transform import profiling
+from transform.retention import evictResult
 
 # Setup/Teardown
 
@@ -58,6 +64,34 @@ def test_post_transform_2():
         assert res.get_json() is None
         assert res.is_streamed
 
+def test_post_transform_5():
+    """Functional Test: POST transform with vector file; prompt response type; zip packaging"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(shape_gz, 'rb'), 'shape.tar.gz'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'response': 'prompt',
+            'packaging': 'zip',
+            'compression_level': '1'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        assert res.is_streamed
+        assert res.headers['Content-Disposition'].endswith('.zip')
+
+def test_post_transform_6():
+    """Functional Test: POST transform with invalid packaging parameters"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(shape_gz, 'rb'), 'shape.tar.gz'),
+            'src_type': 'vector',
+            'packaging': 'gzip',
+            'compression_level': '42'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
 def test_post_transform_3():
     """Functional Test: POST transform client error"""
     with app.test_client() as client:
@@ -88,12 +122,324 @@ def test_post_transform_4():
     sleep(0.5)
     assert path.isfile(filepath)
 
+def test_post_transform_creation_options_1():
+    """Functional Test: POST transform into COG with creation options; invalid options are rejected"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'to': 'EPSG:3857',
+            'format': 'COG',
+            'creation_options': '{"COMPRESS": "LZW", "BLOCKSIZE": 256}'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'format': 'COG',
+            'creation_options': 'COMPRESS=NO_SUCH_CODEC'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_transform_preset_1():
+    """Functional Test: POST transform with an output preset; GET presets"""
+    with app.test_client() as client:
+        res = client.get('/presets')
+        assert res.status_code == 200
+        assert res.get_json()['geopackage']['format'] == 'GPKG'
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'preset': 'geopackage',
+            'layer_options': 'GEOMETRY_NAME=the_geom'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'preset': 'cog'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_transform_targets_1():
+    """Functional Test: POST transform with multiple targets"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'targets': json.dumps([{'to': 'EPSG:3857', 'format': 'GPKG'}, {'to': 'EPSG:4326', 'format': 'GeoJSON'}, {'preset': 'shapefile'}]),
+            'archive': 'separate'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'format': 'CSV',
+            'targets': json.dumps([{'format': 'GPKG', 'layer_options': {'UNKNOWN_OPTION': 'YES'}}])
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_transform_filters_1():
+    """Functional Test: POST transform with a bounding box, an attribute filter and a field selection"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'format': 'GPKG',
+            'bbox': '5300000,0,5600000,60000',
+            'bbox_crs': 'target',
+            'where': "Name <> 'Third point'",
+            'fields': 'Name'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'where': "Name <> 'Third point'"
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_transform_window_1():
+    """Functional Test: POST transform of a raster into a coarser output grid"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'to': 'EPSG:3857',
+            'format': 'GTiff',
+            'size': '64,0',
+            'resampling': 'average'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'size': '64,64',
+            'resolution': '100'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_batch_1():
+    """Functional Test: POST a batch of uploaded files and server-side paths; GET its status and combined results"""
+    with app.test_client() as client:
+        data = {
+            'resource': [(open(geojson_sample, 'rb'), 'geo.json'), (open(csv_sample, 'rb'), 'geo.csv')],
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'items': json.dumps([{'file': 'geo.json'}, {'file': 'geo.csv', 'from': 'EPSG:3857', 'to': 'EPSG:4326'}, {'resource': shape_gz, 'format': 'GPKG'}])
+        }
+        res = client.post('/batch', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        r = res.get_json()
+        assert len(r['tickets']) == 3
+        assert r['tickets'][2].get('filepath') is not None
+        batch = r['batch']
+    sleep(1)
+    with app.test_client() as client:
+        res = client.get('/batch/%s' % (batch))
+        assert res.status_code == 200
+        r = res.get_json()
+        assert r['completed'] and r['succeeded'] == 3
+        res = client.get('/batch/%s/resource' % (batch))
+        assert res.status_code == 200
+        with tarfile.open(fileobj=io.BytesIO(res.data)) as tar:
+            manifest = json.load(tar.extractfile('manifest.json'))
+            assert [entry['item'] for entry in manifest] == [0, 1, 2]
+            assert all(entry['file'] in tar.getnames() for entry in manifest)
+
+def test_post_batch_2():
+    """Functional Test: POST a batch with an invalid item; no item is submitted"""
+    with app.test_client() as client:
+        data = {
+            'resource': [(open(geojson_sample, 'rb'), 'geo.json')],
+            'src_type': 'vector',
+            'items': json.dumps([{'file': 'geo.json'}, {'file': 'missing.json'}, {'file': 'geo.json', 'to': 'unknown'}])
+        }
+        res = client.post('/batch', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+        assert set(res.get_json()['items'].keys()) == {'1', '2'}
+        res = client.get('/batch/batch')
+        assert res.status_code == 404
+
 def test_get_status_1():
     """Functional Test: GET status of a ticket"""
     with app.test_client() as client:
         res = client.get('/status/ticket')
         assert res.status_code == 404
 
+def test_post_status_1():
+    """Functional Test: POST status of many tickets"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'response': 'deferred'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        ticket = res.get_json().get('ticket')
+    sleep(0.5)
+    with app.test_client() as client:
+        res = client.post('/status', json={'tickets': [ticket, 'ticket']})
+        assert res.status_code == 200
+        r = res.get_json()
+        assert r[ticket].get('completed')
+        assert r['ticket'] is None
+        res = client.post('/status', json={})
+        assert res.status_code == 400
+
+def test_get_status_wait_1():
+    """Functional Test: long-poll status and status event stream until the ticket is completed"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:2100',
+            'response': 'deferred',
+            'packaging': 'tar'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        ticket = res.get_json().get('ticket')
+        res = client.get('/status/%s' % (ticket), query_string={'wait': 30})
+        assert res.status_code == 200
+        assert res.get_json().get('completed')
+        res = client.get('/status/%s/events' % (ticket))
+        assert res.status_code == 200
+        assert res.mimetype == 'text/event-stream'
+        event = res.get_data(as_text=True).strip().split('\n')
+        assert event[0] == 'event: status'
+        assert json.loads(event[1][len('data: '):]).get('completed')
+        res = client.get('/status/%s' % (ticket), query_string={'wait': 'never'})
+        assert res.status_code == 400
+        res = client.get('/status/%s' % ('0' * 32), query_string={'wait': 1})
+        assert res.status_code == 404
+        res = client.get('/status/%s/events' % ('0' * 32))
+        assert res.status_code == 404
+
+def test_post_transform_webhook_1():
+    """Functional Test: POST transform with webhook; invalid webhook, internal host or prompt response"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'response': 'deferred',
+            'webhook': 'ftp://example.com/hook'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+        data['resource'] = (open(geojson_sample, 'rb'), 'geo.json')
+        data['webhook'] = 'http://example.com/hook'
+        data['response'] = 'prompt'
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+        # Hosts of the internal network are rejected
+        for webhook in ['http://127.0.0.1:5000/hook', 'http://localhost/hook', 'http://169.254.169.254/latest', 'http://10.0.0.1/hook', 'http://[::1]/hook']:
+            data['resource'] = (open(geojson_sample, 'rb'), 'geo.json')
+            data['webhook'] = webhook
+            data['response'] = 'deferred'
+            res = client.post('/transform', data=data, content_type='multipart/form-data')
+            assert res.status_code == 400
+
+def test_get_metrics_1():
+    """Functional Test: GET metrics after a transform"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'response': 'prompt'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 200
+        res = client.get('/metrics')
+        assert res.status_code == 200
+        content = res.get_data(as_text=True)
+        assert 'transform_request_duration_seconds_count{format="native",response="prompt",src_type="vector"}' in content
+        assert 'transform_jobs_total' in content
+        assert 'transform_disk_usage_bytes{directory="output"}' in content
+
+def test_get_status_timings_1():
+    """Functional Test: the status of a completed ticket contains the timing of each stage"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(raster_sample, 'rb'), 'geo.tif'),
+            'src_type': 'raster',
+            'to': 'EPSG:3857',
+            'response': 'deferred'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        ticket = res.get_json().get('ticket')
+        res = client.get('/status/%s' % (ticket), query_string={'wait': 30})
+        assert res.status_code == 200
+        timings = res.get_json().get('timings')
+        for stage in ['queue', 'upload', 'opening', 'transforming', 'packaging', 'move']:
+            assert stage in timings
+
+def test_post_transform_reduction_1():
+    """Functional Test: POST transform with rounded coordinates and simplification; the status reports the sizes"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'format': 'GeoJSON',
+            'grid_size': '0.5',
+            'simplify': '1',
+            'response': 'deferred'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        ticket = res.get_json().get('ticket')
+        res = client.get('/status/%s' % (ticket), query_string={'wait': 30})
+        assert res.status_code == 200
+        size = res.get_json().get('size')
+        assert size['source'] > 0 and size['output'] > 0 and size['result'] > 0
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'precision': '2',
+            'grid_size': '0.5'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+
+def test_post_transform_profile_1():
+    """Functional Test: profiling requires the admin token; the profile of a ticket not profiled is not found"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'response': 'deferred',
+            'profile': 'true'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 400
+        res = client.get('/admin/profile/ticket')
+        assert res.status_code == 403
+        # A ticket without a profile
+        token, profiling.ADMIN_TOKEN = profiling.ADMIN_TOKEN, 'secret'
+        try:
+            res = client.get('/admin/profile/ticket', headers={'X-Admin-Token': 'secret'})
+            assert res.status_code == 404
+        finally:
+            profiling.ADMIN_TOKEN = token
+        res = client.get('/')
+        assert '/admin/profile/{ticket}' in res.get_json().get('paths')
+
 def test_get_resource_1():
     """Functional Test: GET status of non existent resource"""
     with app.test_client() as client:
@@ -125,3 +471,108 @@ def test_get_status_and_resource_1():
         assert res_endpoint.status_code == 200
         assert res_endpoint.get_json() is None
         assert res_endpoint.is_streamed
+
+def test_get_resource_2():
+    """Functional Test: GET resource with conditional and range requests"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:3857',
+            'response': 'deferred'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        endpoint = res.get_json().get('endpoint')
+    sleep(0.5)
+    with app.test_client() as client:
+        res = client.get(endpoint)
+        assert res.status_code == 200
+        assert res.headers.get('Accept-Ranges') == 'bytes'
+        etag = res.headers.get('ETag')
+        assert etag is not None and res.headers.get('Last-Modified') is not None
+        content = res.get_data()
+        res = client.get(endpoint, headers={'If-None-Match': etag})
+        assert res.status_code == 304
+        res = client.get(endpoint, headers={'Range': 'bytes=10-'})
+        assert res.status_code == 206
+        assert res.get_data() == content[10:]
+        assert res.headers.get('Content-Range') == 'bytes 10-%d/%d' % (len(content) - 1, len(content))
+
+def test_get_resource_evicted_1():
+    """Functional Test: GET resource and status of an evicted result"""
+    with app.test_client() as client:
+        data = {
+            'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+            'src_type': 'vector',
+            'to': 'EPSG:2100',
+            'response': 'deferred'
+        }
+        res = client.post('/transform', data=data, content_type='multipart/form-data')
+        assert res.status_code == 202
+        ticket = res.get_json().get('ticket')
+    sleep(0.5)
+    with app.app_context():
+        dbc = db.get_db()
+        evictResult(dbc, dbc.execute('SELECT ticket, result FROM tickets WHERE ticket=?;', [ticket]).fetchone(), 'age')
+        dbc.commit()
+    with app.test_client() as client:
+        res = client.get('/resource/%s' % (ticket))
+        assert res.status_code == 410
+        res = client.get('/status/%s' % (ticket))
+        assert res.get_json().get('evicted')
+
+def test_post_transform_cached_1():
+    """Functional Test: POST the same transform twice; the second is served from the result cache"""
+    tickets = []
+    for i in range(0, 2):
+        with app.test_client() as client:
+            data = {
+                'resource': (open(geojson_sample, 'rb'), 'geo.json'),
+                'src_type': 'vector',
+                'to': 'EPSG:2100',
+                'format': 'CSV',
+                'response': 'deferred'
+            }
+            res = client.post('/transform', data=data, content_type='multipart/form-data')
+            assert res.status_code == 202
+            tickets.append(res.get_json().get('ticket'))
+        sleep(0.5)
+    with app.test_client() as client:
+        res = client.get('/status/%s' % (tickets[1]))
+        assert res.status_code == 200
+        r = res.get_json()
+        assert r.get('completed')
+        assert r.get('success')
+        assert r.get('comment') == 'Cached result.'
+        res = client.get('/resource/%s' % (tickets[1]))
+        assert res.status_code == 200
+    # The working path of the cached ticket is removed at once.
+    assert not path.isdir(path.join(getenv('TEMPDIR') or gettempdir(), 'transform.app', tickets[1]))
+
+def test_post_transform_cached_2():
+    """Functional Test: POST the same resource path twice (deferred); the job of the second is served from the result cache"""
+    tickets = []
+    for i in range(0, 2):
+        with app.test_client() as client:
+            data = {
+                'resource': geojson_sample,
+                'src_type': 'vector',
+                'to': 'EPSG:3035',
+                'format': 'CSV',
+                'response': 'deferred'
+            }
+            res = client.post('/transform', data=data, content_type='multipart/form-data')
+            assert res.status_code == 202
+            tickets.append(res.get_json().get('ticket'))
+        sleep(0.5)
+    sleep(0.5)
+    with app.test_client() as client:
+        res = client.get('/status/%s' % (tickets[1]))
+        assert res.status_code == 200
+        r = res.get_json()
+        assert r.get('completed')
+        assert r.get('success')
+        assert r.get('comment') == 'Cached result.'
+        res = client.get('/resource/%s' % (tickets[1]))
+        assert res.status_code == 200
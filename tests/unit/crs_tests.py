@@ -0,0 +1,49 @@
+import threading
+from os import path
+from tempfile import gettempdir
+
+from transform.crs import resolveCRS, spatialReference, coordinateTransformation
+from transform.gdal_transform import vectorTransform
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+dirname = path.dirname(__file__)
+geojson_sample = path.join(dirname, '..', 'test_data/geo.json')
+tgt = path.join(gettempdir(), 'test_crs')
+custom_crs = '+proj=tmerc +lat_0=0 +lon_0=48 +k=0.9996 +x_0=500000 +y_0=0 +ellps=GRS80 +units=m +no_defs +type=crs'
+
+def test_resolveCRS_1():
+    """Unit Test: resolveCRS with EPSG codes and CRS without EPSG code"""
+    assert resolveCRS('EPSG:3857') == 'EPSG:3857'
+    assert resolveCRS('epsg:2100') == 'EPSG:2100'
+    wkt = resolveCRS(custom_crs)
+    assert wkt is not None and not wkt.startswith('EPSG:')
+    assert resolveCRS(custom_crs) == wkt
+    assert resolveCRS.cache_info().hits > 0
+
+def test_spatialReference_1():
+    """Unit Test: spatial references and transformations are reused within a thread, not across threads"""
+    srs = spatialReference('EPSG:3857')
+    assert spatialReference('EPSG:3857') is srs
+    coordTrans = coordinateTransformation(spatialReference(4326), srs)
+    assert coordinateTransformation(spatialReference(4326), srs) is coordTrans
+    other = []
+    thread = threading.Thread(target=lambda: other.append(spatialReference('EPSG:3857')))
+    thread.start()
+    thread.join()
+    assert other[0] is not srs
+
+def test_vectorTransform_custom_crs_1():
+    """Unit Test: vectorTransform into a CRS without EPSG code"""
+    result = vectorTransform(geojson_sample, tgt, tgtCRS=resolveCRS(custom_crs), tgtFormat='CSV')
+    assert path.isfile(result)
+    assert path.isfile(path.join(tgt, 'geo.csv'))
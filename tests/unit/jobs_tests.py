@@ -0,0 +1,63 @@
+import sqlite3
+from os import path, getpid
+from socket import gethostname
+
+from transform.jobs import push, claim, finish, requeueStale
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+dirname = path.dirname(__file__)
+csv_sample = path.join(dirname, '..', 'test_data/geo.csv')
+schema = path.join(dirname, '..', '..', 'transform', 'schema.sql')
+
+def connect():
+    dbc = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    dbc.row_factory = sqlite3.Row
+    with open(schema) as f:
+        dbc.executescript(f.read())
+    return dbc
+
+def test_claim_1():
+    """Unit Test: queued jobs are claimed once, in order"""
+    dbc = connect()
+    params = {'type': 'vector', 'tgtCRS': 'EPSG:3857'}
+    push(dbc, 'ticket1', csv_sample, '/tmp/ticket1', '210101', params)
+    push(dbc, 'ticket2', csv_sample, '/tmp/ticket2', '210101', params)
+    job = claim(dbc, 'host:1')
+    assert job['ticket'] == 'ticket1'
+    assert job['state'] == 'running' and job['attempts'] == 1
+    assert claim(dbc, 'host:2')['ticket'] == 'ticket2'
+    assert claim(dbc, 'host:3') is None
+    finish(dbc, job['id'])
+    assert dbc.execute('SELECT COUNT(*) AS n FROM jobs;').fetchone()['n'] == 1
+    assert dbc.execute("SELECT status FROM tickets WHERE ticket='ticket1';").fetchone()['status'] == 0
+
+def test_requeueStale_1():
+    """Unit Test: jobs of dead workers are requeued"""
+    dbc = connect()
+    push(dbc, 'ticket1', csv_sample, '/tmp/ticket1', '210101', {'type': 'vector'})
+    job = claim(dbc, '%s:%d' % (gethostname(), 2 ** 22 + 1))
+    assert requeueStale(dbc) == 1
+    assert claim(dbc, 'host:1')['id'] == job['id']
+
+def test_requeueStale_2():
+    """Unit Test: timed out claims are requeued only if their worker cannot be checked"""
+    dbc = connect()
+    push(dbc, 'ticket1', csv_sample, '/tmp/ticket1', '210101', {'type': 'vector'})
+    push(dbc, 'ticket2', csv_sample, '/tmp/ticket2', '210101', {'type': 'vector'})
+    running = claim(dbc, '%s:%d' % (gethostname(), getpid()))
+    remote = claim(dbc, 'remote-host:1')
+    dbc.execute("UPDATE jobs SET claimed_time = datetime('now', '-30 days');")
+    dbc.commit()
+    assert requeueStale(dbc) == 1
+    states = {row['id']: row['state'] for row in dbc.execute('SELECT id, state FROM jobs;')}
+    assert states == {running['id']: 'running', remote['id']: 'queued'}
@@ -0,0 +1,55 @@
+import sqlite3
+from os import path
+
+from osgeo import gdal
+
+from transform.memory import reserve, release, reserved, Sampler
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+dirname = path.dirname(__file__)
+schema = path.join(dirname, '..', '..', 'transform', 'schema.sql')
+MB = 1024 * 1024
+
+def connect():
+    dbc = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    dbc.row_factory = sqlite3.Row
+    with open(schema) as f:
+        dbc.executescript(f.read())
+    return dbc
+
+def test_reserve_1():
+    """Unit Test: jobs are admitted while they fit in the budget, along with the block cache of the process"""
+    dbc = connect()
+    budget = gdal.GetCacheMax() + 1024 * MB
+    assert reserve(dbc, 'ticket1', 600 * MB, budget)
+    assert reserved(dbc) == gdal.GetCacheMax() + 600 * MB
+    assert not reserve(dbc, 'ticket2', 600 * MB, budget)
+    assert reserve(dbc, 'ticket3', 300 * MB, budget)
+    release(dbc, 'ticket1')
+    assert reserve(dbc, 'ticket2', 600 * MB, budget)
+
+def test_reserve_2():
+    """Unit Test: a job larger than the budget is admitted when no other job holds memory"""
+    dbc = connect()
+    assert reserve(dbc, 'ticket1', 4096 * MB, 1024 * MB)
+    assert not reserve(dbc, 'ticket2', 1 * MB, 1024 * MB)
+    release(dbc, 'ticket1')
+    assert reserve(dbc, 'ticket2', 1 * MB, 1024 * MB)
+
+def test_Sampler_1():
+    """Unit Test: Sampler records the growth of the resident memory"""
+    sampler = Sampler(interval=0.01)
+    sampler.start()
+    block = b'x' * (64 * MB)
+    peak = sampler.stop()
+    assert peak is not None and peak >= 32 * MB
@@ -0,0 +1,35 @@
+from osgeo import gdal
+
+from transform.options import parseOptions, validateOptions, formatOptions
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+
+def test_parseOptions_1():
+    """Unit Test: parseOptions with a JSON object and with KEY=VALUE pairs"""
+    assert parseOptions('{"compress": "ZSTD", "BLOCKSIZE": 256, "SPARSE_OK": true}') == {'COMPRESS': 'ZSTD', 'BLOCKSIZE': '256', 'SPARSE_OK': 'YES'}
+    assert parseOptions('COMPRESS=DEFLATE, PREDICTOR=2') == {'COMPRESS': 'DEFLATE', 'PREDICTOR': '2'}
+    assert formatOptions({'COMPRESS': 'DEFLATE'}) == ['COMPRESS=DEFLATE']
+    for value in ['COMPRESS', '[1, 2]', '=ZSTD']:
+        try:
+            parseOptions(value)
+            assert False
+        except ValueError:
+            pass
+
+def test_validateOptions_1():
+    """Unit Test: validateOptions against the creation options of the GTiff driver"""
+    driver = gdal.GetDriverByName('GTiff')
+    assert validateOptions(driver, {'COMPRESS': 'deflate', 'TILED': 'YES', 'BLOCKXSIZE': '256'}) == []
+    assert len(validateOptions(driver, {'COMPRESS': 'UNKNOWN'})) == 1
+    assert len(validateOptions(driver, {'BLOCKXSIZE': 'large'})) == 1
+    assert len(validateOptions(driver, {'NO_SUCH_OPTION': 'YES'})) == 1
@@ -0,0 +1,85 @@
+import io
+import tarfile
+import zipfile
+from os import path, makedirs
+from shutil import copy, rmtree
+from tempfile import gettempdir
+
+from transform.packaging import pack, available, extension, streamTar, BlockGzipWriter
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+dirname = path.dirname(__file__)
+geojson_sample = path.join(dirname, '..', 'test_data/geo.json')
+shape_zip = path.join(dirname, '..', 'test_data/geo.zip')
+src = path.join(gettempdir(), 'test_packaging')
+
+def _prepare():
+    rmtree(src, ignore_errors=True)
+    makedirs(path.join(src, 'sub'))
+    copy(geojson_sample, path.join(src, 'geo.json'))
+    copy(geojson_sample, path.join(src, 'sub', 'geo.json'))
+
+def test_pack_1():
+    """Unit Test: pack with every available tar codec"""
+    _prepare()
+    for codec in [codec for codec in available() if codec != 'zip' and codec != 'zstd']:
+        result = pack(src, codec=codec)
+        assert result == src + extension(codec)
+        with tarfile.open(result) as tar:
+            assert 'geo.json' in tar.getnames()
+            assert 'sub/geo.json' in tar.getnames()
+
+def test_pack_2():
+    """Unit Test: pack with zip codec stores already compressed files"""
+    _prepare()
+    copy(shape_zip, path.join(src, 'geo.zip'))
+    result = pack(src, codec='zip', level=9)
+    with zipfile.ZipFile(result) as handle:
+        assert handle.getinfo('geo.zip').compress_type == zipfile.ZIP_STORED
+        assert handle.getinfo('geo.json').compress_type == zipfile.ZIP_DEFLATED
+        assert handle.getinfo('sub/geo.json').compress_type == zipfile.ZIP_DEFLATED
+
+def test_pack_3():
+    """Unit Test: pack with tar-based codecs stores mostly compressed files, along with small sidecars"""
+    rmtree(src, ignore_errors=True)
+    makedirs(src)
+    for sample in [shape_zip, path.join(dirname, '..', 'test_data/geo.tar.gz'), path.join(dirname, '..', 'test_data/geo.csv')]:
+        copy(sample, src)
+    size = sum(path.getsize(path.join(src, file)) for file in ['geo.zip', 'geo.tar.gz', 'geo.csv'])
+    for codec in ['gzip', 'pgzip']:
+        result = pack(src, codec=codec, level=9)
+        # Stored: the tar headers and padding are not compressed either.
+        assert path.getsize(result) > size + 3 * tarfile.BLOCKSIZE
+        with tarfile.open(result) as tar:
+            assert sorted(tar.getnames()) == ['geo.csv', 'geo.tar.gz', 'geo.zip']
+
+def test_BlockGzipWriter_1():
+    """Unit Test: BlockGzipWriter stops its threads, even when writing fails"""
+    handle = io.BytesIO()
+    try:
+        with BlockGzipWriter(handle, 6, threads=2, block_size=16) as writer:
+            writer.write(b'0123456789' * 10)
+            raise RuntimeError('Writing failed')
+    except RuntimeError:
+        pass
+    assert len(writer.pending) == 0
+    assert writer.pool._shutdown
+
+def test_streamTar_1():
+    """Unit Test: streamTar forms a tar archive of files and in-memory contents, in small chunks"""
+    data = b''.join(streamTar([('manifest.json', b'[]'), ('geo.json', geojson_sample)], chunk_size=16))
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        assert tar.getnames() == ['manifest.json', 'geo.json']
+        assert tar.extractfile('manifest.json').read() == b'[]'
+        with open(geojson_sample, 'rb') as handle:
+            assert tar.extractfile('geo.json').read() == handle.read()
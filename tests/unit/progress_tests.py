@@ -0,0 +1,50 @@
+from transform.progress import Progress
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    pass
+
+# Tests
+
+def test_progress_1():
+    """Unit Test: Progress combines the tasks of each stage into an overall percentage"""
+    reports = []
+    progress = Progress(lambda percent, stage, eta: reports.append((percent, stage, eta)), interval=0)
+    progress.stage('transforming', 0, 90, tasks=2)
+    assert reports[-1] == (0, 'transforming', None)
+    callback = progress.callback(1)
+    assert callback(0.5, '', None) == 1
+    assert reports[-1][0] == 22.5
+    progress.update(0, 1.0)
+    assert reports[-1][0] == 67.5
+    assert reports[-1][2] is not None
+    progress.stage('packaging', 90, 100)
+    assert reports[-1][:2] == (90, 'packaging')
+
+def test_progress_2():
+    """Unit Test: Progress reports are throttled, except at stage changes"""
+    reports = []
+    progress = Progress(lambda percent, stage, eta: reports.append(percent), interval=3600)
+    progress.stage('transforming', 0, 100)
+    for i in range(1, 100):
+        progress.update(0, i / 100)
+    assert reports == [0]
+    progress.stage('packaging', 100, 100)
+    assert reports == [0, 100]
+
+def test_progress_3():
+    """Unit Test: Progress records the time spent in each stage"""
+    progress = Progress(None)
+    progress.stage('transforming', 0, 90)
+    progress.update(0, 0.5)
+    progress.stage('packaging', 90, 100)
+    progress.stage('transforming', 0, 90)
+    timings = progress.finish()
+    assert sorted(timings.keys()) == ['packaging', 'transforming']
+    assert all(seconds >= 0 for seconds in timings.values())
@@ -0,0 +1,83 @@
+import sqlite3
+from os import path, makedirs, getenv, utime
+from shutil import rmtree
+from tempfile import gettempdir
+from time import time
+
+from transform.retention import evictResults, reapWorkingPaths
+
+# Setup/Teardown
+
+def setup_module():
+    print(" == Setting up tests for %s"  % (__name__))
+    pass
+
+def teardown_module():
+    print(" == Tearing down tests for %s"  % (__name__))
+    rmtree(path.join(getenv('OUTPUT_DIR'), 'retention'), ignore_errors=True)
+    rmtree(tempdir, ignore_errors=True)
+
+# Tests
+dirname = path.dirname(__file__)
+schema = path.join(dirname, '..', '..', 'transform', 'schema.sql')
+tempdir = path.join(gettempdir(), 'transform-retention-tests')
+
+def connect():
+    dbc = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+    dbc.row_factory = sqlite3.Row
+    with open(schema) as f:
+        dbc.executescript(f.read())
+    return dbc
+
+def result(dbc, ticket, size, requested_time=None):
+    """Creates the result of a completed ticket."""
+    rel_path = path.join('retention', ticket + '.tar')
+    makedirs(path.join(getenv('OUTPUT_DIR'), 'retention'), exist_ok=True)
+    with open(path.join(getenv('OUTPUT_DIR'), rel_path), 'wb') as handle:
+        handle.write(b'0' * size)
+    dbc.execute("INSERT INTO tickets (ticket, status, success, result, result_size, requested_time) VALUES (?, 1, 1, ?, ?, COALESCE(?, CURRENT_TIMESTAMP));", [ticket, rel_path, size, requested_time])
+    return path.join(getenv('OUTPUT_DIR'), rel_path)
+
+def evicted(dbc, ticket):
+    return dbc.execute('SELECT evicted_time FROM tickets WHERE ticket=?;', [ticket]).fetchone()['evicted_time'] is not None
+
+def test_evictResults_1():
+    """Unit Test: results are evicted by age, and the least recently accessed ones by size"""
+    dbc = connect()
+    old = result(dbc, 'old', 1024, requested_time='2000-01-01 00:00:00')
+    first = result(dbc, 'first', 1024 * 1024)
+    second = result(dbc, 'second', 1024 * 1024)
+    dbc.execute("UPDATE tickets SET requested_time=datetime('now', '-60 seconds') WHERE ticket IN ('first', 'second');")
+    dbc.execute("UPDATE tickets SET accessed_time=CURRENT_TIMESTAMP WHERE ticket='first';")
+    assert evictResults(dbc, max_age=3600, max_idle=0, max_size=0) == 1
+    assert evicted(dbc, 'old') and not path.exists(old)
+    assert evictResults(dbc, max_age=3600, max_idle=0, max_size=1) == 1
+    assert evicted(dbc, 'second') and not path.exists(second)
+    assert not evicted(dbc, 'first') and path.isfile(first)
+
+def test_evictResults_2():
+    """Unit Test: results not accessed (or, if never accessed, requested) for max_idle seconds are evicted"""
+    dbc = connect()
+    idle = result(dbc, 'idle', 1024)
+    accessed = result(dbc, 'accessed', 1024)
+    requested = result(dbc, 'requested', 1024)
+    dbc.execute("UPDATE tickets SET requested_time=datetime('now', '-7200 seconds') WHERE ticket IN ('idle', 'accessed');")
+    dbc.execute("UPDATE tickets SET accessed_time=datetime('now', '-7000 seconds') WHERE ticket='idle';")
+    dbc.execute("UPDATE tickets SET accessed_time=datetime('now', '-60 seconds') WHERE ticket='accessed';")
+    assert evictResults(dbc, max_age=0, max_idle=3600, max_size=0) == 1
+    assert evicted(dbc, 'idle') and not path.exists(idle)
+    assert not evicted(dbc, 'accessed') and path.isfile(accessed)
+    assert not evicted(dbc, 'requested') and path.isfile(requested)
+
+def test_reapWorkingPaths_1():
+    """Unit Test: working directories of completed tickets are removed, those of pending ones are kept"""
+    dbc = connect()
+    for ticket in ['completed', 'pending', 'unknown']:
+        makedirs(path.join(tempdir, ticket, 'src'), exist_ok=True)
+        utime(path.join(tempdir, ticket, 'src'), (time() - 7200, time() - 7200))
+        utime(path.join(tempdir, ticket), (time() - 7200, time() - 7200))
+    dbc.execute("INSERT INTO tickets (ticket, status) VALUES ('completed', 1);")
+    dbc.execute("INSERT INTO tickets (ticket, status) VALUES ('pending', 0);")
+    assert reapWorkingPaths(dbc, tempdir, max_age=3600) == 2
+    assert path.isdir(path.join(tempdir, 'pending'))
+    assert not path.exists(path.join(tempdir, 'completed'))
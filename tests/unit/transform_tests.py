@@ -1,10 +1,15 @@
 import logging
 import json
+import threading
 from os import path, makedirs
+from shutil import copy, rmtree
 from tempfile import gettempdir
 
-from transform.gdal_transform import vectorTransform, rasterTransform
-from transform.app import transformProcess
+from osgeo import ogr, osr, gdal
+
+from transform.gdal_transform import vectorTransform, rasterTransform, reprojectLayer, rasterFootprint, vectorFanout, rasterFanout, layerPartitions, runLayers
+from transform.app import transformProcess, vsiPath
+from transform.progress import Progress
 
 # Setup/Teardown
 
@@ -61,6 +66,171 @@ def test_vectorTransform_3():
     for ext in ['dbf', 'prj', 'shp', 'shx']:
         assert path.isfile(path.join(tgt, "geo.{}".format(ext)))
 
+def test_vectorTransform_4():
+    """Unit Test: vectorTransform from GeoJSON to Shapefile; with reprojection through the translate path"""
+    src = geojson_sample
+    vectorTransform(src, tgt, tgtCRS=3857, tgtFormat='ESRI Shapefile')
+    ds = ogr.Open(path.join(tgt, 'geo.shp'))
+    layer = ds.GetLayer()
+    assert layer.GetFeatureCount() == 3
+    # Traditional GIS order: the first coordinate (48.1E) is the easting.
+    assert abs(layer.GetNextFeature().GetGeometryRef().GetX() - 5354467.5) < 1
+
+def test_vectorTransform_6():
+    """Unit Test: vectorTransform into Shapefile with layer creation options (spatial index)"""
+    for tgtCRS in [None, 3857]:
+        rmtree(tgt, ignore_errors=True)
+        vectorTransform(geojson_sample, tgt, tgtCRS=tgtCRS, tgtFormat='ESRI Shapefile', layerOptions={'SPATIAL_INDEX': 'YES', 'ENCODING': 'UTF-8'})
+        assert path.isfile(path.join(tgt, 'geo.qix'))
+        assert path.isfile(path.join(tgt, 'geo.cpg'))
+
+def test_vectorTransform_7():
+    """Unit Test: vectorTransform with a bounding box (in the source and in the target CRS), an attribute filter and a field selection"""
+    rmtree(tgt, ignore_errors=True)
+    vectorTransform(geojson_sample, tgt, tgtFormat='GPKG', filters={'bbox': [48, 0, 50, 2], 'fields': ['name']})
+    ds = ogr.Open(path.join(tgt, 'geo.gpkg'))
+    layer = ds.GetLayer()
+    assert layer.GetFeatureCount() == 2
+    assert layer.GetLayerDefn().GetFieldIndex('Name') >= 0
+    ds = None
+    rmtree(tgt, ignore_errors=True)
+    vectorTransform(geojson_sample, tgt, tgtCRS=3857, tgtFormat='GPKG', filters={'bbox': [5300000, 0, 5600000, 60000], 'bboxCRS': 3857, 'where': "Name <> 'Third point'"})
+    ds = ogr.Open(path.join(tgt, 'geo.gpkg'))
+    layer = ds.GetLayer()
+    assert layer.GetFeatureCount() == 1
+    assert layer.GetNextFeature().GetField('Name') == 'First point'
+    ds = None
+    rmtree(tgt, ignore_errors=True)
+    vectorFanout(geojson_sample, tgt, [{'tgtCRS': 3857, 'tgtFormat': 'GPKG'}], filters={'bbox': [47, 0, 49, 2], 'bboxCRS': 4326, 'where': "Name = 'Third point'"})
+    ds = ogr.Open(path.join(tgt, 'EPSG_3857_GPKG', 'geo.gpkg'))
+    assert ds.GetLayer().GetFeatureCount() == 1
+    ds = None
+
+def test_vectorTransform_reduction_1():
+    """Unit Test: vectorTransform with coordinates snapped to a grid and rounded to decimals"""
+    rmtree(tgt, ignore_errors=True)
+    vectorTransform(geojson_sample, tgt, tgtCRS=3857, tgtFormat='GeoJSON', reduction={'gridSize': 10, 'simplify': 1})
+    ds = ogr.Open(path.join(tgt, 'geo.geojson'))
+    feature = ds.GetLayer().GetNextFeature()
+    assert feature.GetGeometryRef().GetX() % 10 == 0
+    assert feature.GetField('Name') == 'First point'
+    ds = None
+    rmtree(tgt, ignore_errors=True)
+    vectorTransform(geojson_sample, tgt, tgtFormat='CSV', reduction={'precision': 0})
+    with open(path.join(tgt, 'geo.csv')) as handle:
+        assert 'POINT (48 0)' in handle.read()
+
+def test_reprojectLayer_1():
+    """Unit Test: reprojectLayer into GeoPackage with transactions smaller than the layer"""
+    src_ds = ogr.Open(geojson_sample)
+    layer = src_ds.GetLayer()
+    tgt_spatial_ref = osr.SpatialReference()
+    tgt_spatial_ref.ImportFromEPSG(3857)
+    coordTrans = osr.CoordinateTransformation(layer.GetSpatialRef(), tgt_spatial_ref)
+    makedirs(tgt, exist_ok=True)
+    tgt_ds = ogr.GetDriverByName('GPKG').CreateDataSource(path.join(tgt, 'batched.gpkg'))
+    count = reprojectLayer(layer, tgt_ds, coordTrans, tgt_spatial_ref, batchSize=2)
+    assert count == 3
+    tgt_layer = tgt_ds.GetLayer()
+    assert tgt_layer.GetFeatureCount() == 3
+    feature = tgt_layer.GetNextFeature()
+    assert feature.GetField('Name') == 'First point'
+    tgt_ds = None
+
+def test_vectorTransform_5():
+    """Unit Test: vectorTransform of a directory with many files and a multi-layer GeoPackage; in parallel"""
+    src = path.join(gettempdir(), 'test_multi')
+    tgt_multi = path.join(gettempdir(), 'test_multi_result')
+    rmtree(src, ignore_errors=True)
+    rmtree(tgt_multi, ignore_errors=True)
+    makedirs(src)
+    copy(geojson_sample, path.join(src, 'first.json'))
+    copy(geojson_sample, path.join(src, 'second.json'))
+    geojson_ds = ogr.Open(geojson_sample)
+    gpkg_ds = ogr.GetDriverByName('GPKG').CreateDataSource(path.join(src, 'layers.gpkg'))
+    gpkg_ds.CopyLayer(geojson_ds.GetLayer(), 'third')
+    gpkg_ds.CopyLayer(geojson_ds.GetLayer(), 'fourth')
+    gpkg_ds = None
+    result = vectorTransform(src, tgt_multi, tgtCRS=3857, tgtFormat='CSV', workers=2)
+    assert path.isfile(result)
+    for name in ['first', 'second', 'third', 'fourth']:
+        assert path.isfile(path.join(tgt_multi, '%s.csv' % (name)))
+
+def test_vectorTransform_partitions_1():
+    """Unit Test: vectorTransform of layers split into FID ranges (GeoPackage) and index ranges (Shapefile), by worker processes"""
+    src = path.join(gettempdir(), 'test_partitions')
+    tgt_partitions = path.join(gettempdir(), 'test_partitions_result')
+    rmtree(src, ignore_errors=True)
+    rmtree(tgt_partitions, ignore_errors=True)
+    makedirs(src)
+    geojson_ds = ogr.Open(geojson_sample)
+    gpkg_ds = ogr.GetDriverByName('GPKG').CreateDataSource(path.join(src, 'fids.gpkg'))
+    gpkg_ds.CopyLayer(geojson_ds.GetLayer(), 'fids')
+    gpkg_ds = None
+    shp_ds = ogr.GetDriverByName('ESRI Shapefile').CreateDataSource(path.join(src, 'indices.shp'))
+    shp_ds.CopyLayer(geojson_ds.GetLayer(), 'indices')
+    shp_ds = None
+    assert layerPartitions(path.join(src, 'fids.gpkg'), 'fids', partitionSize=2) == [('fid', 1, 3), ('fid', 3, 4)]
+    assert layerPartitions(path.join(src, 'indices.shp'), 'indices', partitionSize=2) == [('index', 0, 2), ('index', 2, 2)]
+    result = vectorTransform(src, tgt_partitions, tgtCRS=3857, tgtFormat='GPKG', workers=2, partitionSize=1)
+    assert path.isfile(result)
+    for name in ['fids', 'indices']:
+        ds = ogr.Open(path.join(tgt_partitions, '%s.gpkg' % (name)))
+        layer = ds.GetLayer()
+        assert layer.GetFeatureCount() == 3
+        assert [feature.GetField('Name') for feature in layer] == ['First point', 'Second point', 'Third point']
+        ds = None
+    assert not path.isdir(path.join(tgt_partitions, 'fids.gpkg.partitions'))
+    # Drivers that can not append into an existing file
+    rmtree(tgt_partitions, ignore_errors=True)
+    vectorTransform(src, tgt_partitions, tgtCRS=3857, tgtFormat='GeoJSON', workers=2, partitionSize=1)
+    extension = ogr.GetDriverByName('GeoJSON').GetMetadataItem(gdal.DMD_EXTENSIONS).split(' ')[0]
+    for name in ['fids', 'indices']:
+        ds = ogr.Open(path.join(tgt_partitions, '%s.%s' % (name, extension)))
+        assert [feature.GetField('Name') for feature in ds.GetLayer()] == ['First point', 'Second point', 'Third point']
+        ds = None
+
+def test_runLayers_1():
+    """Unit Test: runLayers reuses the threads of the layer pool across jobs, running at most the given number at once"""
+    names = set()
+    def layer(name):
+        names.add(threading.current_thread().name)
+    runLayers(layer, [(('a',), {}), (('b',), {}), (('c',), {})], 2)
+    used = set(names)
+    runLayers(layer, [(('d',), {}), (('e',), {})], 2)
+    assert names == used
+
+def test_vectorFanout_1():
+    """Unit Test: vectorFanout into several CRS and formats, in one archive and in one archive per target"""
+    targets = [{'tgtCRS': 3857, 'tgtFormat': 'GPKG'}, {'tgtCRS': 'EPSG:4326', 'tgtFormat': 'GeoJSON'}, {'tgtFormat': 'CSV'}]
+    tgt_fanout = path.join(gettempdir(), 'test_fanout')
+    rmtree(tgt_fanout, ignore_errors=True)
+    result = vectorFanout(geojson_sample, tgt_fanout, targets, workers=1)
+    assert path.isfile(result)
+    ds = ogr.Open(path.join(tgt_fanout, 'EPSG_3857_GPKG', 'geo.gpkg'))
+    layer = ds.GetLayer()
+    assert layer.GetFeatureCount() == 3
+    assert layer.GetSpatialRef().GetAuthorityCode(None) == '3857'
+    assert layer.GetNextFeature().GetField('Name') == 'First point'
+    ds = None
+    assert path.isfile(path.join(tgt_fanout, 'EPSG_4326_GeoJSON', 'geo.geojson'))
+    assert path.isfile(path.join(tgt_fanout, 'native_CSV', 'geo.csv'))
+    rmtree(tgt_fanout, ignore_errors=True)
+    vectorFanout(geojson_sample, tgt_fanout, targets, separate=True, packaging='zip')
+    assert path.isfile(path.join(tgt_fanout, 'EPSG_3857_GPKG.zip'))
+    assert not path.isdir(path.join(tgt_fanout, 'EPSG_3857_GPKG'))
+
+def test_rasterFanout_1():
+    """Unit Test: rasterFanout into several CRS and formats"""
+    tgt_fanout = path.join(gettempdir(), 'test_fanout')
+    rmtree(tgt_fanout, ignore_errors=True)
+    result = rasterFanout(raster_sample, tgt_fanout, [{'tgtCRS': 3857, 'tgtFormat': 'GTiff'}, {'tgtFormat': 'PNG'}])
+    assert path.isfile(result)
+    ds = gdal.Open(path.join(tgt_fanout, 'EPSG_3857_GTiff', 'geo.tif'))
+    assert ds.GetSpatialRef().GetAuthorityCode(None) == '3857'
+    ds = None
+    assert path.isfile(path.join(tgt_fanout, 'native_PNG', 'geo.png'))
+
 def test_rasterTransform_1():
     """Unit Test: rasterTransform from geoTiff to PNG; with reprojection"""
     src = raster_sample
@@ -68,6 +238,68 @@ def test_rasterTransform_1():
     assert path.isdir(tgt)
     assert path.isfile(path.join(tgt, 'geo.png'))
 
+def test_rasterTransform_window_1():
+    """Unit Test: rasterTransform of a window of the source, and into a given size"""
+    ds = gdal.Open(raster_sample)
+    minx, xres, _, maxy, _, yres = ds.GetGeoTransform()
+    width = ds.RasterXSize // 2
+    height = ds.RasterYSize // 2
+    ds = None
+    rmtree(tgt, ignore_errors=True)
+    rasterTransform(raster_sample, tgt, tgtFormat='GTiff', window={'bbox': [minx, maxy + yres * height, minx + xres * width, maxy]})
+    ds = gdal.Open(path.join(tgt, 'geo.tif'))
+    assert ds.RasterXSize == width and ds.RasterYSize == height
+    ds = None
+    rmtree(tgt, ignore_errors=True)
+    rasterTransform(raster_sample, tgt, tgtCRS=3857, tgtFormat='GTiff', resampling='average', window={'size': [32, 0]})
+    ds = gdal.Open(path.join(tgt, 'geo.tif'))
+    assert ds.RasterXSize == 32
+    ds = None
+
+def test_rasterTransform_2():
+    """Unit Test: rasterTransform from geoTiff to geoTiff; with reprojection warped directly into the target"""
+    src = raster_sample
+    result = rasterTransform(src, tgt, tgtCRS=3857, tgtFormat="GTiff", resampling='bilinear', warpThreads='2', warpMemory=64, errorThreshold=0)
+    assert path.isfile(result)
+    ds = gdal.Open(path.join(tgt, 'geo.tif'))
+    assert ds.GetSpatialRef().GetAuthorityCode(None) == '3857'
+    ds = None
+
+def test_progress_1():
+    """Unit Test: vectorTransform and rasterTransform report their progress through the stages"""
+    for transform, src in [(vectorTransform, geojson_sample), (rasterTransform, raster_sample)]:
+        reports = []
+        progress = Progress(lambda percent, stage, eta: reports.append((percent, stage)), interval=0)
+        transform(src, tgt, tgtCRS=3857, progress=progress)
+        stages = [stage for percent, stage in reports]
+        assert stages.index('transforming') < stages.index('packaging')
+        assert (90, 'transforming') in reports
+        percents = [percent for percent, stage in reports]
+        assert percents == sorted(percents)
+
+def test_rasterTransform_3():
+    """Unit Test: rasterTransform into a Cloud-Optimized GeoTIFF, with creation options"""
+    result = rasterTransform(raster_sample, tgt, tgtCRS=3857, tgtFormat='COG', creationOptions={'BLOCKSIZE': '256', 'OVERVIEW_RESAMPLING': 'AVERAGE'})
+    assert path.isfile(result)
+    ds = gdal.Open(path.join(tgt, 'geo.tif'))
+    band = ds.GetRasterBand(1)
+    assert band.GetBlockSize() == [256, 256]
+    assert ds.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') == 'DEFLATE'
+    if ds.RasterXSize > 256 or ds.RasterYSize > 256:
+        assert band.GetOverviewCount() > 0
+    ds = None
+
+def test_rasterFootprint_1():
+    """Unit Test: rasterFootprint grows with the raster size, and reduces the warp memory to fit in the limit"""
+    ds = gdal.Open(raster_sample)
+    size = ds.RasterXSize * ds.RasterYSize * ds.RasterCount * gdal.GetDataTypeSize(ds.GetRasterBand(1).DataType) // 8
+    ds = None
+    footprint, warpMemory = rasterFootprint([raster_sample], 512)
+    assert warpMemory == 512
+    assert footprint >= 4 * min(size, 256 * 1024 * 1024)
+    footprint, warpMemory = rasterFootprint([raster_sample], 512, limit=256 * 1024 * 1024)
+    assert warpMemory == 96
+
 def test_transformProcess_1():
     """Unit Test: transformProcess with compressed files"""
     makedirs(path.join(tgt, 'src'))
@@ -76,3 +308,21 @@ def test_transformProcess_1():
         gdal_params = {'type': 'vector', 'tgtCRS': 2100, 'tgtFormat': 'CSV'}
         result = transformProcess(src, tgt, 'ticket', gdal_params)
         assert path.isfile(result)
+
+def test_transformProcess_2():
+    """Unit Test: transformProcess reads compressed files in place"""
+    working_path = path.join(gettempdir(), 'test_vsi')
+    rmtree(working_path, ignore_errors=True)
+    makedirs(path.join(working_path, 'src'))
+    for src in [shape_zip, shape_gz]:
+        gdal_params = {'type': 'vector', 'tgtCRS': 2100, 'tgtFormat': 'CSV'}
+        result = transformProcess(src, working_path, 'ticket', gdal_params)
+        assert path.isfile(result)
+        assert path.isfile(path.join(working_path, 'results', 'ticket', 'geo.csv'))
+        assert not path.isfile(path.join(working_path, 'src', 'geo.shp'))
+
+def test_vsiPath_1():
+    """Unit Test: vsiPath for compressed and uncompressed files"""
+    assert vsiPath(shape_zip) == '/vsizip/' + path.abspath(shape_zip)
+    assert vsiPath(shape_gz) == '/vsitar/' + path.abspath(shape_gz)
+    assert vsiPath(geojson_sample) is None
@@ -1,13 +1,14 @@
 from flask import Flask
-from flask import request, current_app, make_response, send_file, session
+from flask import request, current_app, make_response, send_file, session, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-from os import path, getenv, makedirs, stat
-from shutil import move, rmtree
+from os import path, getenv, makedirs, stat, walk, remove
+from shutil import move, rmtree, copyfileobj
 from tempfile import gettempdir
 from uuid import uuid4
+from urllib.parse import quote
 from hashlib import md5
-import pyproj
+from time import perf_counter, time, monotonic
 from osgeo import ogr, gdal
 from datetime import datetime, timezone
 from flask_executor import Executor
@@ -15,9 +16,21 @@ from apispec import APISpec
 from apispec_webframeworks.flask import FlaskPlugin
 import zipfile
 import tarfile
+import gzip
 from . import db
-from .gdal_transform import gdal_transform
+from . import packaging
+from . import cache
+from . import jobs
+from . import notify
+from . import metrics
+from . import profiling
+from . import memory
+from . import retention
+from .gdal_transform import gdal_transform, UnsupportedFileError, RESAMPLING_METHODS
 from .logging import getLoggers
+from .crs import resolveCRS
+from .progress import Progress
+from .options import parseOptions, validateOptions, presets
 import json
 
 def mkdir(path):
@@ -29,14 +42,30 @@ def mkdir(path):
 
 def executorCallback(future):
     """The callback function called when a job has completed."""
-    ticket, result, success, comment, rel_path = future.result()
+    completeJob(*future.result())
+
+def completeJob(ticket, result, success, comment, rel_path, timings=None):
+    """Moves the result of a completed job into the output directory and updates its ticket.
+    Parameters:
+        ticket (string): The ticket of the job.
+        result (string): Full path of the resulting archive; None if the job has failed.
+        success (int): Whether the job has succeeded (1) or not (0).
+        comment (string): A comment describing the reason of a failure.
+        rel_path (string): The path, relative to OUTPUT_DIR, where the result will be stored.
+        timings (dict): The seconds spent in each stage of the job.
+    """
+    timings = dict(timings or {})
     if result is not None:
+        start = perf_counter()
         mkdir(path.join(getenv('OUTPUT_DIR'), rel_path))
         rel_path = path.join(rel_path, path.basename(result))
         filepath = path.join(getenv('OUTPUT_DIR'), rel_path)
         move(result, filepath)
+        timings['move'] = round(perf_counter() - start, 3)
+        result_size = stat(filepath).st_size
     else:
         filepath = None
+        result_size = None
     try:
         tempdir = getenv('TEMPDIR') or gettempdir()
         working_path = path.join(tempdir, __name__, ticket)
@@ -45,19 +74,72 @@ def executorCallback(future):
         pass
     with app.app_context():
         dbc = db.get_db()
-        db_result = dbc.execute('SELECT requested_time, filesize FROM tickets WHERE ticket = ?;', [ticket]).fetchone()
+        db_result = dbc.execute('SELECT requested_time, filesize, cache_key, webhook, upload_time FROM tickets WHERE ticket = ?;', [ticket]).fetchone()
         time = db_result['requested_time']
         filesize = db_result['filesize']
+        if filepath is not None and db_result['cache_key'] is not None:
+            start = perf_counter()
+            cache.store(dbc, db_result['cache_key'], filepath)
+            timings['move'] = round(timings['move'] + perf_counter() - start, 3)
         execution_time = round((datetime.now(timezone.utc) - time.replace(tzinfo=timezone.utc)).total_seconds(), 3)
-        dbc.execute('UPDATE tickets SET result=?, success=?, status=1, execution_time=?, comment=? WHERE ticket=?;', [rel_path, success, execution_time, comment, ticket])
+        dbc.execute("UPDATE tickets SET result=?, result_size=?, success=?, status=1, execution_time=?, comment=?, progress=CASE WHEN ?=1 THEN 100 ELSE progress END, stage=?, eta=NULL, progress_time=CURRENT_TIMESTAMP WHERE ticket=?;", [rel_path, result_size, success, execution_time, comment, success, 'completed' if success else 'failed', ticket])
+        columns = [(TIMING_COLUMNS[name], seconds) for name, seconds in timings.items() if name in TIMING_COLUMNS]
+        if len(columns) > 0:
+            dbc.execute('UPDATE tickets SET %s WHERE ticket=?;' % (', '.join('%s=?' % (column) for column, seconds in columns)), [seconds for column, seconds in columns] + [ticket])
         dbc.commit()
-        accountLogger(ticket=ticket, success=success, execution_start=time, execution_time=execution_time, comment=comment, filesize=filesize)
+        if db_result['upload_time'] is not None:
+            timings['upload'] = db_result['upload_time']
+        notify.notify()
+        if db_result['webhook'] is not None:
+            notifyWebhook(dbc, ticket, db_result['webhook'])
+        accountLogger(ticket=ticket, success=success, execution_start=time, execution_time=execution_time, comment=comment, filesize=filesize, timings=timings)
+
+def notifyWebhook(dbc, ticket, url):
+    """Calls the completion webhook of a ticket."""
+    payload = ticketStatus(notify.getTicket(dbc, ticket))
+    payload.update({"ticket": ticket, "endpoint": "/resource/%s" % (ticket)})
+    notify.sendWebhook(url, payload)
+
+def vsiPath(src_file):
+    """Forms the GDAL virtual file system path for reading a compressed file in place.
+    Parameters:
+        src_file (string): Full path of the file.
+    Returns:
+        (string) The /vsitar/, /vsizip/ or /vsigzip/ path, or None if the file is not compressed.
+    """
+    src_file = path.abspath(src_file)
+    if tarfile.is_tarfile(src_file):
+        return '/vsitar/' + src_file
+    if zipfile.is_zipfile(src_file):
+        return '/vsizip/' + src_file
+    with open(src_file, 'rb') as handle:
+        if handle.read(2) == b'\x1f\x8b':
+            return '/vsigzip/' + src_file
+    return None
+
+def directorySize(directory):
+    """The total size (in bytes) of the files inside directory; None if it does not exist."""
+    if not path.isdir(directory):
+        return None
+    return sum(stat(path.join(root, filename)).st_size for root, dirs, filenames in walk(directory) for filename in filenames)
 
-def transformProcess(src_file, working_path, ticket, gdal_params):
-    """Checks whether the file is compressed and call gdal_transform."""
+def transformProcess(src_file, working_path, ticket, gdal_params, progress=None, admission=None):
+    """Checks whether the file is compressed and call gdal_transform.
+    Compressed files are read in place through the GDAL virtual file systems; they are extracted only if
+    no dataset can be read that way. The progress and the memory admission of the job (if given) are passed
+    to gdal_transform.
+    """
     src_path = path.join(working_path, 'src')
     tgt_path = path.join(working_path, 'results', ticket)
     if not path.isdir(src_file):
+        vsi_file = vsiPath(src_file)
+        if vsi_file is not None:
+            try:
+                return gdal_transform(vsi_file, tgt_path, progress=progress, admission=admission, **gdal_params)
+            except UnsupportedFileError:
+                mainLogger.info('Could not read %s in place, extracting.', src_file)
+        if progress is not None:
+            progress.stage('extracting', 0, 0)
         if tarfile.is_tarfile(src_file):
             handle = tarfile.open(src_file)
             handle.extractall(src_path)
@@ -67,11 +149,30 @@ def transformProcess(src_file, working_path, ticket, gdal_params):
             with zipfile.ZipFile(src_file, 'r') as handle:
                 handle.extractall(src_path)
             src_file = src_path
-    return gdal_transform(src_file, tgt_path, **gdal_params)
+        elif vsi_file is not None:
+            filename = path.join(src_path, path.splitext(path.basename(src_file))[0])
+            with gzip.open(src_file, 'rb') as handle, open(filename, 'wb') as target:
+                copyfileobj(handle, target)
+            src_file = filename
+    return gdal_transform(src_file, tgt_path, progress=progress, admission=admission, **gdal_params)
 
 if getenv('OUTPUT_DIR') is None:
     raise Exception('Environment variable OUTPUT_DIR is not set.')
 
+# Maximum number of tickets in a bulk status request.
+STATUS_MAX_TICKETS = int(getenv('STATUS_MAX_TICKETS') or 1000)
+# Maximum number of items of a batch.
+BATCH_MAX_ITEMS = int(getenv('BATCH_MAX_ITEMS') or 500)
+# Maximum number of outputs of a single transform request (see the *targets* parameter).
+TARGETS_MAX = int(getenv('TRANSFORM_MAX_TARGETS') or 8)
+# Delivery of the results by a front proxy: 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd);
+# if not set, the application serves them.
+RESOURCE_OFFLOAD = getenv('RESOURCE_OFFLOAD')
+if RESOURCE_OFFLOAD is not None and RESOURCE_OFFLOAD not in ['x-accel-redirect', 'x-sendfile']:
+    raise Exception("Environment variable RESOURCE_OFFLOAD should be one of: 'x-accel-redirect', 'x-sendfile'.")
+# The internal location of the front proxy that serves OUTPUT_DIR (for X-Accel-Redirect).
+RESOURCE_ACCEL_PREFIX = getenv('RESOURCE_ACCEL_PREFIX') or '/output/'
+
 #Logging
 mainLogger, accountLogger = getLoggers()
 
@@ -97,11 +198,16 @@ else:
 app.config.from_mapping(
     SECRET_KEY=secret_key,
     DATABASE=getenv('DATABASE'),
+    USE_X_SENDFILE=(RESOURCE_OFFLOAD == 'x-sendfile'),
 )
 
 # Ensure the instance folder exists and initialize application, db and executor.
 mkdir(app.instance_path)
 db.init_app(app)
+cache.init_app(app)
+jobs.init_app(app)
+metrics.init_app(app, path.join(getenv('TEMPDIR') or gettempdir(), __name__))
+retention.init_app(app, path.join(getenv('TEMPDIR') or gettempdir(), __name__))
 executor = Executor(app)
 executor.add_default_done_callback(executorCallback)
 
@@ -113,52 +219,184 @@ if getenv('CORS') is not None:
         origins = getenv('CORS')
     cors = CORS(app, origins=origins)
 
-@executor.job
-def enqueue(ticket, src_path, working_path, date, gdal_params):
-    """Enqueue a transform job (in case requested response type is 'deferred')."""
-    filesize = stat(src_path).st_size
+def progressReporter(ticket):
+    """Creates a function writing the progress of a job into its ticket."""
+    def report(percent, stage, eta):
+        with app.app_context():
+            dbc = db.get_db()
+            dbc.execute('UPDATE tickets SET progress=?, stage=?, eta=?, progress_time=CURRENT_TIMESTAMP WHERE ticket=?;', [percent, stage, eta, ticket])
+            dbc.commit()
+    return report
+
+def measuredTransform(src_file, working_path, ticket, gdal_params, response, progress=None, profile=False):
+    """Runs transformProcess, recording its duration, input and output size, and outcome in the metrics.
+    The job runs once it fits in the memory budget of the node (see memory.Admission).
+    If profile is set, the job is profiled (see profiling.profiled); layers are then transformed sequentially,
+    so that the profile covers all the work.
+    """
+    admission = memory.Admission(app, ticket, progress=progress)
+    labels = metrics.labels(gdal_params)
+    metrics.INPUT_SIZE.labels(src_type=labels['src_type']).observe(stat(src_file).st_size)
+    start = perf_counter()
+    with metrics.RUNNING.track_inprogress():
+        try:
+            if profile:
+                with profiling.profiled(ticket):
+                    params = dict(gdal_params, workers=1) if gdal_params.get('type') == 'vector' else gdal_params
+                    result = transformProcess(src_file, working_path, ticket, params, progress=progress, admission=admission)
+            else:
+                result = transformProcess(src_file, working_path, ticket, gdal_params, progress=progress, admission=admission)
+        except Exception:
+            metrics.JOBS.labels(src_type=labels['src_type'], outcome='failure').inc()
+            raise
+    metrics.JOB_DURATION.labels(response=response, **labels).observe(perf_counter() - start)
+    metrics.OUTPUT_SIZE.labels(**labels).observe(stat(result).st_size)
+    metrics.JOBS.labels(src_type=labels['src_type'], outcome='success').inc()
+    # The size of the output files before packaging, along with the size of the source and the result, shows
+    # the effect of the output options (e.g. precision and simplification) and of the packaging.
+    with app.app_context():
+        dbc = db.get_db()
+        dbc.execute('UPDATE tickets SET output_size=? WHERE ticket=?;', [directorySize(path.join(working_path, 'results', ticket)), ticket])
+        dbc.commit()
+    return result
+
+def jobCache(ticket, src_path, gdal_params, profile=False):
+    """Looks up the result cache for a deferred job whose source has not been hashed by its request (e.g. a resource
+    path), so that the request does not wait for the hashing. In case of a miss, the key is kept in the ticket, so
+    that the result is cached once completed.
+    Parameters:
+        (see runJob)
+    Returns:
+        (string) Full path of the cached result, or None.
+    """
+    if not cache.enabled() or profile:
+        return None
     dbc = db.get_db()
-    dbc.execute('INSERT INTO tickets (ticket, filesize) VALUES(?, ?);', [ticket, filesize])
-    dbc.commit()
+    row = dbc.execute('SELECT cache_key FROM tickets WHERE ticket=?;', [ticket]).fetchone()
+    if row is None or row['cache_key'] is not None:
+        return None
+    cache_key = cache.cacheKey(src_path, gdal_params)
+    cached = cache.lookup(dbc, cache_key)
+    if cached is None:
+        dbc.execute('UPDATE tickets SET cache_key=? WHERE ticket=?;', [cache_key, ticket])
+        dbc.commit()
+    return cached
+
+def runJob(ticket, src_path, working_path, date, gdal_params, queued=None, profile=False):
+    """Runs a transform job, recording its progress in the ticket.
+    Parameters:
+        queued (float): The seconds the job has waited in the queue.
+        profile (bool): Whether the job will be profiled.
+        (see enqueue for the rest of parameters)
+    Returns:
+        (tuple) The arguments of completeJob.
+    """
+    progress = Progress(progressReporter(ticket))
+    cached = jobCache(ticket, src_path, gdal_params, profile=profile)
+    if cached is not None:
+        # The result is linked into the results of the job, to be moved into the output directory.
+        metrics.JOBS.labels(src_type=gdal_params.get('type') or 'vector', outcome='cached').inc()
+        result = path.join(working_path, 'results', ticket + packaging.extension(gdal_params.get('packaging')))
+        cache.linkFile(cached, result)
+        timings = progress.finish()
+        if queued is not None:
+            timings['queue'] = round(queued, 3)
+        return (ticket, result, 1, 'Cached result.', date, timings)
     try:
-        result = transformProcess(src_path, working_path, ticket, gdal_params)
+        result = measuredTransform(src_path, working_path, ticket, gdal_params, 'deferred', progress=progress, profile=profile)
     except Exception as e:
-        return (ticket, None, 0, str(e), date)
-    return (ticket, result, 1, None, date)
+        result = None
+        comment = str(e)
+    timings = progress.finish()
+    if queued is not None:
+        timings['queue'] = round(queued, 3)
+    if result is None:
+        return (ticket, None, 0, comment, date, timings)
+    return (ticket, result, 1, None, date, timings)
 
-def getTransformParams(request):
-    """Get and check the http request parameters for transformation."""
+@executor.job
+def enqueue(ticket, src_path, working_path, date, gdal_params, cache_key=None, webhook=None, upload_time=None, profile=False, submitted=None, registered=False):
+    """Enqueue a transform job (in case requested response type is 'deferred').
+    The ticket is inserted in the database, unless it is already registered (e.g. along with its batch).
+    """
+    metrics.EXECUTOR_QUEUE.dec()
+    if not registered:
+        filesize = stat(src_path).st_size
+        dbc = db.get_db()
+        dbc.execute('INSERT INTO tickets (ticket, filesize, cache_key, webhook, upload_time) VALUES(?, ?, ?, ?, ?);', [ticket, filesize, cache_key, webhook, upload_time])
+        dbc.commit()
+    queued = time() - submitted if submitted is not None else None
+    return runJob(ticket, src_path, working_path, date, gdal_params, queued=queued, profile=profile)
+
+def submitJob(ticket, src_path, working_path, date, gdal_params, cache_key=None, webhook=None, upload_time=None, profile=False):
+    """Submits a deferred transform job, either to the executor of this process or to the database job queue
+    processed by the standalone workers (flask transform-worker), according to JOB_QUEUE.
+    """
+    if jobs.JOB_QUEUE == 'database':
+        jobs.push(db.get_db(), ticket, src_path, working_path, date, gdal_params, cache_key=cache_key, webhook=webhook, upload_time=upload_time, profile=profile)
+    else:
+        metrics.EXECUTOR_QUEUE.inc()
+        enqueue.submit(ticket, src_path, working_path, date=date, gdal_params=gdal_params, cache_key=cache_key, webhook=webhook, upload_time=upload_time, profile=profile, submitted=time())
+
+# The ticket columns where the seconds spent in each stage of a job are stored.
+TIMING_COLUMNS = {
+    'queue': 'queue_time',
+    'upload': 'upload_time',
+    'waiting': 'wait_time',
+    'extracting': 'extract_time',
+    'opening': 'open_time',
+    'transforming': 'transform_time',
+    'packaging': 'packaging_time',
+    'move': 'move_time',
+}
+
+def ticketStatus(row):
+    """Forms the status of a ticket from its database row."""
+    success = bool(row['success']) if row['success'] is not None else None
+    updated = row['progress_time'].isoformat() if row['progress_time'] is not None else None
+    return {"completed": bool(row['status']), "success": success, "requested": row['requested_time'].isoformat(), "executionTime": row['execution_time'], "comment": row['comment'],
+        "progress": row['progress'], "stage": row['stage'], "eta": row['eta'], "updated": updated,
+        "timings": {name: row[column] for name, column in TIMING_COLUMNS.items() if row[column] is not None},
+        "memory": {"estimate": row['memory_estimate'], "peak": row['peak_memory']},
+        "size": {"source": row['filesize'], "output": row['output_size'], "result": row['result_size']},
+        "evicted": row['evicted_time'] is not None}
+
+def getTargetParams(args, src_type):
+    """Get and check the parameters of an output: its CRS, format, preset and driver options.
+    Parameters:
+        args (dict): The http request parameters, or an item of the *targets* parameter.
+        src_type (string): The type of the source file.
+    Returns:
+        (tuple) The parameters of the output (dict) and the errors found (list).
+    """
     errors = []
     params = {}
-    args = request.values
-    from_crs = args.get('from')
-    try:
-        if from_crs is not None:
-            crs = pyproj.crs.CRS.from_user_input(from_crs)
-    except Exception as e:
-        message = "Unrecognized source crs"
-        errors.append(message)
-    if from_crs is not None:
-        params['from_crs'] = crs.to_epsg()
-    else:
-        params['from_crs'] = None
     to_crs = args.get('to')
+    params['to_crs'] = None
     try:
         if to_crs is not None:
-            crs = pyproj.crs.CRS.from_user_input(to_crs)
+            params['to_crs'] = resolveCRS(json.dumps(to_crs) if isinstance(to_crs, dict) else to_crs)
     except Exception as e:
         message = "Unrecognized target crs"
         errors.append(message)
-    if to_crs is not None:
-        params['to_crs'] = crs.to_epsg()
-    else:
-        params['to_crs'] = None
-    src_type = args.get('src_type')
-    if src_type is None or (src_type != 'vector' and src_type != 'raster'):
-        message = "Missing or wrong required parameter 'src_type'"
-        errors.append(message)
-    params['src_type'] = src_type
     params['format'] = args.get('format')
+    preset = args.get('preset')
+    params['preset'] = None
+    if preset is not None:
+        available = presets()
+        if preset not in available:
+            message = "Parameter 'preset' can take one of: %s" % (', '.join(sorted(available)))
+            errors.append(message)
+        elif available[preset]['type'] != src_type:
+            message = "Preset %s is only valid for %s files" % (preset, available[preset]['type'])
+            errors.append(message)
+        elif params['format'] is not None and params['format'].upper() != available[preset]['format'].upper():
+            message = "Preset %s produces %s; it conflicts with parameter 'format'" % (preset, available[preset]['format'])
+            errors.append(message)
+        else:
+            params['preset'] = available[preset]
+            params['format'] = available[preset]['format']
+    driver = None
     if params['format'] is not None:
         if src_type == 'raster':
             driver = gdal.GetDriverByName(params['format'])
@@ -167,11 +405,247 @@ def getTransformParams(request):
         if driver is None:
             message = "Unsupported driver for ouput format %s" % (params['format'])
             errors.append(message)
+    # Driver options given explicitly override those of the preset.
+    for name, item in [('creation_options', gdal.DMD_CREATIONOPTIONLIST), ('layer_options', gdal.DS_LAYER_CREATIONOPTIONLIST)]:
+        params[name] = None
+        value = args.get(name)
+        options = dict(params['preset'].get(name) or {}) if params['preset'] is not None else {}
+        if value is None and len(options) == 0:
+            continue
+        if name == 'layer_options' and src_type != 'vector':
+            message = "Parameter 'layer_options' is only valid for vector files"
+            errors.append(message)
+        elif params['format'] is None:
+            message = "Parameter '%s' requires 'format'" % (name)
+            errors.append(message)
+        elif driver is not None:
+            try:
+                if value is not None:
+                    options.update(parseOptions(json.dumps(value) if isinstance(value, dict) else value))
+                params[name] = options
+                errors += validateOptions(driver, options, item)
+            except ValueError as e:
+                message = "Malformed parameter '%s': %s" % (name, str(e))
+                errors.append(message)
+    # Reduction of the output geometries, in target CRS units.
+    params['reduction'] = None
+    reduction = {}
+    for name, key, cast in [('precision', 'precision', int), ('grid_size', 'gridSize', float), ('simplify', 'simplify', float)]:
+        value = args.get(name)
+        if value is None:
+            continue
+        if src_type != 'vector':
+            message = "Parameter '%s' is only valid for vector files" % (name)
+            errors.append(message)
+            continue
+        try:
+            value = cast(value)
+        except (ValueError, TypeError):
+            value = None
+        if value is None or not (0 <= value <= 15 if name == 'precision' else value > 0):
+            message = "Parameter 'precision' should be an integer between 0 and 15" if name == 'precision' else "Parameter '%s' should be a positive number" % (name)
+            errors.append(message)
+            continue
+        reduction[key] = value
+    if 'precision' in reduction and 'gridSize' in reduction:
+        message = "Parameters 'precision' and 'grid_size' are mutually exclusive"
+        errors.append(message)
+    if len(reduction) > 0:
+        params['reduction'] = reduction
+    return params, errors
+
+def getTransformParams(request, args=None):
+    """Get and check the http request parameters for transformation.
+    Parameters:
+        request (flask.Request): The http request.
+        args (dict): The parameters to check, if other than those of the request (e.g. an item of a batch).
+    Returns:
+        (dict) The parameters.
+    Raises:
+        Exception: If any parameter is missing or invalid; its message joins all the errors found.
+    """
+    errors = []
+    params = {}
+    args = request.values if args is None else args
+    from_crs = args.get('from')
+    params['from_crs'] = None
+    try:
+        if from_crs is not None:
+            params['from_crs'] = resolveCRS(from_crs)
+    except Exception as e:
+        message = "Unrecognized source crs"
+        errors.append(message)
+    src_type = args.get('src_type')
+    if src_type is None or (src_type != 'vector' and src_type != 'raster'):
+        message = "Missing or wrong required parameter 'src_type'"
+        errors.append(message)
+    params['src_type'] = src_type
+    targets = args.get('targets')
+    params['targets'] = None
+    if targets is None:
+        target, target_errors = getTargetParams(args, src_type)
+        params.update(target)
+        errors += target_errors
+    else:
+        params.update({'to_crs': None, 'format': None, 'preset': None, 'creation_options': None, 'layer_options': None, 'reduction': None})
+        conflicting = [name for name in ['to', 'format', 'preset', 'creation_options', 'layer_options', 'precision', 'grid_size', 'simplify'] if args.get(name) is not None]
+        try:
+            targets = json.loads(targets) if isinstance(targets, str) else targets
+        except ValueError:
+            targets = None
+        if not isinstance(targets, list) or not 0 < len(targets) <= TARGETS_MAX or not all(isinstance(target, dict) for target in targets):
+            message = "Parameter 'targets' should be a JSON array of 1 to %d objects" % (TARGETS_MAX)
+            errors.append(message)
+            targets = []
+        if len(conflicting) > 0:
+            message = "Parameter 'targets' conflicts with: %s" % (', '.join(conflicting))
+            errors.append(message)
+        params['targets'] = []
+        for i, item in enumerate(targets):
+            target, target_errors = getTargetParams(item, src_type)
+            params['targets'].append(target)
+            errors += ['Target %d: %s' % (i + 1, error) for error in target_errors]
+    params['archive'] = args.get('archive') or 'combined'
+    if params['archive'] not in ['combined', 'separate']:
+        message = "Parameter 'archive' can take one of: 'combined', 'separate'"
+        errors.append(message)
+    elif params['archive'] == 'separate' and targets is None:
+        message = "Parameter 'archive' is only valid with 'targets'"
+        errors.append(message)
+    bbox = args.get('bbox')
+    params['bbox'] = None
+    if bbox is not None:
+        try:
+            bbox = json.loads(bbox) if isinstance(bbox, str) and bbox.strip().startswith('[') else bbox
+            bbox = [float(value) for value in (bbox.split(',') if isinstance(bbox, str) else bbox)]
+        except (ValueError, TypeError):
+            bbox = []
+        if len(bbox) == 4 and bbox[0] < bbox[2] and bbox[1] < bbox[3]:
+            params['bbox'] = bbox
+        else:
+            message = "Parameter 'bbox' should be 'minx,miny,maxx,maxy', with minx < maxx and miny < maxy"
+            errors.append(message)
+    bbox_crs = args.get('bbox_crs') or 'source'
+    params['bbox_crs'] = None
+    if bbox_crs != 'source':
+        if bbox is None:
+            message = "Parameter 'bbox_crs' requires 'bbox'"
+            errors.append(message)
+        elif bbox_crs == 'target':
+            if params['targets'] is not None:
+                message = "Parameter 'bbox_crs' cannot be 'target' with 'targets'"
+                errors.append(message)
+            elif params['to_crs'] is None:
+                message = "Parameter 'bbox_crs' can be 'target' only along with 'to'"
+                errors.append(message)
+            else:
+                params['bbox_crs'] = params['to_crs']
+        else:
+            try:
+                params['bbox_crs'] = resolveCRS(bbox_crs)
+            except Exception as e:
+                message = "Unrecognized bbox crs"
+                errors.append(message)
+    params['where'] = args.get('where')
+    if params['where'] is not None and src_type != 'vector':
+        message = "Parameter 'where' is only valid for vector files"
+        errors.append(message)
+    fields = args.get('fields')
+    params['fields'] = None
+    if fields is not None:
+        try:
+            fields = json.loads(fields) if isinstance(fields, str) and fields.strip().startswith('[') else fields
+            fields = [field.strip() for field in (fields.split(',') if isinstance(fields, str) else fields)]
+        except (ValueError, TypeError, AttributeError):
+            fields = []
+        if len(fields) > 0 and all(len(field) > 0 for field in fields):
+            params['fields'] = fields
+        else:
+            message = "Parameter 'fields' should be a comma-separated list (or JSON array) of field names"
+            errors.append(message)
+        if src_type != 'vector':
+            message = "Parameter 'fields' is only valid for vector files"
+            errors.append(message)
+    # The output grid of rasters.
+    for name, count in [('resolution', 2), ('size', 2)]:
+        value = args.get(name)
+        params[name] = None
+        if value is None:
+            continue
+        if src_type != 'raster':
+            message = "Parameter '%s' is only valid for raster files" % (name)
+            errors.append(message)
+            continue
+        try:
+            value = json.loads(value) if isinstance(value, str) and value.strip().startswith('[') else value
+            value = value.split(',') if isinstance(value, str) else value if isinstance(value, list) else [value]
+            if name == 'resolution':
+                value = [float(item) for item in value]
+                value = value * 2 if len(value) == 1 else value
+                valid = len(value) == count and all(item > 0 for item in value)
+            else:
+                value = [int(item) for item in value]
+                valid = len(value) == count and all(item >= 0 for item in value) and any(item > 0 for item in value)
+        except (ValueError, TypeError):
+            valid = False
+        if valid:
+            params[name] = value
+        else:
+            if name == 'resolution':
+                message = "Parameter 'resolution' should be a positive pixel size 'xres[,yres]', in target CRS units"
+            else:
+                message = "Parameter 'size' should be 'width,height' in pixels; one of them may be 0, keeping the aspect ratio"
+            errors.append(message)
+    if params['resolution'] is not None and params['size'] is not None:
+        message = "Parameters 'resolution' and 'size' are mutually exclusive"
+        errors.append(message)
+    elif params['resolution'] is not None and params['targets'] is not None:
+        message = "Parameter 'resolution' is not valid with 'targets'; use 'size' instead"
+        errors.append(message)
+    params['resampling'] = args.get('resampling')
+    if params['resampling'] is not None:
+        if src_type != 'raster':
+            message = "Parameter 'resampling' is only valid for raster files"
+            errors.append(message)
+        elif params['resampling'] not in RESAMPLING_METHODS:
+            message = "Parameter 'resampling' can take one of: %s" % (', '.join(RESAMPLING_METHODS))
+            errors.append(message)
     response_type = args.get('response') or 'prompt'
     if response_type != 'prompt' and response_type != 'deferred':
         message = "Parameter 'response' can take one of: 'prompt', 'deferred'"
         errors.append(message)
     params['response'] = response_type
+    params['packaging'] = args.get('packaging') or packaging.CODEC
+    if params['packaging'] not in packaging.available():
+        message = "Parameter 'packaging' can take one of: %s" % (', '.join(packaging.available()))
+        errors.append(message)
+    compression_level = args.get('compression_level')
+    params['compression_level'] = None
+    if compression_level is not None and params['packaging'] in packaging.LEVELS:
+        minimum, maximum, default = packaging.LEVELS[params['packaging']]
+        try:
+            params['compression_level'] = int(compression_level)
+        except (ValueError, TypeError):
+            params['compression_level'] = None
+        if params['compression_level'] is None or not minimum <= params['compression_level'] <= maximum:
+            message = "Parameter 'compression_level' should be an integer between %d and %d" % (minimum, maximum)
+            errors.append(message)
+    params['profile'] = args.get('profile') in ['1', 'true', 'True']
+    if params['profile']:
+        if not profiling.authorized(request):
+            message = "Parameter 'profile' requires a valid admin token"
+            errors.append(message)
+        elif response_type != 'deferred':
+            message = "Parameter 'profile' is only valid for deferred response"
+            errors.append(message)
+    params['webhook'] = args.get('webhook')
+    if params['webhook'] is not None:
+        if response_type != 'deferred':
+            message = "Parameter 'webhook' is only valid for deferred response"
+            errors.append(message)
+        elif not notify.validWebhook(params['webhook']):
+            message = "Parameter 'webhook' should be an http(s) URL of an allowed (public) host"
+            errors.append(message)
     resource = args.get('resource')
     if resource is not None and not path.isfile(resource) and not path.isdir(resource):
         message = "File not found."
@@ -181,27 +655,67 @@ def getTransformParams(request):
         raise Exception(' / '.join(errors))
     return params
 
+def gdalParams(params):
+    """Forms the parameters passed to gdal_transform from the (checked) http request parameters."""
+    gdal_params = {'type': params['src_type'], 'srcCRS': params['from_crs'], 'tgtCRS': params['to_crs'], 'tgtFormat': params['format'], 'packaging': params['packaging'], 'compressionLevel': params['compression_level']}
+    if params['creation_options'] is not None:
+        gdal_params['creationOptions'] = params['creation_options']
+    if params['layer_options'] is not None:
+        gdal_params['layerOptions'] = params['layer_options']
+    if params['reduction'] is not None:
+        gdal_params['reduction'] = params['reduction']
+    if params['targets'] is not None:
+        gdal_params['targets'] = []
+        for target in params['targets']:
+            target_params = {'tgtCRS': target['to_crs'], 'tgtFormat': target['format']}
+            if target['creation_options'] is not None:
+                target_params['creationOptions'] = target['creation_options']
+            if target['layer_options'] is not None:
+                target_params['layerOptions'] = target['layer_options']
+            if target['reduction'] is not None:
+                target_params['reduction'] = target['reduction']
+            gdal_params['targets'].append(target_params)
+        gdal_params['separate'] = params['archive'] == 'separate'
+    if params['src_type'] == 'vector':
+        if any(params[name] is not None for name in ['bbox', 'where', 'fields']):
+            gdal_params['filters'] = {'bbox': params['bbox'], 'bboxCRS': params['bbox_crs'], 'where': params['where'], 'fields': params['fields']}
+    elif any(params[name] is not None for name in ['bbox', 'resolution', 'size']):
+        gdal_params['window'] = {'bbox': params['bbox'], 'bboxCRS': params['bbox_crs'], 'resolution': params['resolution'], 'size': params['size']}
+    if params['resampling'] is not None:
+        gdal_params['resampling'] = params['resampling']
+    return gdal_params
+
+def createTicket():
+    """Creates a unique ticket, along with its working path.
+    The working path holds the uploaded source file (in 'src') and the results (in 'results/<ticket>').
+    Returns:
+        (tuple) The ticket and the full path of its working directory.
+    """
+    # Create tmp directory used for storage of uploaded
+    # (and created, in case of prompt response) files.
+    tempdir = getenv('TEMPDIR') or gettempdir()
+    tempdir = path.join(tempdir, __name__)
+    ticket = md5(str(uuid4()).encode()).hexdigest()
+    working_path = path.join(tempdir, ticket)
+    mkdir(path.join(working_path, 'results', ticket))
+    mkdir(path.join(working_path, 'src'))
+    return ticket, working_path
+
 @app.before_request
 def create_paths():
     if request.endpoint == 'transform':
-        # Create tmp directory used for storage of uploaded
-        # (and created, in case of prompt response) files.
-        tempdir = getenv('TEMPDIR') or gettempdir()
-        tempdir = path.join(tempdir, __name__)
-        mkdir(tempdir)
-        # Create a unique ticket for the request
-        ticket = md5(str(uuid4()).encode()).hexdigest()
-        # Create the working path
-        working_path = path.join(tempdir, ticket)
-        results_path = path.join(working_path, 'results', ticket)
-        mkdir(results_path)
-        # Create the temp source path
-        src_path = path.join(working_path, 'src')
-        mkdir(src_path)
+        g.request_start = perf_counter()
+        ticket, working_path = createTicket()
         # Store to session
         session['ticket'] = ticket
         session['temp_working_path'] = working_path
 
+@app.after_request
+def observe_request(response):
+    if request.endpoint == 'transform' and 'metrics_labels' in g:
+        metrics.REQUEST_DURATION.labels(**g.metrics_labels).observe(perf_counter() - g.request_start)
+    return response
+
 @app.teardown_request
 def clean_temp(error=None):
     if 'response_type' in session and session['response_type'] == 'prompt':
@@ -217,6 +731,61 @@ def index():
     mainLogger.info('Generating OpenAPI document...')
     return make_response(spec.to_dict(), 200)
 
+@app.route("/metrics")
+def metricsEndpoint():
+    """Expose the service metrics.
+    ---
+    get:
+      summary: Get the service metrics.
+      operationId: getMetrics
+      description: Returns the metrics of the service (request and job durations, input and output sizes, job outcomes, queue depth, running jobs and disk usage) in the Prometheus text format, aggregated over all the processes of the service.
+      tags:
+        - Metrics
+      responses:
+        200:
+          description: The metrics.
+          content:
+            text/plain:
+              schema:
+                type: string
+    """
+    return Response(metrics.latest(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route("/presets")
+def presetsEndpoint():
+    """List the output presets.
+    ---
+    get:
+      summary: Get the output presets.
+      operationId: getPresets
+      description: Returns the presets of downstream-friendly outputs available in this server, which may be given as the *preset* parameter of a transform request.
+      tags:
+        - Transform
+      responses:
+        200:
+          description: The presets, by name.
+          content:
+            application/json:
+              schema:
+                type: object
+                additionalProperties:
+                  type: object
+                  properties:
+                    type:
+                      type: string
+                      description: The type of the source files (vector or raster).
+                    format:
+                      type: string
+                      description: The output format.
+                    creation_options:
+                      type: object
+                      description: The dataset creation options.
+                    layer_options:
+                      type: object
+                      description: The layer creation options.
+    """
+    return make_response(presets(), 200)
+
 @app.route("/transform", methods=["POST"])
 def transform():
     """Transform a vector or raster file
@@ -242,18 +811,78 @@ def transform():
                   description: The type of the spatial file (*vector* or *raster*).
                 from:
                   type: string
-                  description: The spatial file native CRS. If not given, it will be extracted from the data.
+                  description: The spatial file native CRS, in any form recognized by PROJ (e.g. EPSG code, WKT, PROJJSON). If not given, it will be extracted from the data.
                 to:
                   type: string
-                  description: The CRS that the spatial file will be projected into. If not given, no reprojection will take place.
+                  description: The CRS that the spatial file will be projected into, in any form recognized by PROJ (e.g. EPSG code, WKT, PROJJSON). If not given, no reprojection will take place.
                 format:
                   type: string
-                  description: The expected format of the resulting file in the form of GDAL drivers short names. (See GDAL documentation for [vectors](https://gdal.org/drivers/vector/index.html) and [rasters](https://gdal.org/drivers/raster/index.html).) If not given, the source file format will be used.
+                  description: The expected format of the resulting file in the form of GDAL drivers short names. (See GDAL documentation for [vectors](https://gdal.org/drivers/vector/index.html) and [rasters](https://gdal.org/drivers/raster/index.html).) If not given, the source file format will be used. Rasters may be transformed into Cloud-Optimized GeoTIFF with *COG*.
                 response:
                   type: string
                   enum: [prompt, deferred]
                   default: prompt
                   description: Determines whether the transform proccess should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
+                packaging:
+                  type: string
+                  enum: [tar, gzip, pgzip, zstd, zip]
+                  description: The codec used to pack the resulting files; *pgzip* is a multithreaded gzip. If not given, the server default (usually *gzip*) is used. Already compressed files are stored without further compression.
+                compression_level:
+                  type: integer
+                  description: The compression level of the packaging codec (0-9 for gzip, pgzip and zip; 1-22 for zstd). If not given, the codec default is used.
+                preset:
+                  type: string
+                  description: A server preset of a downstream-friendly output (see `GET /presets`), setting the *format* and its creation options; e.g. *flatgeobuf* or *geopackage* with a spatial index, *cog* for rasters.
+                creation_options:
+                  type: string
+                  description: 'Dataset creation options of the output driver, as a JSON object (e.g. `{"COMPRESS": "ZSTD", "BLOCKSIZE": 256}`) or comma-separated `KEY=VALUE` pairs; they are validated against the options supported by the driver, so *format* (or *preset*) is required. They override the options of the *preset* and, for *COG* output, the server defaults (tiled, DEFLATE compressed with predictor, with overviews).'
+                layer_options:
+                  type: string
+                  description: Layer creation options of the vector output driver (e.g. `SPATIAL_INDEX=YES`), in the same form as *creation_options*.
+                targets:
+                  type: string
+                  description: 'Multiple outputs of a single read of the source, as a JSON array of objects with the keys *to*, *format*, *preset*, *creation_options*, *layer_options*, *precision*, *grid_size* and *simplify* (e.g. `[{"to": "EPSG:3857", "format": "GPKG"}, {"to": "EPSG:4326", "format": "GeoJSON"}, {"format": "CSV"}]`); it replaces these parameters. The outputs of each target are placed in a directory named after its CRS and format (e.g. *EPSG_3857_GPKG*).'
+                archive:
+                  type: string
+                  enum: [combined, separate]
+                  default: combined
+                  description: When *targets* are given, whether all of them are packed in one archive (*combined*), or each one in its own archive, inside the resulting archive (*separate*).
+                bbox:
+                  type: string
+                  description: A bounding box (*minx,miny,maxx,maxy*, easting or longitude first). For vector files, only the features intersecting it are transformed; the filter is applied on the source layer, so that drivers with a spatial index skip the rest of the features. For rasters, it is the extent of the output, and only the source blocks intersecting it are read.
+                bbox_crs:
+                  type: string
+                  default: source
+                  description: The CRS of *bbox*; *source* (the CRS of the source), *target* (the CRS given in *to*), or any CRS recognized by PROJ.
+                where:
+                  type: string
+                  description: An attribute filter of the features, as an OGR SQL WHERE clause (e.g. `population > 1000`); vector files only.
+                fields:
+                  type: string
+                  description: The attribute fields kept in the output, as a comma-separated list (or JSON array) of field names; the rest are not read from the source. Vector files only.
+                resolution:
+                  type: string
+                  description: The pixel size of the output raster (*xres[,yres]*), in target CRS units; if coarser than the source, the closest source overview is read instead of the full resolution. Rasters only.
+                size:
+                  type: string
+                  description: The size of the output raster in pixels (*width,height*); either may be 0, keeping the aspect ratio. Rasters only; it can not be combined with *resolution*.
+                resampling:
+                  type: string
+                  enum: [near, bilinear, cubic, cubicspline, lanczos, average, mode, max, min, med, q1, q3]
+                  description: The resampling method of the raster warp. If not given, the server default (usually *near*) is used.
+                precision:
+                  type: integer
+                  description: The number of decimals the output coordinates are rounded to, in target CRS units; vector files only.
+                grid_size:
+                  type: number
+                  description: The size of the grid the output coordinates are snapped to, in target CRS units (e.g. *0.5* for half a meter); vector files only. It can not be combined with *precision*.
+                simplify:
+                  type: number
+                  description: The tolerance of the simplification of the output geometries, in target CRS units; the topology of each geometry is preserved. Vector files only.
+                webhook:
+                  type: string
+                  format: uri
+                  description: A URL to be called (POST, with the status of the ticket as JSON) when a *deferred* transformation completes.
               required:
                 - resource
                 - src_type
@@ -270,18 +899,78 @@ def transform():
                   description: The type of the spatial file (*vector* or *raster*).
                 from:
                   type: string
-                  description: The spatial file native CRS. If not given, it will be extracted from the data.
+                  description: The spatial file native CRS, in any form recognized by PROJ (e.g. EPSG code, WKT, PROJJSON). If not given, it will be extracted from the data.
                 to:
                   type: string
-                  description: The CRS that the spatial file will be projected into. If not given, no reprojection will take place.
+                  description: The CRS that the spatial file will be projected into, in any form recognized by PROJ (e.g. EPSG code, WKT, PROJJSON). If not given, no reprojection will take place.
                 format:
                   type: string
-                  description: The expected format of the resulting file in the form of GDAL drivers short names. (See GDAL documentation for [vectors](https://gdal.org/drivers/vector/index.html) and [rasters](https://gdal.org/drivers/raster/index.html).) If not given, the source file format will be used.
+                  description: The expected format of the resulting file in the form of GDAL drivers short names. (See GDAL documentation for [vectors](https://gdal.org/drivers/vector/index.html) and [rasters](https://gdal.org/drivers/raster/index.html).) If not given, the source file format will be used. Rasters may be transformed into Cloud-Optimized GeoTIFF with *COG*.
                 response:
                   type: string
                   enum: [prompt, deferred]
                   default: prompt
                   description: Determines whether the transform proccess should be promptly initiated (*prompt*) or queued (*deferred*). In the first case, the response waits for the result, in the second the response is immediate returning a ticket corresponding to the request.
+                packaging:
+                  type: string
+                  enum: [tar, gzip, pgzip, zstd, zip]
+                  description: The codec used to pack the resulting files; *pgzip* is a multithreaded gzip. If not given, the server default (usually *gzip*) is used. Already compressed files are stored without further compression.
+                compression_level:
+                  type: integer
+                  description: The compression level of the packaging codec (0-9 for gzip, pgzip and zip; 1-22 for zstd). If not given, the codec default is used.
+                preset:
+                  type: string
+                  description: A server preset of a downstream-friendly output (see `GET /presets`), setting the *format* and its creation options; e.g. *flatgeobuf* or *geopackage* with a spatial index, *cog* for rasters.
+                creation_options:
+                  type: string
+                  description: 'Dataset creation options of the output driver, as a JSON object (e.g. `{"COMPRESS": "ZSTD", "BLOCKSIZE": 256}`) or comma-separated `KEY=VALUE` pairs; they are validated against the options supported by the driver, so *format* (or *preset*) is required. They override the options of the *preset* and, for *COG* output, the server defaults (tiled, DEFLATE compressed with predictor, with overviews).'
+                layer_options:
+                  type: string
+                  description: Layer creation options of the vector output driver (e.g. `SPATIAL_INDEX=YES`), in the same form as *creation_options*.
+                targets:
+                  type: string
+                  description: 'Multiple outputs of a single read of the source, as a JSON array of objects with the keys *to*, *format*, *preset*, *creation_options*, *layer_options*, *precision*, *grid_size* and *simplify* (e.g. `[{"to": "EPSG:3857", "format": "GPKG"}, {"to": "EPSG:4326", "format": "GeoJSON"}, {"format": "CSV"}]`); it replaces these parameters. The outputs of each target are placed in a directory named after its CRS and format (e.g. *EPSG_3857_GPKG*).'
+                archive:
+                  type: string
+                  enum: [combined, separate]
+                  default: combined
+                  description: When *targets* are given, whether all of them are packed in one archive (*combined*), or each one in its own archive, inside the resulting archive (*separate*).
+                bbox:
+                  type: string
+                  description: A bounding box (*minx,miny,maxx,maxy*, easting or longitude first). For vector files, only the features intersecting it are transformed; the filter is applied on the source layer, so that drivers with a spatial index skip the rest of the features. For rasters, it is the extent of the output, and only the source blocks intersecting it are read.
+                bbox_crs:
+                  type: string
+                  default: source
+                  description: The CRS of *bbox*; *source* (the CRS of the source), *target* (the CRS given in *to*), or any CRS recognized by PROJ.
+                where:
+                  type: string
+                  description: An attribute filter of the features, as an OGR SQL WHERE clause (e.g. `population > 1000`); vector files only.
+                fields:
+                  type: string
+                  description: The attribute fields kept in the output, as a comma-separated list (or JSON array) of field names; the rest are not read from the source. Vector files only.
+                resolution:
+                  type: string
+                  description: The pixel size of the output raster (*xres[,yres]*), in target CRS units; if coarser than the source, the closest source overview is read instead of the full resolution. Rasters only.
+                size:
+                  type: string
+                  description: The size of the output raster in pixels (*width,height*); either may be 0, keeping the aspect ratio. Rasters only; it can not be combined with *resolution*.
+                resampling:
+                  type: string
+                  enum: [near, bilinear, cubic, cubicspline, lanczos, average, mode, max, min, med, q1, q3]
+                  description: The resampling method of the raster warp. If not given, the server default (usually *near*) is used.
+                precision:
+                  type: integer
+                  description: The number of decimals the output coordinates are rounded to, in target CRS units; vector files only.
+                grid_size:
+                  type: number
+                  description: The size of the grid the output coordinates are snapped to, in target CRS units (e.g. *0.5* for half a meter); vector files only. It can not be combined with *precision*.
+                simplify:
+                  type: number
+                  description: The tolerance of the simplification of the output geometries, in target CRS units; the topology of each geometry is preserved. Vector files only.
+                webhook:
+                  type: string
+                  format: uri
+                  description: A URL to be called (POST, with the status of the ticket as JSON) when a *deferred* transformation completes.
               required:
                 - resource
                 - src_type
@@ -303,6 +992,18 @@ def transform():
               schema:
                 type: string
                 format: binary
+            application/tar+gzip:
+              schema:
+                type: string
+                format: binary
+            application/zstd:
+              schema:
+                type: string
+                format: binary
+            application/zip:
+              schema:
+                type: string
+                format: binary
         202:
           description: Accepted for processing, but transform has not been completed.
           content:
@@ -357,44 +1058,98 @@ def transform():
         return make_response({'Error': str(e)}, 400)
     # Add response type to session
     session['response_type'] = params['response']
+    g.metrics_labels = {'src_type': params['src_type'], 'format': 'multiple' if params['targets'] is not None else params['format'] or 'native', 'response': params['response']}
 
     # Form the source full path of the uploaded file
+    upload_time = None
+    content = None
+    use_cache = cache.enabled() and not params['profile']
     if params['resource'] is not None:
         src_file = params['resource']
     elif request.files['resource'] is not None:
         resource = request.files['resource']
         src_file = path.join(src_path, secure_filename(resource.filename))
-        resource.save(src_file)
+        start = perf_counter()
+        if use_cache:
+            # The upload is hashed (for the cache key) while it is saved.
+            content = cache.saveUpload(resource, src_file)
+        else:
+            resource.save(src_file)
+        upload_time = round(perf_counter() - start, 3)
     else:
         return make_response({"Error": "Missing resource."}, 400)
 
     # Create the response according to requested response type
-    gdal_params = {'type': params['src_type'], 'srcCRS': params['from_crs'], 'tgtCRS': params['to_crs'], 'tgtFormat': params['format']}
+    gdal_params = gdalParams(params)
+    extension = packaging.extension(params['packaging'])
+    date = datetime.now().strftime("%y%m%d")
+    # Look up the result cache; the source of a deferred request, unless hashed while uploaded, is hashed by its job
+    # instead (see jobCache).
+    cache_key = None
+    cached = None
+    if use_cache and (params['response'] == 'prompt' or content is not None):
+        dbc = db.get_db()
+        cache_key = cache.cacheKey(src_file, gdal_params, content=content)
+        cached = cache.lookup(dbc, cache_key)
     if params['response'] == 'prompt':
         filesize = stat(src_file).st_size
         start_time = datetime.now()
-        try:
-            result = transformProcess(src_file, working_path, ticket, gdal_params)
-        except Exception as e:
+        timings = {'upload': upload_time} if upload_time is not None else {}
+        if cached is not None:
+            result = cached
+            metrics.JOBS.labels(src_type=params['src_type'], outcome='cached').inc()
+            accountLogger(success=True, execution_start=start_time, execution_time=0, comment='Cached result.', filesize=filesize, timings=timings)
+        else:
+            progress = Progress(None)
+            try:
+                result = measuredTransform(src_file, working_path, ticket, gdal_params, 'prompt', progress=progress)
+            except Exception as e:
+                execution_time = round((datetime.now() - start_time).total_seconds(), 3)
+                timings.update(progress.finish())
+                accountLogger(success=False, execution_start=start_time, execution_time=execution_time, comment=str(e), filesize=filesize, timings=timings)
+                return make_response(str(e), 400)
             execution_time = round((datetime.now() - start_time).total_seconds(), 3)
-            accountLogger(success=False, execution_start=start_time, execution_time=execution_time, comment=str(e), filesize=filesize)
-            return make_response(str(e), 400)
-        execution_time = round((datetime.now() - start_time).total_seconds(), 3)
-        accountLogger(success=True, execution_start=start_time, execution_time=execution_time, filesize=filesize)
+            timings.update(progress.finish())
+            accountLogger(success=True, execution_start=start_time, execution_time=execution_time, filesize=filesize, timings=timings)
+            if cache_key is not None:
+                cache.store(dbc, cache_key, result)
         if params['resource'] is not None:
             # The relative path for storing resulted files in the form /date/ticket/.
-            rel_path = datetime.now().strftime("%y%m%d")
-            mkdir(path.join(getenv('OUTPUT_DIR'), rel_path))
-            rel_path = path.join(rel_path, path.basename(result))
-            move(result, path.join(getenv('OUTPUT_DIR'), rel_path))
+            rel_path = path.join(date, ticket + extension)
+            start = perf_counter()
+            filepath = path.join(getenv('OUTPUT_DIR'), rel_path)
+            if cached is not None:
+                cache.linkFile(cached, filepath)
+            else:
+                mkdir(path.join(getenv('OUTPUT_DIR'), date))
+                move(result, filepath)
+            mainLogger.debug('Moved result of ticket %s in %.3fs.', ticket, perf_counter() - start)
+            # A completed ticket indexes the result, for the retention service.
+            dbc = db.get_db()
+            output_size = directorySize(path.join(working_path, 'results', ticket)) if cached is None else None
+            dbc.execute("INSERT INTO tickets (ticket, filesize, output_size, result, result_size, success, status, progress, stage) VALUES(?, ?, ?, ?, ?, 1, 1, 100, 'completed');", [ticket, filesize, output_size, rel_path, stat(filepath).st_size])
+            dbc.commit()
             return make_response({'filepath': rel_path, 'type': 'prompt'}, 200)
         else:
-            return send_file(result, as_attachment=True)
+            return send_file(result, as_attachment=True, attachment_filename=ticket + extension)
     else:
-        date = datetime.now().strftime("%y%m%d")
-        enqueue.submit(ticket, src_file, working_path, date=date, gdal_params=gdal_params)
+        if cached is not None:
+            # The ticket is completed at once, without running a job.
+            metrics.JOBS.labels(src_type=params['src_type'], outcome='cached').inc()
+            rel_path = path.join(date, ticket + extension)
+            cache.linkFile(cached, path.join(getenv('OUTPUT_DIR'), rel_path))
+            filesize = stat(src_file).st_size
+            dbc.execute("INSERT INTO tickets (ticket, filesize, cache_key, result, result_size, success, status, execution_time, comment, webhook, progress, stage, upload_time) VALUES(?, ?, ?, ?, ?, 1, 1, 0, ?, ?, 100, 'completed', ?);", [ticket, filesize, cache_key, rel_path, stat(cached).st_size, 'Cached result.', params['webhook'], upload_time])
+            dbc.commit()
+            # No job will clean up the working path (with the uploaded source).
+            rmtree(working_path, ignore_errors=True)
+            if params['webhook'] is not None:
+                notifyWebhook(dbc, ticket, params['webhook'])
+            accountLogger(ticket=ticket, success=True, execution_start=datetime.now(), execution_time=0, comment='Cached result.', filesize=filesize)
+        else:
+            submitJob(ticket, src_file, working_path, date, gdal_params, cache_key=cache_key, webhook=params['webhook'], upload_time=upload_time, profile=params['profile'])
         if params['resource'] is not None:
-            response = { "ticket": ticket, "filepath": path.join(date, ticket + '.tar.gz') }
+            response = { "ticket": ticket, "filepath": path.join(date, ticket + extension) }
         else:
             response = { "type": "deferred", "ticket": ticket, "endpoint": "/resource/%s" % (ticket), "status": "/status/%s" % (ticket)}
         return make_response(response, 202)
@@ -416,6 +1171,12 @@ def status(ticket):
           required: true
           schema:
             type: string
+        - name: wait
+          in: query
+          description: Wait (long-poll) up to this number of seconds for the transformation to complete, before returning the status. The request holds a server thread while waiting; many clients should rather give a webhook.
+          required: false
+          schema:
+            type: number
       responses:
         200:
           description: Ticket found and status returned.
@@ -440,28 +1201,207 @@ def status(ticket):
                   executionTime:
                     type: integer
                     description: The execution time in seconds.
+                  progress:
+                    type: number
+                    description: The percentage of the transformation completed.
+                  stage:
+                    type: string
+                    description: The current stage of the transformation (queued, extracting, opening, waiting for memory, transforming, packaging, completed or failed).
+                  eta:
+                    type: integer
+                    description: The estimated time remaining, in seconds.
+                  updated:
+                    type: string
+                    format: datetime
+                    description: The timestamp of the last progress update; an old timestamp suggests a stalled job.
+                  memory:
+                    type: object
+                    properties:
+                      estimate:
+                        type: integer
+                        description: The estimated memory footprint of the job, in MB.
+                      peak:
+                        type: integer
+                        description: The peak growth of the resident memory during the job, in MB.
+                  size:
+                    type: object
+                    properties:
+                      source:
+                        type: integer
+                        description: The size of the source file, in bytes.
+                      output:
+                        type: integer
+                        description: The size of the output files, before packaging, in bytes.
+                      result:
+                        type: integer
+                        description: The size of the resulting (packed) file, in bytes.
+                  evicted:
+                    type: boolean
+                    description: Whether the result has expired and has been removed by the retention service.
         404:
           description: Ticket not found.
     """
     if ticket is None:
         return make_response('Ticket is missing.', 400)
     dbc = db.get_db()
-    results = dbc.execute('SELECT status, success, requested_time, execution_time, comment FROM tickets WHERE ticket = ?', [ticket]).fetchone()
+    wait = request.args.get('wait')
+    if wait is not None:
+        try:
+            wait = float(wait)
+        except ValueError:
+            wait = -1
+        if not wait >= 0:
+            return make_response({'wait': 'Parameter should be a non-negative number of seconds.'}, 400)
+        results = notify.wait(dbc, ticket, min(wait, notify.STATUS_MAX_WAIT))
+    else:
+        results = notify.getTicket(dbc, ticket)
     if results is not None:
-        if results['success'] is not None:
-            success = bool(results['success'])
-        else:
-            success = None
-        return make_response({"completed": bool(results['status']), "success": success, "requested": results['requested_time'].isoformat(), "executionTime": results['execution_time'], "comment": results['comment']}, 200)
+        return make_response(ticketStatus(results), 200)
     return make_response('Not found.', 404)
 
+@app.route("/status/<ticket>/events")
+def statusEvents(ticket):
+    """Stream the status of a ticket.
+    ---
+    get:
+      summary: Stream the status of a transform request.
+      operationId: getStatusEvents
+      description: Opens a Server-Sent Events stream, which sends a *status* event with the current status of the ticket, and another one as soon as the transformation completes; then the stream is closed. Comments are sent periodically to keep the connection alive. If the ticket is removed meanwhile, an *error* event is sent and the stream is closed. The stream holds a server thread while open, so it is closed after *STATUS_MAX_WAIT* seconds in any case, and clients reconnect; many clients should rather give a webhook.
+      tags:
+        - Status
+      parameters:
+        - name: ticket
+          in: path
+          description: The ticket of the request
+          required: true
+          schema:
+            type: string
+      responses:
+        200:
+          description: The stream of status events; the data of each event is the status of the ticket, as returned by */status/{ticket}*.
+          content:
+            text/event-stream:
+              schema:
+                type: string
+        404:
+          description: Ticket not found.
+    """
+    dbc = db.get_db()
+    row = notify.getTicket(dbc, ticket)
+    if row is None:
+        return make_response('Not found.', 404)
+    def events(row):
+        # The stream is closed after STATUS_MAX_WAIT seconds, so that it holds a server thread for a bounded time;
+        # EventSource clients reconnect, and get the current status.
+        deadline = monotonic() + notify.STATUS_MAX_WAIT
+        yield 'event: status\ndata: %s\n\n' % (json.dumps(ticketStatus(row)))
+        while not row['status']:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            row = notify.wait(dbc, ticket, min(notify.SSE_KEEPALIVE, remaining))
+            if row is None:
+                # The ticket has been removed meanwhile.
+                yield 'event: error\ndata: %s\n\n' % (json.dumps({'Error': 'Not found.'}))
+                return
+            if row['status']:
+                yield 'event: status\ndata: %s\n\n' % (json.dumps(ticketStatus(row)))
+            else:
+                yield ': keep-alive\n\n'
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(events(row)), mimetype='text/event-stream', headers=headers)
+
+@app.route("/status", methods=["POST"])
+def bulkStatus():
+    """Get the status of many tickets.
+    ---
+    post:
+      summary: Get the status of many transform requests.
+      operationId: getBulkStatus
+      description: Returns the status of the requests corresponding to a list of tickets, in a single request.
+      tags:
+        - Status
+      requestBody:
+        required: true
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                tickets:
+                  type: array
+                  items:
+                    type: string
+                  description: The tickets of the requests.
+              required:
+                - tickets
+      responses:
+        200:
+          description: The status of each ticket; tickets not found are mapped to null.
+          content:
+            application/json:
+              schema:
+                type: object
+                additionalProperties:
+                  type: object
+                  nullable: true
+                  properties:
+                    completed:
+                      type: boolean
+                      description: Whether transformation process has been completed or not.
+                    success:
+                      type: boolean
+                      description: Whether transformation process completed succesfully.
+                    comment:
+                      type: string
+                      description: If transformation has failed, a short comment describing the reason.
+                    requested:
+                      type: string
+                      format: datetime
+                      description: The timestamp of the request.
+                    executionTime:
+                      type: integer
+                      description: The execution time in seconds.
+                    progress:
+                      type: number
+                      description: The percentage of the transformation completed.
+                    stage:
+                      type: string
+                      description: The current stage of the transformation.
+                    eta:
+                      type: integer
+                      description: The estimated time remaining, in seconds.
+                    updated:
+                      type: string
+                      format: datetime
+                      description: The timestamp of the last progress update.
+        400:
+          description: Tickets are missing, or too many tickets were requested.
+    """
+    body = request.get_json(silent=True) or {}
+    tickets = body.get('tickets') if isinstance(body, dict) else None
+    if not isinstance(tickets, list) or len(tickets) == 0 or not all(isinstance(ticket, str) for ticket in tickets):
+        return make_response({'tickets': 'Field is required; a list of tickets.'}, 400)
+    if len(tickets) > STATUS_MAX_TICKETS:
+        return make_response({'tickets': 'At most %d tickets can be requested.' % (STATUS_MAX_TICKETS)}, 400)
+    dbc = db.get_db()
+    response = {ticket: None for ticket in tickets}
+    tickets = list(response.keys())
+    # Keep the number of bound parameters within the sqlite limit.
+    for i in range(0, len(tickets), 500):
+        chunk = tickets[i:i + 500]
+        rows = dbc.execute('SELECT %s FROM tickets WHERE ticket IN (%s);' % (notify.STATUS_COLUMNS, ','.join('?' * len(chunk))), chunk).fetchall()
+        for row in rows:
+            response[row['ticket']] = ticketStatus(row)
+    return make_response(response, 200)
+
 @app.route("/resource/<ticket>")
 def resource(ticket):
     """Get the resulted resource associated with a specific ticket.
     ---
     get:
       summary: Get the resource associated to a transform request.
-      description: Returns the resource resulted from a transform request corresponding to a specific ticket.
+      description: Returns the resource resulted from a transform request corresponding to a specific ticket. Conditional requests (*If-None-Match*, *If-Modified-Since*) and byte ranges (*Range*, *If-Range*) are supported, so that interrupted downloads can be resumed.
       tags:
         - Resource
       parameters:
@@ -471,6 +1411,12 @@ def resource(ticket):
           required: true
           schema:
             type: string
+        - name: Range
+          in: header
+          description: The byte range(s) of the resource to get.
+          required: false
+          schema:
+            type: string
       responses:
         200:
           description: The transformed compressed spatial file.
@@ -479,24 +1425,401 @@ def resource(ticket):
               schema:
                 type: string
                 format: binary
+        206:
+          description: The requested range of the transformed compressed spatial file.
+        304:
+          description: The resource has not been modified.
         404:
           description: Ticket not found or transform has not been completed.
+        410:
+          description: The resource has expired and has been removed.
+        416:
+          description: The requested range cannot be satisfied.
         507:
           description: Resource does not exist.
     """
     if ticket is None:
         return make_response('Resource ticket is missing.', 400)
     dbc = db.get_db()
-    rel_path = dbc.execute('SELECT result FROM tickets WHERE ticket = ?', [ticket]).fetchone()
-    if rel_path is None:
+    row = dbc.execute('SELECT result, evicted_time FROM tickets WHERE ticket = ?', [ticket]).fetchone()
+    if row is None or row['result'] is None:
         return make_response('Not found.', 404)
-    file = path.join(getenv('OUTPUT_DIR'), rel_path['result'])
+    if row['evicted_time'] is not None:
+        return make_response('Resource has expired.', 410)
+    file = path.join(getenv('OUTPUT_DIR'), row['result'])
     if not path.isfile(file):
         return make_response('Resource does not exist.', 507)
-    file_content = open(file, 'rb')
-    return send_file(file_content, attachment_filename=path.basename(file), as_attachment=True, mimetype='application/tar+gzip')
+    dbc.execute('UPDATE tickets SET accessed_time=CURRENT_TIMESTAMP WHERE ticket = ?;', [ticket])
+    dbc.commit()
+    if RESOURCE_OFFLOAD == 'x-accel-redirect':
+        # The proxy serves the file (including conditional and range requests) from its internal location.
+        response = make_response('', 200)
+        response.headers['X-Accel-Redirect'] = RESOURCE_ACCEL_PREFIX.rstrip('/') + '/' + quote(row['result'])
+        response.headers['Content-Type'] = packaging.mimetype(file)
+        response.headers['Content-Disposition'] = 'attachment; filename="%s"' % (path.basename(file))
+        return response
+    # With X-Sendfile, the proxy handles conditional and range requests itself.
+    return send_file(file, attachment_filename=path.basename(file), as_attachment=True, mimetype=packaging.mimetype(file), conditional=(RESOURCE_OFFLOAD is None))
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """Submit a batch of transformations
+    ---
+    post:
+      summary: Submit many transformations in a single request.
+      operationId: postBatch
+      description: Validates all the items of the batch together and, if all of them are valid, registers their tickets in a single transaction and queues them as a group (always *deferred*). If any item is invalid, none is submitted. The status of the group is returned by `GET /batch/{batch}`, and the results of all items by `GET /batch/{batch}/resource`.
+      tags:
+        - Batch
+      requestBody:
+        required: true
+        content:
+          multipart/form-data:
+            schema:
+              type: object
+              properties:
+                resource:
+                  type: array
+                  items:
+                    type: string
+                    format: binary
+                  description: The uploaded spatial files; each item refers to a file by its name. Without *items*, each file is an item.
+                items:
+                  type: string
+                  description: 'The items, as a JSON array of objects with the parameters of `POST /transform` (e.g. `[{"file": "roads.zip", "to": "EPSG:3857"}, {"resource": "/data/rivers.zip", "format": "GPKG"}]`); the source of each item is either the name of an uploaded *file*, or a server-side *resource* path.'
+                src_type:
+                  type: string
+                  enum: [vector, raster]
+                  description: Any other parameter of `POST /transform` (except *response*) is the default of all items.
+          application/x-www-form-urlencoded:
+            schema:
+              type: object
+              properties:
+                items:
+                  type: string
+                  description: The items, as a JSON array of objects with the parameters of `POST /transform`; the source of each item is its server-side *resource* path.
+                src_type:
+                  type: string
+                  enum: [vector, raster]
+                  description: Any other parameter of `POST /transform` (except *response*) is the default of all items.
+              required:
+                - items
+      responses:
+        202:
+          description: The batch has been accepted for processing.
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  type:
+                    type: string
+                    description: Always *deferred*.
+                  batch:
+                    type: string
+                    description: The id of the batch.
+                  status:
+                    type: string
+                    description: The endpoint of the status of the batch.
+                  endpoint:
+                    type: string
+                    description: The endpoint of the combined results of the batch.
+                  tickets:
+                    type: array
+                    description: The ticket of each item, in the order of the items, with its *status* and *endpoint* (and *filepath*, for server-side resources).
+                    items:
+                      type: object
+        400:
+          description: Client error; the errors of each invalid item are given in *items*, by the index of the item.
+    """
+    args = request.values
+    uploads = {upload.filename: upload for upload in request.files.getlist('resource')}
+    try:
+        items = json.loads(args['items']) if args.get('items') is not None else [{'file': filename} for filename in uploads]
+    except ValueError:
+        items = None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return make_response({'Error': "Parameter 'items' should be a JSON array of objects."}, 400)
+    if len(items) == 0 or len(items) > BATCH_MAX_ITEMS:
+        return make_response({'Error': 'A batch should have 1 to %d items.' % (BATCH_MAX_ITEMS)}, 400)
+    # The request parameters are the defaults of the items.
+    defaults = {name: value for name, value in args.items() if name not in ['items', 'resource']}
+    batch_items = []
+    errors = {}
+    for i, item in enumerate(items):
+        item_args = dict(defaults, **{name: value for name, value in item.items() if name != 'file'})
+        try:
+            if item_args.get('response', 'deferred') != 'deferred':
+                raise Exception("Batch items are always deferred")
+            item_args['response'] = 'deferred'
+            filename = item.get('file')
+            if filename is not None and item.get('resource') is not None:
+                raise Exception("Parameters 'file' and 'resource' conflict")
+            if filename is not None and filename not in uploads:
+                raise Exception("File %s has not been uploaded" % (filename))
+            if filename is None and item.get('resource') is None:
+                raise Exception("Missing resource.")
+            batch_items.append((getTransformParams(request, item_args), filename))
+        except Exception as e:
+            errors[i] = str(e)
+    if len(errors) > 0:
+        mainLogger.info('Client error: %d invalid batch items', len(errors))
+        return make_response({'Error': 'Invalid batch items.', 'items': errors}, 400)
+
+    batch = md5(str(uuid4()).encode()).hexdigest()
+    date = datetime.now().strftime("%y%m%d")
+    dbc = db.get_db()
+    prepared = []
+    working_paths = []
+    linked = []
+    try:
+        # The uploads are saved, hashed and looked up in the cache before any ticket is registered, so that the
+        # write transaction below holds the database only for the inserts.
+        for params, filename in batch_items:
+            ticket, working_path = createTicket()
+            working_paths.append(working_path)
+            upload_time = None
+            content = None
+            use_cache = cache.enabled() and not params['profile']
+            if filename is None:
+                src_file = params['resource']
+            else:
+                src_file = path.join(working_path, 'src', secure_filename(filename))
+                start = perf_counter()
+                # The same file may be uploaded once, and transformed by many items.
+                uploads[filename].stream.seek(0)
+                if use_cache:
+                    content = cache.saveUpload(uploads[filename], src_file)
+                else:
+                    uploads[filename].save(src_file)
+                upload_time = round(perf_counter() - start, 3)
+            gdal_params = gdalParams(params)
+            cache_key = None
+            cached = None
+            # Resources (not uploaded) are hashed by their jobs (see jobCache).
+            if use_cache and content is not None:
+                cache_key = cache.cacheKey(src_file, gdal_params, content=content)
+                cached = cache.lookup(dbc, cache_key)
+            rel_path = path.join(date, ticket + packaging.extension(params['packaging']))
+            if cached is not None:
+                cache.linkFile(cached, path.join(getenv('OUTPUT_DIR'), rel_path))
+                linked.append(path.join(getenv('OUTPUT_DIR'), rel_path))
+                cached = stat(cached).st_size
+            prepared.append((ticket, working_path, src_file, stat(src_file).st_size, upload_time, gdal_params, cache_key, cached, rel_path, params))
+        with dbc:
+            dbc.execute('INSERT INTO batches (batch, size) VALUES (?, ?);', [batch, len(prepared)])
+            for ticket, working_path, src_file, filesize, upload_time, gdal_params, cache_key, cached, rel_path, params in prepared:
+                if cached is not None:
+                    dbc.execute("INSERT INTO tickets (ticket, filesize, cache_key, result, result_size, success, status, execution_time, comment, webhook, progress, stage, upload_time, batch) VALUES(?, ?, ?, ?, ?, 1, 1, 0, ?, ?, 100, 'completed', ?, ?);", [ticket, filesize, cache_key, rel_path, cached, 'Cached result.', params['webhook'], upload_time, batch])
+                elif jobs.JOB_QUEUE == 'database':
+                    jobs.push(dbc, ticket, src_file, working_path, date, gdal_params, cache_key=cache_key, webhook=params['webhook'], upload_time=upload_time, profile=params['profile'], batch=batch, commit=False)
+                else:
+                    dbc.execute('INSERT INTO tickets (ticket, filesize, cache_key, webhook, upload_time, batch) VALUES(?, ?, ?, ?, ?, ?);', [ticket, filesize, cache_key, params['webhook'], upload_time, batch])
+    except Exception:
+        for working_path in working_paths:
+            rmtree(working_path, ignore_errors=True)
+        for filepath in linked:
+            if path.isfile(filepath):
+                remove(filepath)
+        raise
+    response = []
+    queued = []
+    completed = []
+    for ticket, working_path, src_file, filesize, upload_time, gdal_params, cache_key, cached, rel_path, params in prepared:
+        if cached is not None:
+            metrics.JOBS.labels(src_type=params['src_type'], outcome='cached').inc()
+            rmtree(working_path, ignore_errors=True)
+            if params['webhook'] is not None:
+                completed.append((ticket, params['webhook']))
+        elif jobs.JOB_QUEUE != 'database':
+            queued.append((ticket, src_file, working_path, gdal_params, cache_key, params, upload_time))
+        item = {"ticket": ticket, "endpoint": "/resource/%s" % (ticket), "status": "/status/%s" % (ticket)}
+        if params['resource'] is not None:
+            item['filepath'] = rel_path
+        response.append(item)
+    for ticket, src_file, working_path, gdal_params, cache_key, params, upload_time in queued:
+        metrics.EXECUTOR_QUEUE.inc()
+        enqueue.submit(ticket, src_file, working_path, date=date, gdal_params=gdal_params, cache_key=cache_key, webhook=params['webhook'], upload_time=upload_time, profile=params['profile'], submitted=time(), registered=True)
+    for ticket, webhook in completed:
+        notifyWebhook(dbc, ticket, webhook)
+    mainLogger.info('Batch %s: %d items submitted.', batch, len(response))
+    return make_response({"type": "deferred", "batch": batch, "status": "/batch/%s" % (batch), "endpoint": "/batch/%s/resource" % (batch), "tickets": response}, 202)
+
+@app.route("/batch/<batch>")
+def batchStatus(batch):
+    """Get the status of a batch.
+    ---
+    get:
+      summary: Get the status of a batch of transformations.
+      operationId: getBatchStatus
+      tags:
+        - Batch
+      parameters:
+        - name: batch
+          in: path
+          description: The id of the batch
+          required: true
+          schema:
+            type: string
+      responses:
+        200:
+          description: The status of the batch, and of each of its tickets.
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  requested:
+                    type: string
+                    format: datetime
+                    description: The timestamp of the request.
+                  completed:
+                    type: boolean
+                    description: Whether all the items have been completed.
+                  total:
+                    type: integer
+                    description: The number of items.
+                  succeeded:
+                    type: integer
+                    description: The number of items completed successfully.
+                  failed:
+                    type: integer
+                    description: The number of items that have failed.
+                  pending:
+                    type: integer
+                    description: The number of items not yet completed.
+                  progress:
+                    type: number
+                    description: The mean progress (percentage) of the items.
+                  tickets:
+                    type: array
+                    description: The status of each item (as returned by */status/{ticket}*, along with its *ticket*), in the order of the items.
+                    items:
+                      type: object
+        404:
+          description: Batch not found.
+    """
+    dbc = db.get_db()
+    row = dbc.execute('SELECT batch, size, requested_time FROM batches WHERE batch=?;', [batch]).fetchone()
+    if row is None:
+        return make_response('Not found.', 404)
+    statuses = [dict(ticketStatus(ticket), ticket=ticket['ticket']) for ticket in dbc.execute('SELECT %s FROM tickets WHERE batch=? ORDER BY id;' % (notify.STATUS_COLUMNS), [batch]).fetchall()]
+    completed = sum(1 for status in statuses if status['completed'])
+    succeeded = sum(1 for status in statuses if status['completed'] and status['success'])
+    progress = round(sum(status['progress'] or 0 for status in statuses) / len(statuses), 1) if len(statuses) > 0 else 0
+    return make_response({"batch": batch, "requested": row['requested_time'].isoformat(), "completed": completed == row['size'], "total": row['size'],
+        "succeeded": succeeded, "failed": completed - succeeded, "pending": row['size'] - completed, "progress": progress, "tickets": statuses}, 200)
+
+@app.route("/batch/<batch>/resource")
+def batchResource(batch):
+    """Get the results of a batch.
+    ---
+    get:
+      summary: Get the results of a batch of transformations, in a single archive.
+      tags:
+        - Batch
+      parameters:
+        - name: batch
+          in: path
+          description: The id of the batch
+          required: true
+          schema:
+            type: string
+      description: Streams a tar archive with the result of each successful item (named after its ticket), once all the items have been completed. The archive starts with *manifest.json*, listing each item with its ticket, outcome, comment and file in the archive; expired results are marked as *evicted*.
+      responses:
+        200:
+          description: The archive of the results.
+          content:
+            application/x-tar:
+              schema:
+                type: string
+                format: binary
+        404:
+          description: Batch not found or not yet completed.
+    """
+    dbc = db.get_db()
+    if dbc.execute('SELECT batch FROM batches WHERE batch=?;', [batch]).fetchone() is None:
+        return make_response('Not found.', 404)
+    rows = dbc.execute('SELECT ticket, status, success, comment, result, evicted_time FROM tickets WHERE batch=? ORDER BY id;', [batch]).fetchall()
+    if not all(row['status'] for row in rows):
+        return make_response('Batch has not been completed.', 404)
+    manifest = []
+    members = []
+    for i, row in enumerate(rows):
+        entry = {"item": i, "ticket": row['ticket'], "success": bool(row['success']), "comment": row['comment']}
+        if row['evicted_time'] is not None:
+            entry['evicted'] = True
+        elif row['result'] is not None and path.isfile(path.join(getenv('OUTPUT_DIR'), row['result'])):
+            entry['file'] = path.basename(row['result'])
+            members.append((entry['file'], path.join(getenv('OUTPUT_DIR'), row['result'])))
+        manifest.append(entry)
+    tickets = [row['ticket'] for row in rows if row['result'] is not None]
+    for i in range(0, len(tickets), 500):
+        chunk = tickets[i:i + 500]
+        dbc.execute('UPDATE tickets SET accessed_time=CURRENT_TIMESTAMP WHERE ticket IN (%s);' % (','.join('?' * len(chunk))), chunk)
+    dbc.commit()
+    members.insert(0, ('manifest.json', json.dumps(manifest, indent=2).encode('utf8')))
+    headers = {'Content-Disposition': 'attachment; filename="%s.tar"' % (batch)}
+    return Response(packaging.streamTar(members), mimetype='application/x-tar', headers=headers)
+
+@app.route("/admin/profile/<ticket>")
+def profileReport(ticket):
+    """Get the profile of a ticket.
+    ---
+    get:
+      summary: Get the profile of a transform request.
+      operationId: getProfile
+      description: Returns the profile of a deferred request submitted with *profile=true*, i.e. the most expensive functions by cumulative time and the GDAL debug trace. Requires the admin token in the *X-Admin-Token* header.
+      tags:
+        - Admin
+      parameters:
+        - name: ticket
+          in: path
+          description: The ticket of the request
+          required: true
+          schema:
+            type: string
+        - name: X-Admin-Token
+          in: header
+          description: The admin token of the service.
+          required: true
+          schema:
+            type: string
+      responses:
+        200:
+          description: The profile of the ticket.
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  stats:
+                    type: string
+                    description: The most expensive functions by cumulative time, as printed by pstats.
+                  trace:
+                    type: string
+                    description: The GDAL debug messages of the job.
+        403:
+          description: Missing or invalid admin token.
+        404:
+          description: The ticket has not been profiled, or its profile is not yet available.
+    """
+    if not profiling.authorized(request):
+        return make_response('Forbidden.', 403)
+    report = profiling.report(ticket)
+    if report is None:
+        return make_response('Not found.', 404)
+    return make_response(report, 200)
 
 with app.test_request_context():
     spec.path(view=transform)
     spec.path(view=status)
+    spec.path(view=bulkStatus)
+    spec.path(view=statusEvents)
     spec.path(view=resource)
+    spec.path(view=metricsEndpoint)
+    spec.path(view=presetsEndpoint)
+    spec.path(view=batch)
+    spec.path(view=batchStatus)
+    spec.path(view=batchResource)
+    spec.path(view=profileReport)
@@ -0,0 +1,229 @@
+from os import path, getenv, makedirs, link, remove, walk
+from shutil import copy2
+from hashlib import sha256
+from datetime import datetime, timedelta
+from time import monotonic
+import threading
+import json
+
+import click
+from flask.cli import with_appcontext
+
+from . import db
+from . import packaging
+
+# Maximum total size (in MB) of the cached results; 0 disables the cache.
+CACHE_MAX_SIZE = int(getenv('CACHE_MAX_SIZE') or 5 * 1024)
+# Maximum age (in seconds) of a cached result.
+CACHE_MAX_AGE = int(getenv('CACHE_MAX_AGE') or 7 * 24 * 3600)
+# Seconds between two writes of the access times and hits of the cached results, and of the hit and miss
+# counters; lookups only read the database, and their accesses are written in batches.
+CACHE_FLUSH_INTERVAL = int(getenv('CACHE_FLUSH_INTERVAL') or 60)
+# The directory (relative to OUTPUT_DIR) where cached results are stored.
+CACHE_DIR = '.cache'
+# Size of the chunks read while hashing.
+CHUNK_SIZE = 1024 * 1024
+
+# The accesses of this process not yet written: the hits of each key, and the hit and miss counters.
+_accesses = {'keys': {}, 'cache_hits': 0, 'cache_misses': 0}
+_accesses_lock = threading.Lock()
+_flushed = monotonic()
+
+def enabled():
+    """Whether the result cache is enabled."""
+    return CACHE_MAX_SIZE > 0
+
+def contentDigest(src_file):
+    """Hashes the content of a source file, or of the files inside a source directory (along with their names).
+    Parameters:
+        src_file (string): Full path of the source file or directory.
+    Returns:
+        (string) The hex digest.
+    """
+    digest = sha256()
+    if path.isdir(src_file):
+        files = []
+        for root, dirs, filenames in walk(src_file):
+            files += [(path.relpath(path.join(root, filename), src_file), path.join(root, filename)) for filename in filenames]
+        files.sort()
+    else:
+        files = [('', src_file)]
+    for name, filename in files:
+        digest.update(name.encode())
+        with open(filename, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def saveUpload(upload, filepath):
+    """Saves an uploaded file, hashing its content while it is streamed to disk.
+    Parameters:
+        upload (werkzeug.datastructures.FileStorage): The uploaded file.
+        filepath (string): Full path of the saved file.
+    Returns:
+        (string) The digest of the content (see contentDigest).
+    """
+    digest = sha256()
+    with open(filepath, 'wb') as handle:
+        for chunk in iter(lambda: upload.stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            handle.write(chunk)
+    return digest.hexdigest()
+
+def cacheKey(src_file, gdal_params, content=None):
+    """Computes the cache key of a transform request.
+    The key is a hash of the input content plus the normalized transform parameters.
+    Parameters:
+        src_file (string): Full path of the source file or directory.
+        gdal_params (dict): The parameters passed to gdal_transform.
+        content (string): The digest of the source content, if already known (see saveUpload); otherwise, the
+            source is hashed (see contentDigest).
+    Returns:
+        (string) The hex digest of the key.
+    """
+    params = dict(gdal_params)
+    if 'packaging' in params:
+        # Resolve the defaults, so that equivalent requests share the same key.
+        params['packaging'] = params['packaging'] or packaging.CODEC
+        if params.get('compressionLevel') is None:
+            minimum, maximum, default = packaging.LEVELS[params['packaging']]
+            level = packaging.LEVEL
+            params['compressionLevel'] = level if level is not None and minimum <= level <= maximum else default
+    digest = sha256()
+    digest.update((content or contentDigest(src_file)).encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def count(dbc, name, value=1):
+    """Increments a counter by value."""
+    dbc.execute('INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?;', [name, value, value])
+
+def flush(dbc):
+    """Writes the accesses (access times, hits and counters) of the lookups of this process."""
+    global _flushed
+    with _accesses_lock:
+        keys = _accesses['keys']
+        counters = [(name, _accesses[name]) for name in ['cache_hits', 'cache_misses'] if _accesses[name] > 0]
+        _accesses.update({'keys': {}, 'cache_hits': 0, 'cache_misses': 0})
+        _flushed = monotonic()
+    if len(keys) == 0 and len(counters) == 0:
+        return
+    dbc.executemany('UPDATE cache SET accessed_time = CURRENT_TIMESTAMP, hits = hits + ? WHERE key = ?;', [(hits, key) for key, hits in keys.items()])
+    for name, value in counters:
+        count(dbc, name, value)
+    dbc.commit()
+
+def lookup(dbc, key):
+    """Looks up a cached result, counting the hit or the miss.
+    The access is written along with the rest of the accesses of the process, every CACHE_FLUSH_INTERVAL seconds
+    (see flush); so, a lookup only reads the database, unless it finds an entry whose file has been removed.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        key (string): The cache key.
+    Returns:
+        (string) Full path of the cached result, or None in case of a miss.
+    """
+    row = dbc.execute('SELECT result FROM cache WHERE key = ?;', [key]).fetchone()
+    filepath = path.join(getenv('OUTPUT_DIR'), row['result']) if row is not None else None
+    if filepath is not None and path.isfile(filepath):
+        with _accesses_lock:
+            _accesses['keys'][key] = _accesses['keys'].get(key, 0) + 1
+            _accesses['cache_hits'] += 1
+    else:
+        if row is not None:
+            dbc.execute('DELETE FROM cache WHERE key = ?;', [key])
+            dbc.commit()
+        with _accesses_lock:
+            _accesses['cache_misses'] += 1
+        filepath = None
+    if monotonic() - _flushed >= CACHE_FLUSH_INTERVAL:
+        flush(dbc)
+    return filepath
+
+def linkFile(src, dst):
+    """Hard links src to dst, falling back to copy across file systems."""
+    makedirs(path.dirname(dst), exist_ok=True)
+    try:
+        link(src, dst)
+    except OSError:
+        copy2(src, dst)
+
+def store(dbc, key, filepath):
+    """Stores a result in the cache and evicts the entries exceeding the cache limits.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        key (string): The cache key.
+        filepath (string): Full path of the result; it is hard linked, so it can be moved or removed afterwards.
+    """
+    rel_path = path.join(CACHE_DIR, key + packaging.extension(_codec(filepath)))
+    cached = path.join(getenv('OUTPUT_DIR'), rel_path)
+    if path.isfile(cached):
+        remove(cached)
+    linkFile(filepath, cached)
+    dbc.execute('INSERT OR REPLACE INTO cache (key, result, size) VALUES (?, ?, ?);', [key, rel_path, path.getsize(cached)])
+    dbc.commit()
+    evict(dbc)
+
+def _codec(filepath):
+    """Finds the packaging codec of an archive from its extension."""
+    for codec, (ext, mime) in packaging.CODECS.items():
+        if filepath.endswith(ext):
+            return codec
+    return None
+
+def evict(dbc, max_size=None, max_age=None):
+    """Evicts cached results older than max_age, and then the least recently accessed ones until their
+    total size is at most max_size.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        max_size (int): Maximum total size in MB. If None, CACHE_MAX_SIZE is used.
+        max_age (int): Maximum age in seconds. If None, CACHE_MAX_AGE is used.
+    Returns:
+        (int) The number of evicted entries.
+    """
+    max_size = (max_size if max_size is not None else CACHE_MAX_SIZE) * 1024 * 1024
+    max_age = max_age if max_age is not None else CACHE_MAX_AGE
+    # The least recently accessed entries are evicted first.
+    flush(dbc)
+    oldest = datetime.utcnow() - timedelta(seconds=max_age)
+    evicted = dbc.execute('SELECT key, result FROM cache WHERE created_time < ?;', [oldest]).fetchall()
+    total = dbc.execute('SELECT COALESCE(SUM(size), 0) AS total FROM cache WHERE created_time >= ?;', [oldest]).fetchone()['total']
+    if total > max_size:
+        for row in dbc.execute('SELECT key, result, size FROM cache WHERE created_time >= ? ORDER BY accessed_time;', [oldest]).fetchall():
+            if total <= max_size:
+                break
+            evicted.append(row)
+            total -= row['size'] or 0
+    for row in evicted:
+        try:
+            remove(path.join(getenv('OUTPUT_DIR'), row['result']))
+        except OSError:
+            pass
+        dbc.execute('DELETE FROM cache WHERE key = ?;', [row['key']])
+    dbc.commit()
+    return len(evicted)
+
+def stats(dbc):
+    """Returns the cache statistics (entries, total size, hits and misses)."""
+    flush(dbc)
+    row = dbc.execute('SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size FROM cache;').fetchone()
+    counters = {r['name']: r['value'] for r in dbc.execute("SELECT name, value FROM counters WHERE name LIKE 'cache_%';").fetchall()}
+    return {'entries': row['entries'], 'size': row['size'], 'hits': counters.get('cache_hits', 0), 'misses': counters.get('cache_misses', 0)}
+
+@click.command('cache-stats')
+@with_appcontext
+def cache_stats_command():
+    """Print the result cache statistics."""
+    click.echo(json.dumps(stats(db.get_db())))
+
+@click.command('cache-evict')
+@click.option('--max-size', type=int, default=None, help='Maximum total size in MB.')
+@click.option('--max-age', type=int, default=None, help='Maximum age in seconds.')
+@with_appcontext
+def cache_evict_command(max_size, max_age):
+    """Evict results from the cache."""
+    click.echo('Evicted %d cached results.' % (evict(db.get_db(), max_size=max_size, max_age=max_age)))
+
+def init_app(app):
+    app.cli.add_command(cache_stats_command)
+    app.cli.add_command(cache_evict_command)
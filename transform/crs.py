@@ -0,0 +1,92 @@
+from os import getenv
+from functools import lru_cache
+from collections import OrderedDict
+import threading
+import pyproj
+from osgeo import osr
+
+# Maximum number of entries of each CRS cache.
+CRS_CACHE_SIZE = int(getenv('CRS_CACHE_SIZE') or 256)
+
+# GDAL spatial reference and coordinate transformation objects should not be shared among threads,
+# so each thread keeps its own caches; the threads transforming layers are long-lived (see
+# gdal_transform.layerPool), so that their caches are reused across jobs.
+_local = threading.local()
+
+@lru_cache(maxsize=CRS_CACHE_SIZE)
+def resolveCRS(user_input):
+    """Resolves a CRS given by the user into a normalized form, cached per process.
+    Parameters:
+        user_input (string): Any CRS definition understood by pyproj (e.g. EPSG:4326, WKT, PROJJSON, PROJ string).
+    Returns:
+        (string) 'EPSG:<code>' if the CRS has an EPSG code; otherwise, its WKT2 representation.
+    Raises:
+        pyproj.exceptions.CRSError: If the CRS is not recognized.
+    """
+    crs = pyproj.crs.CRS.from_user_input(user_input)
+    epsg = crs.to_epsg()
+    if epsg is not None:
+        return 'EPSG:%d' % (epsg)
+    return crs.to_wkt()
+
+def crsString(crs):
+    """Formats a CRS (EPSG code or string) as a GDAL user input string.
+    Parameters:
+        crs (int|string): The EPSG code, or any CRS definition understood by GDAL.
+    Returns:
+        (string) The CRS definition.
+    """
+    return 'EPSG:%d' % (crs) if isinstance(crs, int) else crs
+
+def _threadCache(name):
+    """Returns the named LRU cache of the current thread."""
+    cache = getattr(_local, name, None)
+    if cache is None:
+        cache = OrderedDict()
+        setattr(_local, name, cache)
+    return cache
+
+def _cached(name, key, create):
+    """Gets key from the named cache of the current thread, creating it on a miss."""
+    cache = _threadCache(name)
+    value = cache.get(key)
+    if value is None:
+        value = create()
+        cache[key] = value
+        if len(cache) > CRS_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+def spatialReference(crs):
+    """Returns the spatial reference of a CRS, cached per thread.
+    The returned object is shared; it should be cloned before being modified.
+    Parameters:
+        crs (int|string): The EPSG code, or any CRS definition understood by GDAL (e.g. EPSG:4326, WKT, PROJJSON).
+    Returns:
+        (osr.SpatialReference) The spatial reference.
+    """
+    def create():
+        srs = osr.SpatialReference()
+        if isinstance(crs, int):
+            srs.ImportFromEPSG(crs)
+        else:
+            srs.SetFromUserInput(crs)
+        return srs
+    return _cached('spatial_references', crs, create)
+
+def _srsKey(srs):
+    """Identifies a spatial reference, including its axis mapping."""
+    return (srs.ExportToWkt(), tuple(srs.GetDataAxisToSRSAxisMapping()))
+
+def coordinateTransformation(src_spatial_ref, tgt_spatial_ref):
+    """Returns the coordinate transformation between two spatial references, cached per thread.
+    Parameters:
+        src_spatial_ref (osr.SpatialReference): The source spatial reference.
+        tgt_spatial_ref (osr.SpatialReference): The target spatial reference.
+    Returns:
+        (osr.CoordinateTransformation) The transformation.
+    """
+    key = (_srsKey(src_spatial_ref), _srsKey(tgt_spatial_ref))
+    return _cached('transformations', key, lambda: osr.CoordinateTransformation(src_spatial_ref, tgt_spatial_ref))
@@ -1,27 +1,62 @@
 import sqlite3
+import threading
+from os import getenv, getpid
 
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
 
+# Time (in ms) a connection waits for a lock held by another connection, before failing with 'database is locked'.
+DB_BUSY_TIMEOUT = int(getenv('DB_BUSY_TIMEOUT') or 30000)
+# Size (in KB) of the page cache of each connection.
+DB_CACHE_SIZE = int(getenv('DB_CACHE_SIZE') or 8192)
+
+# Connections are reused across requests and jobs; sqlite connections cannot be shared among threads,
+# so each thread keeps its own connections (one per database).
+_local = threading.local()
+
+def connect(database):
+    """Open a tuned sqlite connection.
+
+    The database is switched to WAL mode, so that readers (e.g. status polling) do not block the writer,
+    and writers wait for each other instead of failing immediately.
+    Parameters:
+        database (string): The database file.
+    Returns:
+        (sqlite3.Connection) The connection.
+    """
+    connection = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES, timeout=DB_BUSY_TIMEOUT / 1000)
+    connection.row_factory = sqlite3.Row
+    if database != ':memory:':
+        connection.execute('PRAGMA journal_mode=WAL;')
+    connection.execute('PRAGMA synchronous=NORMAL;')
+    connection.execute('PRAGMA busy_timeout=%d;' % (DB_BUSY_TIMEOUT))
+    connection.execute('PRAGMA cache_size=-%d;' % (DB_CACHE_SIZE))
+    connection.execute('PRAGMA temp_store=MEMORY;')
+    return connection
+
 def get_db():
-    """Connect to sqlite."""
+    """Connect to sqlite, reusing the connection of the current thread."""
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        database = current_app.config['DATABASE']
+        connections = getattr(_local, 'connections', None)
+        if connections is None or _local.pid != getpid():
+            # Connections inherited through fork are not usable.
+            connections = _local.connections = {}
+            _local.pid = getpid()
+        if database not in connections:
+            connections[database] = connect(database)
+        g.db = connections[database]
 
     return g.db
 
 
 def close_db(e=None):
-    """Close sqlite connection."""
+    """Release the sqlite connection; it is kept open for reuse, discarding any uncommitted changes."""
     db = g.pop('db', None)
 
-    if db is not None:
-        db.close()
+    if db is not None and db.in_transaction:
+        db.rollback()
 
 def init_db():
     """Initialize the sqlite database."""
@@ -30,6 +65,38 @@ def init_db():
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
 
+def upgrade_db():
+    """Bring an existing database up to date with the schema.
+
+    Tables and indexes missing from the database are created, and columns missing from existing
+    tables are added; existing data are preserved.
+    Returns:
+        (list) The statements executed.
+    """
+    db = get_db()
+    schema = sqlite3.connect(':memory:')
+    with current_app.open_resource('schema.sql') as f:
+        schema.executescript(f.read().decode('utf8'))
+    statements = []
+    objects = schema.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type DESC;").fetchall()
+    for type, name, table, sql in objects:
+        if db.execute("SELECT name FROM sqlite_master WHERE type=? AND name=?;", [type, name]).fetchone() is None:
+            statements.append(sql)
+        elif type == 'table':
+            existing = [column['name'] for column in db.execute('PRAGMA table_info(%s);' % (name)).fetchall()]
+            for column in schema.execute('PRAGMA table_info(%s);' % (name)).fetchall():
+                cid, column_name, column_type, notnull, default, pk = column
+                if column_name not in existing:
+                    statement = 'ALTER TABLE %s ADD COLUMN %s %s' % (name, column_name, column_type)
+                    if default is not None:
+                        statement += ' DEFAULT %s' % (default)
+                    statements.append(statement)
+    schema.close()
+    for statement in statements:
+        db.execute(statement)
+    db.commit()
+    return statements
+
 
 @click.command('init-db')
 @with_appcontext
@@ -40,6 +107,9 @@ def init_db_command():
     if table is None:
         init_db()
         click.echo('Initialized the database.')
+    else:
+        for statement in upgrade_db():
+            click.echo('Upgraded the database: %s' % (statement))
 
 def init_app(app):
     app.teardown_appcontext(close_db)
@@ -1,113 +1,913 @@
 from osgeo import ogr, gdal, osr
-from os import path, listdir
-import tarfile
+from os import path, getenv, makedirs, cpu_count, getpid
+from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+from decimal import Decimal
+import multiprocessing
+import threading
+import re
+from xml.etree import ElementTree
+from .packaging import pack
+from .crs import spatialReference, coordinateTransformation, crsString
+from .options import parseOptions, formatOptions
 
-def gdal_transform(src, tgt, type='vector', srcCRS=None, tgtCRS=None, tgtFormat=None):
+# Number of features written in each transaction, for drivers supporting (efficient) transactions.
+BATCH_SIZE = int(getenv('VECTOR_BATCH_SIZE') or 20000)
+# Maximum number of layers (or files) of a single job transformed concurrently.
+WORKERS = int(getenv('TRANSFORM_WORKERS') or cpu_count() or 1)
+# Number of threads transforming the layers of all the jobs of a process. The threads are long-lived, so that their
+# caches of spatial references and coordinate transformations (see crs) are reused across jobs.
+LAYER_THREADS = int(getenv('LAYER_THREADS') or 2 * WORKERS)
+# Layers with more features than this are split into partitions, transformed by parallel worker processes;
+# 0 disables partitioning.
+PARTITION_SIZE = int(getenv('VECTOR_PARTITION_SIZE') or 1000000)
+
+# Raster warping defaults.
+RESAMPLING = getenv('RASTER_RESAMPLING') or 'near'
+# The resampling methods of the warper.
+RESAMPLING_METHODS = ['near', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'average', 'mode', 'max', 'min', 'med', 'q1', 'q3']
+WARP_THREADS = getenv('RASTER_WARP_THREADS') or 'ALL_CPUS'
+WARP_MEMORY = int(getenv('RASTER_WARP_MEMORY') or 512)
+ERROR_THRESHOLD = float(getenv('RASTER_ERROR_THRESHOLD') or 0.125)
+# Default creation options of Cloud-Optimized GeoTIFF (COG) outputs: tiled, compressed, with internal overviews.
+# They are built with the warp threads; options given with a request override them.
+COG_OPTIONS = parseOptions(getenv('RASTER_COG_OPTIONS') or 'COMPRESS=DEFLATE,PREDICTOR=YES,BLOCKSIZE=512,OVERVIEWS=AUTO')
+# The GDAL block cache is shared by all jobs of the process; if not set, GDAL uses 5% of the RAM.
+if getenv('RASTER_CACHE_MAX'):
+    gdal.SetCacheMax(int(getenv('RASTER_CACHE_MAX')) * 1024 * 1024)
+
+# Number of segments of each edge of a bounding box, when it is reprojected into the CRS of a layer.
+FILTER_DENSIFY = 32
+
+# The layer thread pool of the process (see layerPool), along with the process id.
+_layer_pool = (None, None)
+_layer_pool_lock = threading.Lock()
+
+# Memory footprint estimates (in MB), used for the admission of jobs into the memory budget.
+# Memory of a job besides its GDAL buffers (datasets, drivers, packaging).
+JOB_MEMORY_OVERHEAD = int(getenv('JOB_MEMORY_OVERHEAD') or 64)
+# Memory of each layer transformed concurrently.
+LAYER_MEMORY = int(getenv('VECTOR_LAYER_MEMORY') or 32)
+# Lower bound of the warp memory limit, when it is reduced to fit in the memory budget.
+WARP_MEMORY_MIN = 16
+
+def gdal_transform(src, tgt, type='vector', srcCRS=None, tgtCRS=None, tgtFormat=None, targets=None, **kwargs):
     """Transforms src to tgt, changing file type and/or CRS.
     Parameters:
         src (string): Full path of source (original) file.
         tgt (string): Full path of target file.
         type (string): The file general type (vector or raster).
-        srcCRS (string): The source file native CRS, if None it is determined from the file metadata.
-        tgtCRS (string): The CRS in which the geometries will be projected. If None, no projection will take place.
+        srcCRS (int|string): The source file native CRS (EPSG code or any CRS definition understood by GDAL), if None it is determined from the file metadata.
+        tgtCRS (int|string): The CRS in which the geometries will be projected. If None, no projection will take place.
         tgtFormat (string): The format into which the file will be transformed. It corresponds to GDAL short drivers
             names (https://gdal.org/drivers/vector/index.html & https://gdal.org/drivers/raster/index.html).
             If None, the file will keep the original format.
+        targets (list): Multiple outputs, instead of tgtCRS and tgtFormat; see vectorFanout and rasterFanout.
+        kwargs: Additional keyword arguments passed to vectorTransform or rasterTransform (or their fan-out counterparts).
     """
     gdal.UseExceptions()
+    if targets is not None:
+        fanout = vectorFanout if type == 'vector' else rasterFanout
+        return fanout(src, tgt, targets, srcCRS=srcCRS, **kwargs)
     if type == 'vector':
-        return vectorTransform(src, tgt, srcCRS=srcCRS, tgtCRS=tgtCRS, tgtFormat=tgtFormat)
+        return vectorTransform(src, tgt, srcCRS=srcCRS, tgtCRS=tgtCRS, tgtFormat=tgtFormat, **kwargs)
     else:
-        return rasterTransform(src, tgt, srcCRS=srcCRS, tgtCRS=tgtCRS, tgtFormat=tgtFormat)
+        return rasterTransform(src, tgt, srcCRS=srcCRS, tgtCRS=tgtCRS, tgtFormat=tgtFormat, **kwargs)
 
-def vectorTransform(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None):
-    """Transforms vector src to tgt, changing file type and/or CRS.
+def hasTraditionalAxisOrder(srs):
+    """Checks whether the data axis mapping of srs is the traditional GIS order (easting/longitude first).
     Parameters:
-        src (string): Full path of source (original) file.
+        srs (osr.SpatialReference): The spatial reference.
+    Returns:
+        (bool) True if srs maps its axes the same way ogr2ogr would.
+    """
+    if srs is None:
+        return True
+    traditional = srs.Clone()
+    traditional.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return traditional.GetDataAxisToSRSAxisMapping() == srs.GetDataAxisToSRSAxisMapping()
+
+def fieldMap(src_defn, tgt_defn):
+    """Maps each field of a source layer definition to the index of the corresponding target field.
+    Parameters:
+        src_defn (ogr.FeatureDefn): The source layer definition.
+        tgt_defn (ogr.FeatureDefn): The target layer definition.
+    Returns:
+        (list) The target field index for each source field, -1 if the field does not exist in target.
+    """
+    count = src_defn.GetFieldCount()
+    if count == tgt_defn.GetFieldCount():
+        return list(range(0, count))
+    return [tgt_defn.GetFieldIndex(src_defn.GetFieldDefn(i).GetNameRef()) for i in range(0, count)]
+
+def snapGeometry(geom, gridSize, digits):
+    """Rounds (in place) the coordinates of a geometry to a grid.
+    Parameters:
+        geom (ogr.Geometry): The geometry.
+        gridSize (float): The size of the grid cells.
+        digits (int): The decimal digits of gridSize; the snapped coordinates are rounded to them, so that they
+            are written without floating point noise (e.g. 0.3 rather than 0.30000000000000004).
+    """
+    count = geom.GetGeometryCount()
+    if count > 0:
+        for i in range(0, count):
+            snapGeometry(geom.GetGeometryRef(i), gridSize, digits)
+        return
+    three_d = geom.GetCoordinateDimension() == 3
+    for i, point in enumerate(geom.GetPoints() or []):
+        x = round(round(point[0] / gridSize) * gridSize, digits)
+        y = round(round(point[1] / gridSize) * gridSize, digits)
+        if three_d:
+            geom.SetPoint(i, x, y, point[2])
+        else:
+            geom.SetPoint_2D(i, x, y)
+
+def geometryReducer(reduction):
+    """Forms the function reducing the size of each output geometry: it is simplified (preserving the topology
+    of each geometry) and then its coordinates are rounded.
+    Parameters:
+        reduction (dict): Any of the keys: precision (number of decimals), gridSize (the size of the grid the
+            coordinates are snapped to; precision takes precedence) and simplify (the simplification tolerance);
+            all in target CRS units.
+    Returns:
+        (function) Maps a geometry to the reduced geometry; None if there is no reduction.
+    """
+    if not reduction:
+        return None
+    tolerance = reduction.get('simplify')
+    if reduction.get('precision') is not None:
+        digits = int(reduction['precision'])
+        gridSize = 10.0 ** -digits
+    elif reduction.get('gridSize') is not None:
+        gridSize = float(reduction['gridSize'])
+        digits = max(0, -Decimal(repr(gridSize)).as_tuple().exponent)
+    else:
+        gridSize = None
+    def reduce(geom):
+        if tolerance:
+            geom = geom.SimplifyPreserveTopology(tolerance)
+        if gridSize is not None:
+            snapGeometry(geom, gridSize, digits)
+        return geom
+    return reduce
+
+def reprojectLayer(layer, tgt_ds, coordTrans, tgt_spatial_ref, batchSize=None, options=None, fields=None, reduction=None, start=0, limit=None, callback=None):
+    """Reprojects a layer feature by feature into a new layer of tgt_ds.
+    Features are written in transactions of batchSize features, if the target driver supports them.
+    Parameters:
+        layer (ogr.Layer): The source layer.
+        tgt_ds (ogr.DataSource): The target datasource.
+        coordTrans (osr.CoordinateTransformation): The transformation applied to each geometry.
+        tgt_spatial_ref (osr.SpatialReference): The spatial reference of the created layer.
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        options (list): Layer creation options.
+        fields (list): The names of the fields written; if None, all fields of the layer are written.
+        reduction (dict): The simplification and coordinate precision of the geometries (see geometryReducer).
+        start (int): The index of the first feature read.
+        limit (int): Maximum number of features read; if None, the layer is read up to its end.
+        callback (function): A GDAL progress callback, called after each batch of features.
+    Returns:
+        (int) The number of written features.
+    """
+    return fanoutLayer(layer, [(tgt_ds, coordTrans, tgt_spatial_ref, options, reduction)], batchSize=batchSize, fields=fields, start=start, limit=limit, callback=callback)
+
+def fanoutLayer(layer, outputs, batchSize=None, fields=None, start=0, limit=None, callback=None):
+    """Reads a layer once, writing (and reprojecting) each feature into a new layer of every target datasource.
+    Features are written in transactions of batchSize features, in the targets whose driver supports them.
+    Parameters:
+        layer (ogr.Layer): The source layer.
+        outputs (list): A (tgt_ds, coordTrans, tgt_spatial_ref, options, reduction) tuple for each target: the
+            target datasource, the transformation applied to each geometry (None to keep the geometries as they
+            are), the spatial reference of the created layer, its creation options and the reduction of the
+            reprojected geometries (see geometryReducer; None to keep them as they are).
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        fields (list): The names of the fields written; if None, all fields of the layer are written.
+        start (int): The index of the first feature read; the layer should support fast random access.
+        limit (int): Maximum number of features read; if None, the layer is read up to its end.
+        callback (function): A GDAL progress callback, called after each batch of features.
+    Returns:
+        (int) The number of features read (and written into each target).
+    """
+    batchSize = batchSize or BATCH_SIZE
+    total = layer.GetFeatureCount(0) if callback is not None else -1
+    if limit is not None and total > 0:
+        total = min(total - start, limit)
+    layer_defn = layer.GetLayerDefn()
+    writers = []
+    for tgt_ds, coordTrans, tgt_spatial_ref, options, reduction in outputs:
+        tgt_layer = tgt_ds.CreateLayer(layer.GetName(), srs=tgt_spatial_ref, geom_type=layer.GetGeomType(), options=options or [])
+        for i in range(0, layer_defn.GetFieldCount()):
+            field_defn = layer_defn.GetFieldDefn(i)
+            if fields is None or field_defn.GetName() in fields:
+                tgt_layer.CreateField(field_defn)
+        tgt_layer_defn = tgt_layer.GetLayerDefn()
+        transactions = tgt_ds.TestCapability(ogr.ODsCTransactions)
+        if transactions:
+            tgt_ds.StartTransaction()
+        writers.append((tgt_ds, tgt_layer, ogr.Feature(tgt_layer_defn), fieldMap(layer_defn, tgt_layer_defn), coordTrans, geometryReducer(reduction), transactions))
+
+    count = 0
+    layer.ResetReading()
+    if start > 0:
+        layer.SetNextByIndex(start)
+    feature = layer.GetNextFeature()
+    while feature and (limit is None or count < limit):
+        for tgt_ds, tgt_layer, tgt_feature, field_map, coordTrans, reduce, transactions in writers:
+            tgt_feature.SetFID(ogr.NullFID)
+            tgt_feature.SetFromWithMap(feature, 1, field_map)
+            geom = tgt_feature.GetGeometryRef()
+            if geom is not None:
+                if coordTrans is not None:
+                    geom.Transform(coordTrans)
+                if reduce is not None:
+                    reduced = reduce(geom)
+                    # Coordinates are rounded in place; simplification creates a new geometry.
+                    if reduced is not geom:
+                        tgt_feature.SetGeometry(reduced)
+            tgt_layer.CreateFeature(tgt_feature)
+        count += 1
+        if count % batchSize == 0:
+            for tgt_ds, tgt_layer, tgt_feature, field_map, coordTrans, reduce, transactions in writers:
+                if transactions:
+                    tgt_ds.CommitTransaction()
+                    tgt_ds.StartTransaction()
+            if total > 0:
+                callback(min(count / total, 1.0), '%d features' % (count), None)
+        feature = layer.GetNextFeature()
+    for tgt_ds, tgt_layer, tgt_feature, field_map, coordTrans, reduce, transactions in writers:
+        if transactions:
+            tgt_ds.CommitTransaction()
+    if callback is not None:
+        callback(1.0, '%d features' % (count), None)
+
+    return count
+
+def translateLayer(src, tgt, driverName, layerName, srcSRS=None, dstSRS=None, batchSize=None, options=None, datasetOptions=None, filters=None, fields=None, callback=None):
+    """Translates (and reprojects) a layer of src into tgt through GDAL VectorTranslate (ogr2ogr).
+    Parameters:
+        src (string): Full path of source file.
         tgt (string): Full path of target file.
-        srcCRS (string): The source file native CRS, if None it is determined from the file metadata.
-        tgtCRS (string): The CRS in which the geometries will be projected. If None, no projection will take place.
-        tgtFormat (string): The format into which the file will be transformed. It corresponds to GDAL vector
-            short drivers names (https://gdal.org/drivers/vector/index.html).
-            If None, the file will keep the original format.
+        driverName (string): The GDAL short name of the target driver.
+        layerName (string): The name of the source layer.
+        srcSRS (string): The source SRS; if None, the layer SRS is used.
+        dstSRS (string): The target SRS; if None, no reprojection will take place.
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        options (list): Layer creation options.
+        datasetOptions (list): Dataset creation options.
+        filters (dict): The spatial and attribute filters of the layer (see vectorTransform).
+        fields (list): The names of the fields written; if None, all fields of the layer are written.
+        callback (function): A GDAL progress callback.
+    Returns:
+        (gdal.Dataset) The target dataset.
+    """
+    filters = filters or {}
+    translate_options = gdal.VectorTranslateOptions(
+        format=driverName,
+        srcSRS=srcSRS,
+        dstSRS=dstSRS,
+        reproject=dstSRS is not None,
+        where=filters.get('where'),
+        selectFields=fields,
+        spatFilter=filters.get('bbox'),
+        spatSRS=crsString(filters['bboxCRS']) if filters.get('bboxCRS') is not None else None,
+        layers=[layerName],
+        layerCreationOptions=options or [],
+        datasetCreationOptions=datasetOptions or [],
+        options=['-gt', str(batchSize or BATCH_SIZE)],
+        callback=callback
+    )
+    tgt_ds = gdal.VectorTranslate(tgt, src, options=translate_options)
+    if tgt_ds is None:
+        raise Exception('Failed to translate layer %s.' % (layerName))
+    return tgt_ds
+
+class UnsupportedFileError(Exception):
+    """Raised when no dataset readable by GDAL is found in the source."""
+    pass
+
+def isDirectory(filename):
+    """Checks whether filename is a directory; it also works for GDAL virtual file systems (e.g. /vsizip/).
+    Parameters:
+        filename (string): Full path of the file or directory.
+    Returns:
+        (bool) True if filename is a directory.
     """
+    stat = gdal.VSIStatL(filename)
+    return stat is not None and bool(stat.IsDirectory())
+
+def openDataset(filename, flags):
+    """Opens filename as a GDAL dataset.
+    Parameters:
+        filename (string): Full path of the file (or directory).
+        flags (int): The GDAL open flags (e.g. gdal.OF_VECTOR).
+    Returns:
+        (gdal.Dataset) The dataset, or None if filename can not be opened.
+    """
+    try:
+        return gdal.OpenEx(filename, flags)
+    except RuntimeError:
+        return None
+
+def findDatasets(src, flags):
+    """Finds the datasets of src.
+    If src is a directory (e.g. an extracted archive, or an archive in a GDAL virtual file system), each file
+    inside it is probed separately; datasets whose files are part of another dataset (e.g. the .dbf of a
+    shapefile, or the overviews of a GeoTIFF) are discarded.
+    Parameters:
+        src (string): Full path of source file or directory.
+        flags (int): The GDAL open flags (e.g. gdal.OF_VECTOR).
+    Returns:
+        (list) A list of (filename, gdal.Dataset) tuples.
+    """
+    if not isDirectory(src):
+        filenames = [src]
+    else:
+        filenames = [path.join(src, entry) for entry in sorted(gdal.ReadDirRecursive(src) or []) if not entry.endswith('/')]
+    datasets = []
+    for filename in filenames:
+        ds = openDataset(filename, flags)
+        if ds is None:
+            continue
+        datasets.append((filename, ds, set(ds.GetFileList() or [filename])))
+    return [(filename, ds) for filename, ds, files in datasets if not any(files < other for _, _, other in datasets)]
+
+def vectorSources(src):
+    """Lists the layers of vector src.
+    Parameters:
+        src (string): Full path of source file or directory.
+    Returns:
+        (list) A list of (filename, layer name, driver name) tuples, one for each layer.
+    """
+    sources = []
+    for filename, ds in findDatasets(src, gdal.OF_VECTOR):
+        driverName = ds.GetDriver().ShortName
+        sources += [(filename, ds.GetLayer(i).GetName(), driverName) for i in range(0, ds.GetLayerCount())]
+    return sources
+
+def rasterSources(src):
+    """Lists the raster files of src.
+    Parameters:
+        src (string): Full path of source file or directory.
+    Returns:
+        (list) A list with the full path of each raster.
+    """
+    return [filename for filename, ds in findDatasets(src, gdal.OF_RASTER)]
+
+def outputName(name, used):
+    """Creates a unique, filesystem-safe name for an output file.
+    Parameters:
+        name (string): The preferred name (usually the layer name).
+        used (set): The names already given; the new name is added to it.
+    Returns:
+        (string) The output name.
+    """
+    name = re.sub(r'[^\w\-.]', '_', name) or 'layer'
+    unique = name
+    i = 1
+    while unique in used:
+        i += 1
+        unique = '%s_%d' % (name, i)
+    used.add(unique)
+    return unique
+
+def targetFile(directory, name, driverName):
+    """Forms the full path of an output file, with the (first) extension of its driver."""
+    driver = ogr.GetDriverByName(driverName)
+    extensions = driver.GetMetadataItem(gdal.DMD_EXTENSIONS) or driver.GetMetadataItem(gdal.DMD_EXTENSION)
+    tgt_file = path.join(directory, name)
+    if extensions:
+        tgt_file += '.' + extensions.split(' ')[0]
+    return tgt_file
+
+def layerCreationOptions(driverName, layerOptions=None):
+    """Forms the layer creation options of a target driver; CSV layers keep their geometries as WKT, unless set otherwise.
+    Parameters:
+        driverName (string): The GDAL short name of the target driver.
+        layerOptions (dict): The layer creation options given with the request.
+    Returns:
+        (list) The KEY=VALUE options passed to GDAL.
+    """
+    layer_options = {'GEOMETRY': 'AS_WKT'} if driverName == 'CSV' else {}
+    layer_options.update(layerOptions or {})
+    return formatOptions(layer_options)
+
+def filterGeometry(bbox, bboxCRS, src_spatial_ref):
+    """Forms the spatial filter of a layer from a bounding box.
+    Parameters:
+        bbox (list): The bounding box (minx, miny, maxx, maxy), easting (or longitude) first.
+        bboxCRS (int|string): The CRS of the bounding box; if None, it is given in the coordinates of the layer.
+        src_spatial_ref (osr.SpatialReference): The spatial reference of the layer coordinates.
+    Returns:
+        (ogr.Geometry) The filter polygon, in the coordinates of the layer.
+    """
+    minx, miny, maxx, maxy = bbox
+    geom = ogr.CreateGeometryFromWkt('POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))' % (minx, miny, maxx, miny, maxx, maxy, minx, maxy, minx, miny))
+    if bboxCRS is None:
+        return geom
+    if src_spatial_ref is None:
+        raise Exception('The source CRS is unknown; the bounding box should be given in the source CRS.')
+    bbox_spatial_ref = spatialReference(bboxCRS).Clone()
+    bbox_spatial_ref.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    # The edges are densified, so that the polygon follows their curvature once reprojected.
+    geom.Segmentize(max(maxx - minx, maxy - miny) / FILTER_DENSIFY)
+    geom.Transform(coordinateTransformation(bbox_spatial_ref, src_spatial_ref))
+    return geom
+
+def selectedFields(layer, fields):
+    """Finds the fields of a layer selected by the user, in the order of the layer.
+    Parameters:
+        layer (ogr.Layer): The source layer.
+        fields (list): The names of the selected fields (case insensitive); if None, all fields are selected.
+    Returns:
+        (list) The names of the selected fields, as named in the layer; None if all fields are selected.
+    Raises:
+        Exception: If a selected field does not exist in the layer.
+    """
+    if fields is None:
+        return None
+    defn = layer.GetLayerDefn()
+    names = [defn.GetFieldDefn(i).GetName() for i in range(0, defn.GetFieldCount())]
+    missing = set(field.lower() for field in fields) - set(name.lower() for name in names)
+    if len(missing) > 0:
+        raise Exception('Fields not found in layer %s: %s' % (layer.GetName(), ', '.join(sorted(missing))))
+    return [name for name in names if name.lower() in set(field.lower() for field in fields)]
+
+def filterLayer(layer, src_spatial_ref, filters):
+    """Applies the filters of a job to a source layer, so that the driver skips the features (using its spatial
+    index, if any) and the fields that are not needed.
+    Parameters:
+        layer (ogr.Layer): The source layer.
+        src_spatial_ref (osr.SpatialReference): The spatial reference of the layer coordinates.
+        filters (dict): The filters (see vectorTransform).
+    Returns:
+        (list) The names of the selected fields; None if all fields are selected.
+    """
+    filters = filters or {}
+    if filters.get('bbox') is not None:
+        layer.SetSpatialFilter(filterGeometry(filters['bbox'], filters.get('bboxCRS'), src_spatial_ref))
+    if filters.get('where') is not None:
+        layer.SetAttributeFilter(filters['where'])
+    fields = selectedFields(layer, filters.get('fields'))
+    if fields is not None:
+        defn = layer.GetLayerDefn()
+        layer.SetIgnoredFields([defn.GetFieldDefn(i).GetName() for i in range(0, defn.GetFieldCount()) if defn.GetFieldDefn(i).GetName() not in fields])
+    return fields
+
+def transformLayer(src, layerName, tgt_file, driverName, srcCRS=None, tgtCRS=None, batchSize=None, creationOptions=None, layerOptions=None, filters=None, reduction=None, partition=None, callback=None):
+    """Transforms a single layer of src into tgt_file, changing file type and/or CRS.
+    When the source and target CRS use the traditional GIS axis order, the reprojection is delegated
+    to the GDAL translate (ogr2ogr) path; otherwise, or if the geometries are reduced, the layer is
+    reprojected with reprojectLayer.
+    In both paths, the filters are pushed down to the source layer.
+    Parameters:
+        src (string): Full path of source file.
+        layerName (string): The name of the layer to transform.
+        tgt_file (string): Full path of the target file.
+        driverName (string): The GDAL short name of the target driver.
+        srcCRS (int|string): The source layer native CRS (EPSG code or any CRS definition understood by GDAL), if None it is determined from the layer metadata.
+        tgtCRS (int|string): The CRS in which the geometries will be projected. If None, no projection will take place.
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        creationOptions (dict): Dataset creation options of the target driver.
+        layerOptions (dict): Layer creation options of the target driver.
+        filters (dict): The spatial, attribute and field filters of the layer (see vectorTransform).
+        reduction (dict): The simplification and coordinate precision of the geometries (see geometryReducer).
+        partition (tuple): The range of features transformed (see layerPartitions); if None, the whole layer.
+        callback (function): A GDAL progress callback.
+    """
+    # Each call opens its own datasets, since GDAL handles should not be shared among threads.
     src_ds = ogr.Open(src)
     if src_ds is None:
         raise Exception('File driver not supported.')
-    layer = src_ds.GetLayer()
-
-    # Reprojection
+    layer = src_ds.GetLayerByName(layerName)
+    start, limit = 0, None
+    if partition is not None:
+        kind, first, end = partition
+        if kind == 'fid':
+            # The range is pushed down, along with any attribute filter, to the FID column index.
+            fid_filter = '"%s" >= %d AND "%s" < %d' % (layer.GetFIDColumn(), first, layer.GetFIDColumn(), end)
+            where = (filters or {}).get('where')
+            filters = dict(filters or {}, where='(%s) AND %s' % (where, fid_filter) if where is not None else fid_filter)
+        else:
+            start, limit = first, end
     if srcCRS is None:
         src_spatial_ref = layer.GetSpatialRef()
     else:
-        src_spatial_ref = osr.SpatialReference()
-        src_spatial_ref.ImportFromEPSG(srcCRS)
-    if tgtCRS is not None:
-        tgt_spatial_ref = osr.SpatialReference()
-        tgt_spatial_ref.ImportFromEPSG(tgtCRS)
-        coordTrans = osr.CoordinateTransformation(src_spatial_ref, tgt_spatial_ref)
-    else:
-        tgt_spatial_ref = src_spatial_ref
-        coordTrans = None
+        src_spatial_ref = spatialReference(srcCRS)
+    fields = selectedFields(layer, (filters or {}).get('fields'))
 
-    # Transform file type
-    if tgtFormat is None:
-        driver = src_ds.GetDriver()
+    driver = ogr.GetDriverByName(driverName)
+    if path.exists(tgt_file):
+        driver.DeleteDataSource(tgt_file)
+    layer_options = layerCreationOptions(driverName, layerOptions)
+    dataset_options = formatOptions(creationOptions)
+
+    if tgtCRS is None and not reduction and limit is None:
+        tgt_ds = translateLayer(src, tgt_file, driverName, layerName, batchSize=batchSize, options=layer_options, datasetOptions=dataset_options, filters=filters, fields=fields, callback=callback)
     else:
-        driver = ogr.GetDriverByName(tgtFormat)
-    if path.exists(tgt):
-        driver.DeleteDataSource(tgt)
+        # Reprojection and/or reduction of the geometries
+        tgt_spatial_ref = spatialReference(tgtCRS) if tgtCRS is not None else src_spatial_ref
+        if not reduction and limit is None and hasTraditionalAxisOrder(src_spatial_ref) and hasTraditionalAxisOrder(tgt_spatial_ref):
+            srcSRS = crsString(srcCRS) if srcCRS is not None else None
+            tgt_ds = translateLayer(src, tgt_file, driverName, layerName, srcSRS=srcSRS, dstSRS=crsString(tgtCRS), batchSize=batchSize, options=layer_options, datasetOptions=dataset_options, filters=filters, fields=fields, callback=callback)
+        else:
+            filterLayer(layer, src_spatial_ref, filters)
+            coordTrans = coordinateTransformation(src_spatial_ref, tgt_spatial_ref) if tgtCRS is not None else None
+            tgt_ds = driver.CreateDataSource(tgt_file, options=dataset_options)
+            reprojectLayer(layer, tgt_ds, coordTrans, tgt_spatial_ref, batchSize=batchSize, options=layer_options, fields=fields, reduction=reduction, start=start, limit=limit, callback=callback)
 
-    if coordTrans is not None:
-        if driver.GetName() == 'CSV':
-            tgt_ds = driver.CreateDataSource(tgt, options=['GEOMETRY=AS_WKT'])
+    src_ds = None
+    tgt_ds = None
+
+def layerPartitions(src, layerName, filters=None, partitionSize=None):
+    """Splits a large layer into ranges of features, to be transformed independently.
+    Layers with an FID column (e.g. GeoPackage) are split into FID ranges, read through the index of the column;
+    unfiltered layers with fast random access (e.g. Shapefile, FlatGeobuf) are split into ranges of feature indices.
+    Parameters:
+        src (string): Full path of source file.
+        layerName (string): The name of the layer.
+        filters (dict): The filters of the layer (see vectorTransform).
+        partitionSize (int): Number of features of each partition. If None, VECTOR_PARTITION_SIZE is used.
+    Returns:
+        (list) The partitions, as ('fid', first, end) or ('index', start, count) tuples; None if the layer is
+            not split.
+    """
+    partitionSize = partitionSize if partitionSize is not None else PARTITION_SIZE
+    if partitionSize <= 0:
+        return None
+    src_ds = ogr.Open(src)
+    if src_ds is None:
+        return None
+    layer = src_ds.GetLayerByName(layerName)
+    count = layer.GetFeatureCount(0)
+    if count <= partitionSize:
+        return None
+    parts = -(-count // partitionSize)
+    fid_column = layer.GetFIDColumn()
+    if fid_column:
+        try:
+            result = src_ds.ExecuteSQL('SELECT MIN("%s"), MAX("%s") FROM "%s"' % (fid_column, fid_column, layerName.replace('"', '""')))
+        except RuntimeError:
+            return None
+        if result is None:
+            return None
+        feature = result.GetNextFeature()
+        first, last = feature.GetFieldAsInteger64(0), feature.GetFieldAsInteger64(1)
+        src_ds.ReleaseResultSet(result)
+        step = -(-(last - first + 1) // parts)
+        return [('fid', start, min(start + step, last + 1)) for start in range(first, last + 1, step)]
+    if not filters and layer.TestCapability(ogr.OLCFastSetNextByIndex):
+        return [('index', start, partitionSize) for start in range(0, count, partitionSize)]
+    return None
+
+def unionLayer(filename, layerName, sources):
+    """Writes a VRT with the union of the layers of the same name in sources, read one after the other.
+    Parameters:
+        filename (string): Full path of the VRT file.
+        layerName (string): The name of the layer in each source, and of the union layer.
+        sources (list): Full paths of the sources, in order.
+    Returns:
+        (string) The filename.
+    """
+    root = ElementTree.Element('OGRVRTDataSource')
+    union = ElementTree.SubElement(root, 'OGRVRTUnionLayer', name=layerName)
+    for i, source in enumerate(sources):
+        layer = ElementTree.SubElement(union, 'OGRVRTLayer', name='%s_%d' % (layerName, i))
+        ElementTree.SubElement(layer, 'SrcDataSource').text = source
+        ElementTree.SubElement(layer, 'SrcLayer').text = layerName
+    ElementTree.ElementTree(root).write(filename, encoding='utf-8')
+    return filename
+
+def transformPartition(*args, **kwargs):
+    """Transforms a partition of a layer (see transformLayer) in a worker process."""
+    gdal.UseExceptions()
+    transformLayer(*args, **kwargs)
+
+def partitionedTransformLayer(src, layerName, tgt_file, driverName, partitions, workers=None, srcCRS=None, tgtCRS=None, batchSize=None, creationOptions=None, layerOptions=None, filters=None, reduction=None, callback=None):
+    """Transforms a large layer of src into tgt_file, in partitions transformed by parallel worker processes.
+    Each partition is transformed (see transformLayer) into a GeoPackage without spatial index; the partial
+    outputs are then merged in order into tgt_file by a single GDAL translate of their union (see unionLayer),
+    so that the target driver does not need to append into an existing file. Unlike threads, the processes
+    scale the feature loop of reprojectLayer, which holds the GIL.
+    Parameters:
+        partitions (list): The partitions of the layer (see layerPartitions).
+        workers (int): Maximum number of worker processes. If None, TRANSFORM_WORKERS is used.
+        (see transformLayer for the rest of parameters)
+    """
+    directory = tgt_file + '.partitions'
+    makedirs(directory, exist_ok=True)
+    partials = [path.join(directory, '%d.gpkg' % (i)) for i in range(0, len(partitions))]
+    # Worker processes are spawned, since forking a process with running threads (and GDAL state) is unsafe.
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers or WORKERS, len(partitions)), mp_context=context) as pool:
+            futures = [pool.submit(transformPartition, src, layerName, partial, 'GPKG', srcCRS=srcCRS, tgtCRS=tgtCRS, batchSize=batchSize, layerOptions={'SPATIAL_INDEX': 'NO'}, filters=filters, reduction=reduction, partition=partition) for partial, partition in zip(partials, partitions)]
+            for done, future in enumerate(as_completed(futures)):
+                future.result()
+                if callback is not None:
+                    callback(0.9 * (done + 1) / len(futures), '%d of %d partitions' % (done + 1, len(futures)), None)
+        driver = ogr.GetDriverByName(driverName)
+        if path.exists(tgt_file):
+            driver.DeleteDataSource(tgt_file)
+        layer_options = layerCreationOptions(driverName, layerOptions)
+        dataset_options = formatOptions(creationOptions)
+        union = unionLayer(path.join(directory, 'union.vrt'), layerName, partials)
+        tgt_ds = translateLayer(union, tgt_file, driverName, layerName, batchSize=batchSize, options=layer_options, datasetOptions=dataset_options)
+        tgt_ds = None
+        if callback is not None:
+            callback(1.0, 'merged %d partitions' % (len(partials)), None)
+    finally:
+        rmtree(directory, ignore_errors=True)
+
+def vectorFootprint(workers, targets=1, processes=0):
+    """Estimates the memory needed to transform vector layers.
+    Parameters:
+        workers (int): The number of layers transformed concurrently.
+        targets (int): The number of outputs written from each layer.
+        processes (int): The number of worker processes transforming partitions of large layers; each one
+            has the overhead of a job.
+    Returns:
+        (int) The estimated bytes.
+    """
+    return (JOB_MEMORY_OVERHEAD + workers * targets * LAYER_MEMORY + processes * (JOB_MEMORY_OVERHEAD + LAYER_MEMORY)) * 1024 * 1024
+
+def vectorTransform(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None, batchSize=None, workers=None, partitionSize=None, creationOptions=None, layerOptions=None, filters=None, reduction=None, packaging=None, compressionLevel=None, progress=None, admission=None):
+    """Transforms vector src to tgt, changing file type and/or CRS.
+    Every layer of src (or of each file inside src, if it is a directory) is transformed into a separate
+    file in tgt; independent layers are transformed concurrently by a pool of at most `workers` threads.
+    Layers larger than partitionSize features are then split into partitions, transformed one layer
+    at a time by at most `workers` processes (see partitionedTransformLayer).
+    Parameters:
+        src (string): Full path of source (original) file or directory.
+        tgt (string): Full path of target directory.
+        srcCRS (int|string): The source file native CRS (EPSG code or any CRS definition understood by GDAL), if None it is determined from the file metadata.
+        tgtCRS (int|string): The CRS in which the geometries will be projected. If None, no projection will take place.
+        tgtFormat (string): The format into which the file will be transformed. It corresponds to GDAL vector
+            short drivers names (https://gdal.org/drivers/vector/index.html).
+            If None, the file will keep the original format.
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        workers (int): Maximum number of layers (or partitions) transformed concurrently. If None,
+            TRANSFORM_WORKERS is used; with a single worker, layers are not partitioned.
+        partitionSize (int): Number of features of each partition of a large layer. If None, VECTOR_PARTITION_SIZE
+            is used.
+        creationOptions (dict): Dataset creation options of the target driver (see options.validateOptions).
+        layerOptions (dict): Layer creation options of the target driver (e.g. SPATIAL_INDEX=YES).
+        filters (dict): Filters pushed down to each source layer, with any of the keys: bbox (minx, miny, maxx,
+            maxy, easting first), bboxCRS (the CRS of bbox; if None, bbox is in the coordinates of the layer),
+            where (an OGR SQL attribute filter) and fields (the names of the fields kept).
+        reduction (dict): Reduces the size of the output geometries, simplifying them and/or rounding their
+            coordinates in the feature loop (see geometryReducer).
+        packaging (string): The codec used to pack the results (see packaging.pack).
+        compressionLevel (int): The compression level of the packaging codec.
+        progress (Progress): Tracks the progress of the transformation; each layer is a task.
+        admission (memory.Admission): Admits the job into the memory budget; the layers are transformed
+            once their estimated footprint fits in it.
+    Returns:
+        (string) Full path of the resulting archive.
+    """
+    if progress is not None:
+        progress.stage('opening', 0, 0)
+    sources = vectorSources(src)
+    if len(sources) == 0:
+        raise UnsupportedFileError('File driver not supported.')
+    if not path.isdir(tgt):
+        makedirs(tgt)
+
+    workers = workers or WORKERS
+    jobs = []
+    partitioned = []
+    used = set()
+    for filename, layerName, driverName in sources:
+        driverName = ogr.GetDriverByName(tgtFormat or driverName).GetName()
+        job = (filename, layerName, targetFile(tgt, outputName(layerName, used), driverName), driverName)
+        partitions = layerPartitions(filename, layerName, filters=filters, partitionSize=partitionSize) if workers > 1 else None
+        if partitions is None:
+            jobs.append(job)
         else:
-            tgt_ds = driver.CreateDataSource(tgt)
-        tgt_layer = tgt_ds.CreateLayer(layer.GetName(), srs=tgt_spatial_ref, geom_type=layer.GetGeomType())
+            partitioned.append((job, partitions))
 
-        layer_defn = layer.GetLayerDefn()
-        for i in range(0, layer_defn.GetFieldCount()):
-            field_defn = layer_defn.GetFieldDefn(i)
-            tgt_layer.CreateField(field_defn)
+    threads = min(workers, len(jobs))
+    processes = workers if len(partitioned) > 0 else 0
+    with admission.reserve(vectorFootprint(threads, processes=processes)) if admission is not None else nullcontext():
+        if progress is not None:
+            progress.stage('transforming', 0, 90, tasks=len(jobs) + len(partitioned))
+        callbacks = [progress.callback(i) if progress is not None else None for i in range(0, len(jobs) + len(partitioned))]
+        if threads <= 1:
+            for job, callback in zip(jobs, callbacks):
+                transformLayer(*job, srcCRS=srcCRS, tgtCRS=tgtCRS, batchSize=batchSize, creationOptions=creationOptions, layerOptions=layerOptions, filters=filters, reduction=reduction, callback=callback)
+        else:
+            # GDAL releases the GIL while translating, so layers are reprojected in parallel threads.
+            runLayers(transformLayer, [(job, dict(srcCRS=srcCRS, tgtCRS=tgtCRS, batchSize=batchSize, creationOptions=creationOptions, layerOptions=layerOptions, filters=filters, reduction=reduction, callback=callback)) for job, callback in zip(jobs, callbacks)], threads)
+        for (job, partitions), callback in zip(partitioned, callbacks[len(jobs):]):
+            partitionedTransformLayer(*job, partitions, workers=workers, srcCRS=srcCRS, tgtCRS=tgtCRS, batchSize=batchSize, creationOptions=creationOptions, layerOptions=layerOptions, filters=filters, reduction=reduction, callback=callback)
 
-        tgt_layer_defn = tgt_layer.GetLayerDefn()
-        feature = layer.GetNextFeature()
-        while feature:
-            geom = feature.GetGeometryRef()
-            geom.Transform(coordTrans)
-            tgt_feature = ogr.Feature(tgt_layer_defn)
-            tgt_feature.SetGeometry(geom)
-            for i in range(0, tgt_layer_defn.GetFieldCount()):
-                tgt_feature.SetField(tgt_layer_defn.GetFieldDefn(i).GetNameRef(), feature.GetField(i))
-            tgt_layer.CreateFeature(tgt_feature)
-            tgt_feature = None
-            feature = layer.GetNextFeature()
+    if progress is not None:
+        progress.stage('packaging', 90, 100)
+    return pack(tgt, codec=packaging, level=compressionLevel)
+
+def layerPool():
+    """Returns the thread pool transforming layers, shared by the jobs of this process (created after a fork)."""
+    global _layer_pool
+    with _layer_pool_lock:
+        pid, pool = _layer_pool
+        if pid != getpid():
+            pool = ThreadPoolExecutor(max_workers=LAYER_THREADS, thread_name_prefix='layer')
+            _layer_pool = (getpid(), pool)
+        return pool
+
+def runLayers(function, calls, threads):
+    """Runs function for each call in the layer pool, at most threads of them at a time.
+    Parameters:
+        function (callable): The function transforming a layer.
+        calls (list): The (args, kwargs) of each call.
+        threads (int): Maximum number of concurrent calls of this job.
+    Raises:
+        Exception: The first exception raised by a call; the calls not yet started are skipped.
+    """
+    pool = layerPool()
+    pending = set()
+    try:
+        for args, kwargs in calls:
+            if len(pending) >= threads:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(pool.submit(function, *args, **kwargs))
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+    finally:
+        # The job should not return (and remove its files) while any of its layers is still running.
+        for future in pending:
+            future.cancel()
+        wait(pending)
+
+def targetName(target, used):
+    """Names the directory of a fan-out target after its CRS and format (e.g. EPSG_3857_GPKG).
+    Parameters:
+        target (dict): The target (see vectorFanout).
+        used (set): The names already given; the new name is added to it.
+    Returns:
+        (string) The directory name.
+    """
+    crs = target.get('tgtCRS')
+    if crs is None:
+        label = 'native'
+    elif re.match(r'^EPSG:\d+$', crsString(crs)):
+        label = crsString(crs)
+    else:
+        label = 'custom'
+    return outputName('%s_%s' % (label, target.get('tgtFormat') or 'native'), used)
+
+def fanoutTransformLayer(src, layerName, tgt_files, driverNames, targets, srcCRS=None, batchSize=None, filters=None, callback=None):
+    """Transforms a single layer of src into a file for each target, reading the layer only once.
+    Parameters:
+        src (string): Full path of source file.
+        layerName (string): The name of the layer to transform.
+        tgt_files (list): Full path of the target file of each target.
+        driverNames (list): The GDAL short name of the driver of each target.
+        targets (list): The targets (see vectorFanout).
+        srcCRS (int|string): The source layer native CRS, if None it is determined from the layer metadata.
+        batchSize (int): Number of features written in each transaction. If None, VECTOR_BATCH_SIZE is used.
+        filters (dict): The spatial, attribute and field filters of the layer (see vectorTransform).
+        callback (function): A GDAL progress callback.
+    """
+    src_ds = ogr.Open(src)
+    if src_ds is None:
+        raise Exception('File driver not supported.')
+    layer = src_ds.GetLayerByName(layerName)
+    if srcCRS is None:
+        src_spatial_ref = layer.GetSpatialRef()
     else:
-        if driver.GetName() == 'CSV':
-            tgt_ds = driver.CopyDataSource(src_ds, tgt, options=['GEOMETRY=AS_WKT'])
+        src_spatial_ref = spatialReference(srcCRS)
+    fields = filterLayer(layer, src_spatial_ref, filters)
+
+    outputs = []
+    for tgt_file, driverName, target in zip(tgt_files, driverNames, targets):
+        driver = ogr.GetDriverByName(driverName)
+        if path.exists(tgt_file):
+            driver.DeleteDataSource(tgt_file)
+        tgt_ds = driver.CreateDataSource(tgt_file, options=formatOptions(target.get('creationOptions')))
+        if target.get('tgtCRS') is None:
+            coordTrans = None
+            tgt_spatial_ref = src_spatial_ref
         else:
-            tgt_ds = driver.CopyDataSource(src_ds, tgt)
+            tgt_spatial_ref = spatialReference(target['tgtCRS'])
+            coordTrans = coordinateTransformation(src_spatial_ref, tgt_spatial_ref)
+        outputs.append((tgt_ds, coordTrans, tgt_spatial_ref, layerCreationOptions(driverName, target.get('layerOptions')), target.get('reduction')))
+    fanoutLayer(layer, outputs, batchSize=batchSize, fields=fields, callback=callback)
 
     src_ds = None
-    tgt_ds = None
+    outputs = None
 
-    result = tgt + '.tar.gz'
-    with tarfile.open(result, "w:gz") as tar:
-        for file in listdir(tgt):
-            tar.add(path.join(tgt, file), arcname=file)
+def packTargets(tgt, directories, separate=False, packaging=None, compressionLevel=None):
+    """Packs the outputs of the fan-out targets.
+    Parameters:
+        tgt (string): Full path of the target directory, containing a directory for each target.
+        directories (list): Full path of the directory of each target.
+        separate (bool): If True, each target is packed into its own archive, and the archives are packed together
+            (stored, since they are already compressed); otherwise, all targets are packed into one archive.
+        packaging (string): The codec used to pack the results (see packaging.pack).
+        compressionLevel (int): The compression level of the packaging codec.
+    Returns:
+        (string) Full path of the resulting archive.
+    """
+    if separate:
+        for directory in directories:
+            pack(directory, codec=packaging, level=compressionLevel)
+            rmtree(directory)
+    return pack(tgt, codec=packaging, level=compressionLevel)
 
-    return result
+def vectorFanout(src, tgt, targets, srcCRS=None, separate=False, batchSize=None, workers=None, filters=None, packaging=None, compressionLevel=None, progress=None, admission=None):
+    """Transforms vector src into multiple targets, each one with its own CRS and format, reading src only once.
+    Each feature is read once and written into every target; the outputs of each target are placed in a
+    directory named after its CRS and format (see targetName). As in vectorTransform, independent layers are
+    transformed concurrently.
+    Parameters:
+        src (string): Full path of source (original) file or directory.
+        tgt (string): Full path of target directory.
+        targets (list): The targets, as dictionaries with the keys tgtCRS, tgtFormat, creationOptions,
+            layerOptions and reduction (see vectorTransform); any of them may be omitted.
+        srcCRS (int|string): The source file native CRS, if None it is determined from the file metadata.
+        separate (bool): Whether each target is packed in its own archive (see packTargets).
+        (see vectorTransform for the rest of parameters)
+    Returns:
+        (string) Full path of the resulting archive.
+    """
+    if progress is not None:
+        progress.stage('opening', 0, 0)
+    sources = vectorSources(src)
+    if len(sources) == 0:
+        raise UnsupportedFileError('File driver not supported.')
+    used = set()
+    directories = [path.join(tgt, targetName(target, used)) for target in targets]
+    for directory in directories:
+        makedirs(directory, exist_ok=True)
 
-def rasterTransform(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None):
-    """Transforms and resamples raster src to tgt, changing file type and/or CRS.
+    jobs = []
+    used = set()
+    for filename, layerName, driverName in sources:
+        name = outputName(layerName, used)
+        driverNames = [ogr.GetDriverByName(target.get('tgtFormat') or driverName).GetName() for target in targets]
+        tgt_files = [targetFile(directory, name, targetDriver) for directory, targetDriver in zip(directories, driverNames)]
+        jobs.append((filename, layerName, tgt_files, driverNames))
+
+    workers = min(workers or WORKERS, len(jobs))
+    with admission.reserve(vectorFootprint(workers, len(targets))) if admission is not None else nullcontext():
+        if progress is not None:
+            progress.stage('transforming', 0, 90, tasks=len(jobs))
+        callbacks = [progress.callback(i) if progress is not None else None for i in range(0, len(jobs))]
+        if workers <= 1:
+            for job, callback in zip(jobs, callbacks):
+                fanoutTransformLayer(*job, targets, srcCRS=srcCRS, batchSize=batchSize, filters=filters, callback=callback)
+        else:
+            runLayers(fanoutTransformLayer, [(job + (targets,), dict(srcCRS=srcCRS, batchSize=batchSize, filters=filters, callback=callback)) for job, callback in zip(jobs, callbacks)], workers)
+
+    if progress is not None:
+        progress.stage('packaging', 90, 100)
+    return packTargets(tgt, directories, separate=separate, packaging=packaging, compressionLevel=compressionLevel)
+
+def warpOutputOptions(window, src_spatial_ref, tgtCRS=None):
+    """Forms the warp options of the output grid of a raster, from its window.
+    The warper reads only the source blocks intersecting the extent; when the resolution is coarser than that
+    of the source, it reads the closest (not coarser) source overview instead of the full resolution.
     Parameters:
-        src (string): Full path of source (original) file.
-        tgt (string): Full path of target file.
-        srcCRS (string): The source file native CRS, if None it is determined from the file metadata.
-        tgtCRS (string): The CRS in which the raster will be projected. If None, no projection will take place.
-        tgtFormat (string): The format into which the file will be transformed. It corresponds to GDAL raster
-            short drivers names (https://gdal.org/drivers/raster/index.html).
-            If None, the file will keep the original format.
+        window (dict): The output grid, with any of the keys: bbox (minx, miny, maxx, maxy, easting first),
+            bboxCRS (the CRS of bbox; if None, the source CRS), resolution (x and y pixel size, in target CRS units)
+            and size (width and height in pixels; either may be 0, keeping the aspect ratio).
+        src_spatial_ref (osr.SpatialReference): The spatial reference of the source raster.
+        tgtCRS (int|string): The target CRS; if None, the raster keeps the source CRS.
+    Returns:
+        (dict) Keyword arguments of gdal.WarpOptions.
+    """
+    options = {'options': ['-ovr', 'AUTO']}
+    if window is None:
+        return options
+    if window.get('bbox') is not None:
+        options['outputBounds'] = window['bbox']
+        if window.get('bboxCRS') is not None:
+            options['outputBoundsSRS'] = crsString(window['bboxCRS'])
+        elif tgtCRS is not None and src_spatial_ref is not None:
+            options['outputBoundsSRS'] = src_spatial_ref.ExportToWkt()
+    if window.get('resolution') is not None:
+        options['xRes'], options['yRes'] = window['resolution']
+    if window.get('size') is not None:
+        options['width'], options['height'] = window['size']
+    return options
+
+def warpRaster(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None, resampling=None, warpThreads=None, warpMemory=None, errorThreshold=None, creationOptions=None, window=None, callback=None):
+    """Warps raster src into a file inside tgt directory, changing file type, CRS and/or output grid.
+    The raster is warped with multiple threads straight into the target file, if the target driver supports
+    creation of new datasets; otherwise (e.g. COG), it is warped into a VRT and copied into the target format,
+    compressing and building overviews with the warp threads.
+    Parameters:
+        src (string): Full path of source raster file.
+        tgt (string): Full path of target directory.
+        callback (function): A GDAL progress callback.
+        (see rasterTransform for the rest of parameters)
+    Returns:
+        (string) Full path of the target file.
     """
     src_ds = gdal.Open(src, gdal.GA_ReadOnly)
     if src_ds is None:
@@ -115,34 +915,163 @@ def rasterTransform(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None):
     if srcCRS is None:
         src_spatial_ref = src_ds.GetSpatialRef()
     else:
-        src_spatial_ref = osr.SpatialReference()
-        src_spatial_ref.ImportFromEPSG(srcCRS)
+        src_spatial_ref = spatialReference(srcCRS)
     if tgtCRS is not None:
-        tgt_spatial_ref = osr.SpatialReference()
-        tgt_spatial_ref.ImportFromEPSG(tgtCRS)
-        coordTrans = osr.CoordinateTransformation(src_spatial_ref, tgt_spatial_ref)
+        tgt_spatial_ref = spatialReference(tgtCRS)
     else:
         tgt_spatial_ref = src_spatial_ref
-        coordTrans = None
 
     if tgtFormat is None:
         driver = src_ds.GetDriver()
     else:
         driver = gdal.GetDriverByName(tgtFormat)
-    filename = path.splitext(path.basename(src))[0]
+    filename = path.basename(src)
+    if src.startswith('/vsigzip/') and filename.endswith('.gz'):
+        filename = filename[:-3]
+    filename = path.splitext(filename)[0]
     extension = driver.GetMetadataItem(gdal.DMD_EXTENSIONS).split(' ')[0]
     tgt_file = path.join(tgt, filename + '.' + extension)
+    if path.exists(tgt_file):
+        driver.Delete(tgt_file)
 
-    mem_ds = gdal.Warp('', src_ds, format='VRT', srcSRS=src_spatial_ref, dstSRS=tgt_spatial_ref)
-    tgt_ds = driver.CreateCopy(tgt_file, mem_ds, strict=0)
+    threads = warpThreads or WARP_THREADS
+    creation_options = dict(COG_OPTIONS, NUM_THREADS=threads) if driver.ShortName == 'COG' else {}
+    creation_options.update(creationOptions or {})
+    warp_options = {
+        'srcSRS': src_spatial_ref,
+        'dstSRS': tgt_spatial_ref,
+        'resampleAlg': resampling or RESAMPLING,
+        'multithread': True,
+        'warpOptions': ['NUM_THREADS=%s' % (threads)],
+        'warpMemoryLimit': (warpMemory or WARP_MEMORY) * 1024 * 1024,
+        'errorThreshold': errorThreshold if errorThreshold is not None else ERROR_THRESHOLD,
+    }
+    warp_options.update(warpOutputOptions(window, src_spatial_ref, tgtCRS=tgtCRS))
+    if driver.GetMetadataItem(gdal.DCAP_CREATE) == 'YES':
+        mem_ds = None
+        tgt_ds = gdal.Warp(tgt_file, src_ds, format=driver.ShortName, creationOptions=formatOptions(creation_options), callback=callback, **warp_options)
+    else:
+        mem_ds = gdal.Warp('', src_ds, format='VRT', **warp_options)
+        # Overviews are computed with multiple threads as well.
+        gdal.SetThreadLocalConfigOption('GDAL_NUM_THREADS', threads)
+        try:
+            tgt_ds = driver.CreateCopy(tgt_file, mem_ds, strict=0, options=formatOptions(creation_options), callback=callback)
+        finally:
+            gdal.SetThreadLocalConfigOption('GDAL_NUM_THREADS', None)
 
     src_ds = None
     tgt_ds = None
     mem_ds = None
 
-    result = tgt + '.tar.gz'
-    with tarfile.open(result, "w:gz") as tar:
-        for file in listdir(tgt):
-            tar.add(path.join(tgt, file), arcname=file)
+    return tgt_file
+
+def rasterFootprint(sources, warpMemory, limit=None):
+    """Estimates the memory needed to warp rasters, and the warp memory limit to use.
+    The warper processes chunks of at most warpMemory (source and target pixels together), keeping two chunks
+    in flight when multithreaded; a raster smaller than that needs only its own size.
+    Parameters:
+        sources (list): Full paths of the rasters, warped one after the other.
+        warpMemory (int): The warp memory limit in MB.
+        limit (int): The memory (in bytes) available to the job, if limited; the warp memory limit is reduced
+            to fit in it.
+    Returns:
+        (tuple) The estimated bytes, and the warp memory limit in MB.
+    """
+    overhead = JOB_MEMORY_OVERHEAD * 1024 * 1024
+    if limit is not None:
+        warpMemory = max(min(warpMemory, (limit - overhead) // 2 // (1024 * 1024)), WARP_MEMORY_MIN)
+    largest = 0
+    for filename in sources:
+        ds = gdal.Open(filename, gdal.GA_ReadOnly)
+        pixel = sum(gdal.GetDataTypeSize(ds.GetRasterBand(i).DataType) // 8 for i in range(1, ds.RasterCount + 1))
+        largest = max(largest, ds.RasterXSize * ds.RasterYSize * pixel)
+        ds = None
+    chunk = min(warpMemory * 1024 * 1024, 2 * largest)
+    return overhead + 2 * chunk, warpMemory
+
+def rasterTransform(src, tgt, srcCRS=None, tgtCRS=None, tgtFormat=None, resampling=None, warpThreads=None, warpMemory=None, errorThreshold=None, creationOptions=None, window=None, packaging=None, compressionLevel=None, progress=None, admission=None):
+    """Transforms and resamples raster src to tgt, changing file type and/or CRS.
+    Each raster found in src (if it is a directory or an archive) is warped with warpRaster.
+    Parameters:
+        src (string): Full path of source (original) file or directory.
+        tgt (string): Full path of target directory.
+        srcCRS (int|string): The source file native CRS (EPSG code or any CRS definition understood by GDAL), if None it is determined from the file metadata.
+        tgtCRS (int|string): The CRS in which the raster will be projected. If None, no projection will take place.
+        tgtFormat (string): The format into which the file will be transformed. It corresponds to GDAL raster
+            short drivers names (https://gdal.org/drivers/raster/index.html).
+            If None, the file will keep the original format.
+        resampling (string): The resampling method (e.g. near, bilinear, cubic). If None, RASTER_RESAMPLING is used.
+        warpThreads (string): Number of warping threads, or ALL_CPUS. If None, RASTER_WARP_THREADS is used.
+        warpMemory (int): Warp memory limit in MB. If None, RASTER_WARP_MEMORY is used.
+        errorThreshold (float): Error threshold (in pixels) for the approximation of the transformation.
+            If None, RASTER_ERROR_THRESHOLD is used.
+        creationOptions (dict): Creation options of the target driver (see options.validateOptions); for COG,
+            they override RASTER_COG_OPTIONS.
+        window (dict): The extent, resolution or size of the output (see warpOutputOptions); if None, the whole
+            raster is warped at the resolution of the source.
+        packaging (string): The codec used to pack the results (see packaging.pack).
+        compressionLevel (int): The compression level of the packaging codec.
+        progress (Progress): Tracks the progress of the transformation; each raster is a task.
+        admission (memory.Admission): Admits the job into the memory budget; the rasters are warped once their
+            estimated footprint fits in it, with the warp memory limit reduced to fit in the budget.
+    Returns:
+        (string) Full path of the resulting archive.
+    """
+    if progress is not None:
+        progress.stage('opening', 0, 0)
+    sources = rasterSources(src)
+    if len(sources) == 0:
+        raise UnsupportedFileError('File driver not supported.')
+    if not path.isdir(tgt):
+        makedirs(tgt)
+    footprint, warpMemory = rasterFootprint(sources, warpMemory or WARP_MEMORY, limit=admission.limit if admission is not None else None)
+    with admission.reserve(footprint) if admission is not None else nullcontext():
+        if progress is not None:
+            progress.stage('transforming', 0, 90, tasks=len(sources))
+        for i, filename in enumerate(sources):
+            callback = progress.callback(i) if progress is not None else None
+            warpRaster(filename, tgt, srcCRS=srcCRS, tgtCRS=tgtCRS, tgtFormat=tgtFormat, resampling=resampling, warpThreads=warpThreads, warpMemory=warpMemory, errorThreshold=errorThreshold, creationOptions=creationOptions, window=window, callback=callback)
+
+    if progress is not None:
+        progress.stage('packaging', 90, 100)
+    return pack(tgt, codec=packaging, level=compressionLevel)
+
+def rasterFanout(src, tgt, targets, srcCRS=None, separate=False, resampling=None, warpThreads=None, warpMemory=None, errorThreshold=None, window=None, packaging=None, compressionLevel=None, progress=None, admission=None):
+    """Transforms raster src into multiple targets, each one with its own CRS and format.
+    The source is uploaded, extracted and probed once; each raster is then warped into every target in turn,
+    so that its blocks are read from the GDAL block cache, rather than the file, as long as they fit in it.
+    (Warps into different grids read different windows of the source, so they can not share a single pass.)
+    Parameters:
+        src (string): Full path of source (original) file or directory.
+        tgt (string): Full path of target directory.
+        targets (list): The targets, as dictionaries with the keys tgtCRS, tgtFormat and creationOptions
+            (see rasterTransform); any of them may be omitted.
+        srcCRS (int|string): The source file native CRS, if None it is determined from the file metadata.
+        separate (bool): Whether each target is packed in its own archive (see packTargets).
+        (see rasterTransform for the rest of parameters)
+    Returns:
+        (string) Full path of the resulting archive.
+    """
+    if progress is not None:
+        progress.stage('opening', 0, 0)
+    sources = rasterSources(src)
+    if len(sources) == 0:
+        raise UnsupportedFileError('File driver not supported.')
+    used = set()
+    directories = [path.join(tgt, targetName(target, used)) for target in targets]
+    for directory in directories:
+        makedirs(directory, exist_ok=True)
+    footprint, warpMemory = rasterFootprint(sources, warpMemory or WARP_MEMORY, limit=admission.limit if admission is not None else None)
+    with admission.reserve(footprint) if admission is not None else nullcontext():
+        if progress is not None:
+            progress.stage('transforming', 0, 90, tasks=len(sources) * len(targets))
+        task = 0
+        for filename in sources:
+            for directory, target in zip(directories, targets):
+                callback = progress.callback(task) if progress is not None else None
+                warpRaster(filename, directory, srcCRS=srcCRS, tgtCRS=target.get('tgtCRS'), tgtFormat=target.get('tgtFormat'), resampling=resampling, warpThreads=warpThreads, warpMemory=warpMemory, errorThreshold=errorThreshold, creationOptions=target.get('creationOptions'), window=window, callback=callback)
+                task += 1
 
-    return result
+    if progress is not None:
+        progress.stage('packaging', 90, 100)
+    return packTargets(tgt, directories, separate=separate, packaging=packaging, compressionLevel=compressionLevel)
@@ -0,0 +1,6 @@
+"""Gunicorn server hooks; used as `gunicorn --config python:transform.gunicorn_config`."""
+
+def child_exit(server, worker):
+    """Discards the live metrics (e.g. running jobs) of an exited worker."""
+    from transform.metrics import markProcessDead
+    markProcessDead(worker.pid)
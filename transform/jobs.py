@@ -0,0 +1,196 @@
+from os import getenv, stat, kill, getpid, cpu_count
+from socket import gethostname
+from datetime import datetime, timedelta
+from logging import getLogger
+from shutil import rmtree
+import multiprocessing
+import signal
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import db
+from . import metrics
+
+# Where deferred jobs are queued: 'executor' (a thread pool inside each web worker) or 'database' (the
+# durable queue in the jobs table, processed by the standalone workers of `flask transform-worker`).
+JOB_QUEUE = getenv('JOB_QUEUE') or 'executor'
+# Default number of worker processes of `flask transform-worker`.
+WORKER_CONCURRENCY = int(getenv('WORKER_CONCURRENCY') or cpu_count() or 1)
+# Time (in seconds) after which a running job is considered abandoned by its worker.
+JOB_TIMEOUT = int(getenv('JOB_TIMEOUT') or 6 * 3600)
+# Maximum number of attempts to run a job.
+JOB_MAX_ATTEMPTS = int(getenv('JOB_MAX_ATTEMPTS') or 3)
+
+logger = getLogger(__name__)
+
+def push(dbc, ticket, src_path, working_path, date, gdal_params, cache_key=None, webhook=None, upload_time=None, profile=False, batch=None, commit=True):
+    """Inserts a ticket and its job in the queue, in a single transaction.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        ticket (string): The ticket of the job.
+        src_path (string): Full path of the source file; it should be reachable by the workers.
+        working_path (string): Full path of the working directory of the job.
+        date (string): The date (yymmdd) used to form the path of the result.
+        gdal_params (dict): The parameters passed to gdal_transform.
+        cache_key (string): The result cache key, if the cache is enabled.
+        webhook (string): The URL called when the job completes.
+        upload_time (float): The seconds spent saving the uploaded source file.
+        profile (bool): Whether the job will be profiled.
+        batch (string): The batch of the ticket, if submitted in a batch.
+        commit (bool): Whether to commit; if False, the caller commits, e.g. along with the rest of a batch.
+    """
+    filesize = stat(src_path).st_size
+    dbc.execute('INSERT INTO tickets (ticket, filesize, cache_key, webhook, upload_time, batch) VALUES(?, ?, ?, ?, ?, ?);', [ticket, filesize, cache_key, webhook, upload_time, batch])
+    dbc.execute('INSERT INTO jobs (ticket, src_path, working_path, date, gdal_params, profile) VALUES(?, ?, ?, ?, ?, ?);', [ticket, src_path, working_path, date, json.dumps(gdal_params), int(profile)])
+    if commit:
+        dbc.commit()
+
+def workerId():
+    """Identifies the current worker process (host:pid)."""
+    return '%s:%d' % (gethostname(), getpid())
+
+def claim(dbc, worker):
+    """Claims the oldest queued job for a worker; the claim is atomic, so each job is claimed exactly once.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        worker (string): The worker id.
+    Returns:
+        (sqlite3.Row) The claimed job, or None if the queue is empty.
+    """
+    cursor = dbc.execute("UPDATE jobs SET state='running', worker=?, claimed_time=CURRENT_TIMESTAMP, attempts=attempts+1 WHERE id = (SELECT id FROM jobs WHERE state='queued' ORDER BY id LIMIT 1) AND state='queued';", [worker])
+    dbc.commit()
+    if cursor.rowcount == 0:
+        return None
+    return dbc.execute("SELECT * FROM jobs WHERE worker=? AND state='running' ORDER BY id DESC LIMIT 1;", [worker]).fetchone()
+
+def finish(dbc, job_id):
+    """Removes a completed job from the queue."""
+    dbc.execute('DELETE FROM jobs WHERE id=?;', [job_id])
+    dbc.commit()
+
+def alive(pid):
+    """Checks whether a process of this host is running."""
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fail(dbc, job, comment, commit=True):
+    """Fails a job: its ticket is completed unsuccessfully, and the job is removed from the queue.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        job (sqlite3.Row): The job.
+        comment (string): The reason of the failure.
+        commit (bool): Whether to commit; if False, the caller commits.
+    """
+    dbc.execute("UPDATE tickets SET status=1, success=0, comment=?, stage='failed', eta=NULL WHERE ticket=?;", [comment, job['ticket']])
+    dbc.execute('DELETE FROM jobs WHERE id=?;', [job['id']])
+    if commit:
+        dbc.commit()
+
+def requeueStale(dbc):
+    """Requeues the jobs abandoned by their workers, i.e. claimed by a process of this host that is no longer
+    running; the claims of other hosts, whose processes cannot be checked, are abandoned after JOB_TIMEOUT
+    seconds. Jobs that have been attempted JOB_MAX_ATTEMPTS times fail instead.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+    Returns:
+        (int) The number of abandoned jobs.
+    """
+    host = gethostname()
+    oldest = datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT)
+    stale = []
+    for job in dbc.execute("SELECT id, ticket, worker, attempts, claimed_time FROM jobs WHERE state='running';").fetchall():
+        worker_host, separator, pid = (job['worker'] or '').rpartition(':')
+        if worker_host == host and pid.isdigit():
+            abandoned = not alive(int(pid))
+        else:
+            abandoned = job['claimed_time'] < oldest
+        if abandoned:
+            stale.append(job)
+    for job in stale:
+        if job['attempts'] >= JOB_MAX_ATTEMPTS:
+            logger.warning('Job of ticket %s failed after %d attempts.', job['ticket'], job['attempts'])
+            fail(dbc, job, 'Job abandoned after %d attempts.' % (job['attempts']), commit=False)
+        else:
+            logger.warning('Requeueing job of ticket %s, abandoned by worker %s.', job['ticket'], job['worker'])
+            dbc.execute("UPDATE jobs SET state='queued', worker=NULL WHERE id=? AND state='running';", [job['id']])
+    dbc.commit()
+    return len(stale)
+
+def work(stop, poll_interval):
+    """The loop of a worker process; claims and runs jobs until stop is set.
+    Parameters:
+        stop (multiprocessing.Event): Set when the worker should exit (after completing its current job).
+        poll_interval (float): Seconds to wait before polling again an empty queue.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from .app import app, runJob, completeJob
+    worker = workerId()
+    with app.app_context():
+        dbc = db.get_db()
+        while not stop.is_set():
+            try:
+                job = claim(dbc, worker)
+                if job is None:
+                    stop.wait(poll_interval)
+                    continue
+                logger.info('Worker %s running job of ticket %s.', worker, job['ticket'])
+                queued = (job['claimed_time'] - job['created_time']).total_seconds()
+                completion = runJob(job['ticket'], job['src_path'], job['working_path'], job['date'], json.loads(job['gdal_params']), queued=queued, profile=bool(job['profile']))
+                try:
+                    completeJob(*completion)
+                except Exception as e:
+                    # Otherwise, the job would stay claimed by this (running) worker for ever.
+                    logger.exception('Worker %s failed to complete job of ticket %s: %s', worker, job['ticket'], str(e))
+                    dbc.rollback()
+                    rmtree(job['working_path'], ignore_errors=True)
+                    fail(dbc, job, 'Failed to complete the job: %s' % (str(e)))
+                    continue
+                finish(dbc, job['id'])
+            except Exception as e:
+                logger.exception('Worker %s: %s', worker, str(e))
+                stop.wait(poll_interval)
+
+@click.command('transform-worker')
+@click.option('--concurrency', type=int, default=None, help='Number of worker processes (default: WORKER_CONCURRENCY).')
+@click.option('--poll-interval', type=float, default=1.0, help='Seconds between polls of an empty queue.')
+@with_appcontext
+def worker_command(concurrency, poll_interval):
+    """Run worker processes for the queued transform jobs."""
+    concurrency = concurrency or WORKER_CONCURRENCY
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    def shutdown(signum, frame):
+        click.echo('Stopping workers after their current jobs...')
+        stop.set()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Deployments may run only workers, besides a web server that is seldom requested.
+    from . import retention
+    retention.start(current_app._get_current_object())
+    click.echo('Starting %d workers.' % (concurrency))
+    processes = [None] * concurrency
+    while not stop.is_set():
+        requeueStale(db.get_db())
+        for i in range(0, concurrency):
+            if processes[i] is None or not processes[i].is_alive():
+                if processes[i] is not None:
+                    logger.warning('Worker process %d exited with code %s; restarting.', processes[i].pid, processes[i].exitcode)
+                    metrics.markProcessDead(processes[i].pid)
+                processes[i] = context.Process(target=work, args=(stop, poll_interval))
+                processes[i].start()
+        stop.wait(10 * poll_interval)
+    for process in processes:
+        process.join()
+
+def init_app(app):
+    app.cli.add_command(worker_command)
@@ -25,9 +25,10 @@ def getLoggers():
     mainLog = getLogger(getenv('FLASK_APP'))
     accountLog = getLogger(getenv('FLASK_APP') + '.accounting')
     accountLog.addFilter(ContextFilter())
-    def accountLogger(execution_start, execution_time, filesize, ticket='-', success=1, comment=None):
+    def accountLogger(execution_start, execution_time, filesize, ticket='-', success=1, comment=None, timings=None):
         assert isinstance(execution_start, date)
         success = bool(success)
         execution_start = execution_start.strftime("%Y-%m-%d %H:%M:%S")
-        accountLog.info("ticket=%s, success=%s, execution_start=%s, execution_time=%ss, comment=%s, filesize=%s", ticket, success, execution_start, execution_time, comment, filesize)
+        timings = ' '.join('%s=%ss' % (name, seconds) for name, seconds in sorted((timings or {}).items())) or '-'
+        accountLog.info("ticket=%s, success=%s, execution_start=%s, execution_time=%ss, comment=%s, filesize=%s, timings=%s", ticket, success, execution_start, execution_time, comment, filesize, timings)
     return (mainLog, accountLogger)
@@ -0,0 +1,173 @@
+from os import getenv, getpid, sysconf
+from socket import gethostname
+from contextlib import contextmanager
+from logging import getLogger
+from time import sleep
+import threading
+
+from osgeo import gdal
+
+from . import db
+from .jobs import alive
+
+MB = 1024 * 1024
+
+# Memory (in MB) available to the transform jobs of this node, shared by all its processes (web and job workers).
+# Jobs whose estimated footprint does not fit in the memory left wait, instead of running; if not set, jobs
+# are admitted at once.
+MEMORY_BUDGET = int(getenv('MEMORY_BUDGET')) * MB if getenv('MEMORY_BUDGET') else None
+# Seconds between two attempts of a waiting job to be admitted.
+MEMORY_POLL_INTERVAL = float(getenv('MEMORY_POLL_INTERVAL') or 1)
+# Seconds between two samples of the memory used by a running job.
+MEMORY_SAMPLE_INTERVAL = float(getenv('MEMORY_SAMPLE_INTERVAL') or 0.5)
+
+# The GDAL block cache is shared by the jobs of a process, and reserved once per process; unless set by
+# RASTER_CACHE_MAX, it is limited to a sixteenth of the budget.
+if MEMORY_BUDGET is not None and not getenv('RASTER_CACHE_MAX'):
+    gdal.SetCacheMax(min(gdal.GetCacheMax(), MEMORY_BUDGET // 16))
+
+logger = getLogger(__name__)
+
+def reserve(dbc, ticket, amount, budget):
+    """Reserves memory for a job, if it fits in the budget of this node.
+    Reservations of processes no longer running are discarded first; the block cache of the current process is
+    reserved along with its first job. A job is always admitted when no other job holds a reservation, so that
+    jobs estimated larger than the budget run alone rather than never.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        ticket (string): The ticket of the job.
+        amount (int): The estimated footprint (in bytes) of the job.
+        budget (int): The memory (in bytes) available to the jobs of this node.
+    Returns:
+        (bool) Whether the memory has been reserved.
+    """
+    host = gethostname()
+    pid = getpid()
+    for row in dbc.execute('SELECT DISTINCT pid FROM reservations WHERE host=?;', [host]).fetchall():
+        if not alive(row['pid']):
+            dbc.execute('DELETE FROM reservations WHERE host=? AND pid=?;', [host, row['pid']])
+    dbc.execute('INSERT INTO reservations (ticket, host, pid, memory) SELECT NULL, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM reservations WHERE host=? AND pid=? AND ticket IS NULL);', [host, pid, gdal.GetCacheMax(), host, pid])
+    cursor = dbc.execute('INSERT INTO reservations (ticket, host, pid, memory) SELECT ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM reservations WHERE host=? AND ticket IS NOT NULL) OR (SELECT SUM(memory) FROM reservations WHERE host=?) + ? <= ?;', [ticket, host, pid, amount, host, host, amount, budget])
+    dbc.commit()
+    return cursor.rowcount == 1
+
+def release(dbc, ticket):
+    """Releases the memory reserved for a job."""
+    dbc.execute('DELETE FROM reservations WHERE ticket=?;', [ticket])
+    dbc.commit()
+
+def reserved(dbc):
+    """The memory (in bytes) reserved on this node."""
+    return dbc.execute('SELECT COALESCE(SUM(memory), 0) AS memory FROM reservations WHERE host=?;', [gethostname()]).fetchone()['memory']
+
+def residentMemory():
+    """The resident memory (in bytes) of the current process, or None if it cannot be determined."""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class Sampler(object):
+    """Samples the resident memory of the process in a background thread, keeping the peak.
+    The peak includes the memory of any other job running in the same process.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = MEMORY_SAMPLE_INTERVAL if interval is None else interval
+        self.stopped = threading.Event()
+        self.baseline = residentMemory()
+        self.peak = self.baseline
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        rss = residentMemory()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.baseline is not None:
+            self.thread.start()
+
+    def stop(self):
+        """Stops sampling.
+        Returns:
+            (int) The peak growth (in bytes) of the resident memory since the start, or None if unknown.
+        """
+        if self.baseline is None:
+            return None
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        return self.peak - self.baseline
+
+class Admission(object):
+    """Admits a job into the memory budget of the node.
+    The engines estimate the footprint of a job from its datasets, size the memory of GDAL operations within
+    limit, and run the job inside reserve(). The estimated and the actual peak memory are recorded in the ticket,
+    so that the estimates can be calibrated.
+    """
+
+    def __init__(self, app, ticket, progress=None):
+        """
+        Parameters:
+            app (Flask): The application, providing the database.
+            ticket (string): The ticket of the job.
+            progress (Progress): The progress of the job; the time spent waiting is recorded as the 'waiting' stage.
+        """
+        self.app = app
+        self.ticket = ticket
+        self.progress = progress
+        self.limit = MEMORY_BUDGET
+        self.estimate = None
+        self.peak = None
+
+    def _acquire(self, estimate):
+        """Waits until estimate fits in the budget, and reserves it."""
+        waiting = False
+        while True:
+            with self.app.app_context():
+                if reserve(db.get_db(), self.ticket, estimate, self.limit):
+                    return
+            if not waiting:
+                logger.info('Ticket %s waits for %d MB of memory.', self.ticket, estimate // MB)
+                if self.progress is not None:
+                    self.progress.stage('waiting', 0, 0)
+                waiting = True
+            sleep(MEMORY_POLL_INTERVAL)
+
+    def _record(self):
+        """Records the estimated and the peak memory in the ticket."""
+        peak = self.peak // MB if self.peak is not None else None
+        logger.debug('Ticket %s: estimated %d MB, peak %s MB.', self.ticket, self.estimate // MB, peak)
+        with self.app.app_context():
+            dbc = db.get_db()
+            dbc.execute('UPDATE tickets SET memory_estimate=?, peak_memory=? WHERE ticket=?;', [self.estimate // MB, peak, self.ticket])
+            dbc.commit()
+
+    @contextmanager
+    def reserve(self, estimate):
+        """Runs the enclosed code once estimate fits in the budget, holding the reservation until it exits.
+        Parameters:
+            estimate (int): The estimated footprint (in bytes) of the job.
+        """
+        self.estimate = estimate
+        if self.limit is not None:
+            self._acquire(estimate)
+        sampler = Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            self.peak = sampler.stop()
+            try:
+                with self.app.app_context():
+                    if self.limit is not None:
+                        release(db.get_db(), self.ticket)
+                self._record()
+            except Exception as e:
+                logger.warning('Failed to release the memory of ticket %s: %s', self.ticket, str(e))
@@ -0,0 +1,110 @@
+from os import getenv, path, walk
+from socket import gethostname
+from shutil import disk_usage
+from time import monotonic
+from threading import Lock
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+from . import db
+
+# When set, the metrics of all processes (e.g. gunicorn workers, standalone job workers) are written to
+# this directory and aggregated on each scrape; it should be emptied before the server starts.
+MULTIPROC_DIR = getenv('PROMETHEUS_MULTIPROC_DIR')
+# Minimum time (in seconds) between two computations of the disk usage of the output and temporary directories.
+DISK_USAGE_INTERVAL = int(getenv('METRICS_DISK_INTERVAL') or 60)
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, float('inf'))
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(1, 14)) + (float('inf'),)
+
+REQUEST_DURATION = Histogram('transform_request_duration_seconds', 'Duration of transform requests.', ['src_type', 'format', 'response'], buckets=DURATION_BUCKETS)
+JOB_DURATION = Histogram('transform_job_duration_seconds', 'Duration of transform jobs.', ['src_type', 'format', 'response'], buckets=DURATION_BUCKETS)
+INPUT_SIZE = Histogram('transform_input_size_bytes', 'Size of the source files.', ['src_type'], buckets=SIZE_BUCKETS)
+OUTPUT_SIZE = Histogram('transform_output_size_bytes', 'Size of the resulting archives.', ['src_type', 'format'], buckets=SIZE_BUCKETS)
+PACKAGING_DURATION = Histogram('transform_packaging_duration_seconds', 'Duration of packaging, by codec and whether the files were stored (uncompressed).', ['codec', 'stored'], buckets=DURATION_BUCKETS)
+PACKAGING_INPUT = Histogram('transform_packaging_input_bytes', 'Size of the files packed, by codec and whether they were stored.', ['codec', 'stored'], buckets=SIZE_BUCKETS)
+PACKAGING_OUTPUT = Histogram('transform_packaging_output_bytes', 'Size of the packed archives, by codec and whether the files were stored.', ['codec', 'stored'], buckets=SIZE_BUCKETS)
+JOBS = Counter('transform_jobs_total', 'Transform jobs, by outcome (success, failure or cached).', ['src_type', 'outcome'])
+EVICTIONS = Counter('transform_results_evicted_total', 'Results evicted from the output directory, by reason (age, idle, quota or missing).', ['reason'])
+EXECUTOR_QUEUE = Gauge('transform_executor_queue_depth', 'Deferred jobs waiting in the executors.', multiprocess_mode='livesum')
+RUNNING = Gauge('transform_jobs_running', 'Transform jobs currently running.', multiprocess_mode='livesum')
+
+def labels(gdal_params):
+    """Forms the src_type and format labels of a job."""
+    if gdal_params.get('targets') is not None:
+        return {'src_type': gdal_params.get('type') or 'vector', 'format': 'multiple'}
+    return {'src_type': gdal_params.get('type') or 'vector', 'format': gdal_params.get('tgtFormat') or 'native'}
+
+def directorySize(directory):
+    """Computes the total size (in bytes) of the files inside directory."""
+    size = 0
+    for root, dirs, filenames in walk(directory):
+        for filename in filenames:
+            try:
+                size += path.getsize(path.join(root, filename))
+            except OSError:
+                pass
+    return size
+
+class StateCollector(object):
+    """Collects the metrics derived from the state of the service (database queue, disk usage) at scrape time."""
+
+    def __init__(self, app, tempdir):
+        self.app = app
+        self.tempdir = tempdir
+        self.lock = Lock()
+        self.disk = None
+        self.disk_time = None
+
+    def diskUsage(self):
+        """Returns the size of the output and temporary directories, recomputed at most every DISK_USAGE_INTERVAL."""
+        with self.lock:
+            if self.disk_time is None or monotonic() - self.disk_time >= DISK_USAGE_INTERVAL:
+                directories = {'output': getenv('OUTPUT_DIR'), 'temp': self.tempdir}
+                self.disk = {name: (directorySize(directory), disk_usage(directory).free) for name, directory in directories.items() if directory and path.isdir(directory)}
+                self.disk_time = monotonic()
+            return self.disk
+
+    def collect(self):
+        with self.app.app_context():
+            dbc = db.get_db()
+            queued = dbc.execute("SELECT COUNT(*) AS n FROM jobs WHERE state='queued';").fetchone()['n']
+            pending = dbc.execute('SELECT COUNT(*) AS n FROM tickets WHERE status=0;').fetchone()['n']
+            reserved = dbc.execute('SELECT COALESCE(SUM(memory), 0) AS memory FROM reservations WHERE host=?;', [gethostname()]).fetchone()['memory']
+        yield GaugeMetricFamily('transform_database_queue_depth', 'Deferred jobs waiting in the database job queue.', value=queued)
+        yield GaugeMetricFamily('transform_tickets_pending', 'Tickets not yet completed.', value=pending)
+        yield GaugeMetricFamily('transform_memory_reserved_bytes', 'Memory reserved by the jobs (and the block caches of the processes) of this node.', value=reserved)
+        used = GaugeMetricFamily('transform_disk_usage_bytes', 'Size of the files in the output and temporary directories.', labels=['directory'])
+        free = GaugeMetricFamily('transform_disk_free_bytes', 'Free space in the file system of the output and temporary directories.', labels=['directory'])
+        for name, (size, available) in self.diskUsage().items():
+            used.add_metric([name], size)
+            free.add_metric([name], available)
+        yield used
+        yield free
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+_state = CollectorRegistry()
+
+def latest():
+    """Renders the metrics of all processes in the Prometheus text format."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_state)
+
+def markProcessDead(pid):
+    """Discards the live metrics of an exited process."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+def init_app(app, tempdir):
+    """Registers the state metrics of app.
+    Parameters:
+        app (Flask): The application.
+        tempdir (string): The directory of the working paths of the jobs.
+    """
+    _state.register(StateCollector(app, tempdir))
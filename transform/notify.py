@@ -0,0 +1,174 @@
+from os import getenv, getpid
+from time import monotonic, sleep
+from logging import getLogger
+from urllib.parse import urlparse
+import urllib.request
+import ipaddress
+import socket
+import threading
+import sqlite3
+import json
+
+# Seconds between checks for tickets completed by other processes; a single thread of each process checks for
+# all the requests waiting for a ticket.
+NOTIFY_POLL_INTERVAL = float(getenv('NOTIFY_POLL_INTERVAL') or 0.25)
+# Maximum time (in seconds) a long-poll status request waits for the completion of a ticket, or a status event
+# stream stays open (the clients reconnect).
+STATUS_MAX_WAIT = int(getenv('STATUS_MAX_WAIT') or 60)
+# Seconds between the keep-alive messages of a status event stream.
+SSE_KEEPALIVE = int(getenv('SSE_KEEPALIVE') or 15)
+# Timeout (in seconds) and number of attempts of a webhook call.
+WEBHOOK_TIMEOUT = int(getenv('WEBHOOK_TIMEOUT') or 10)
+WEBHOOK_ATTEMPTS = int(getenv('WEBHOOK_ATTEMPTS') or 3)
+# Hosts that webhooks may call (comma-separated); if not set, any host resolving only to public addresses.
+WEBHOOK_ALLOWED_HOSTS = [host.strip().lower() for host in (getenv('WEBHOOK_ALLOWED_HOSTS') or '').split(',') if host.strip()]
+
+logger = getLogger(__name__)
+
+# The columns of a ticket forming its status.
+STATUS_COLUMNS = 'ticket, status, success, requested_time, execution_time, comment, progress, stage, eta, progress_time, queue_time, upload_time, extract_time, open_time, transform_time, packaging_time, move_time, wait_time, memory_estimate, peak_memory, filesize, output_size, result_size, evicted_time'
+
+# Requests waiting for a ticket sleep on this condition; it is notified whenever a job of this process
+# completes, or the watcher thread finds that the database has been changed by another connection.
+_condition = threading.Condition()
+_generation = 0
+# The process (id) where the watcher thread has been started.
+_watcher = None
+
+def notify():
+    """Wakes up the requests of this process that wait for a ticket."""
+    global _generation
+    with _condition:
+        _generation += 1
+        _condition.notify_all()
+
+def _watch(dbc):
+    """Starts (once per process) the thread that notifies the waiting requests when the database changes.
+    Parameters:
+        dbc (sqlite3.Connection): A connection to the database.
+    Returns:
+        (bool) Whether the database is watched; an in-memory database cannot be.
+    """
+    global _watcher
+    filename = dbc.execute('PRAGMA database_list;').fetchone()[2]
+    if not filename:
+        return False
+    with _condition:
+        if _watcher == getpid():
+            return True
+        _watcher = getpid()
+    threading.Thread(target=_poll, args=(filename,), daemon=True).start()
+    return True
+
+def _poll(filename):
+    """The loop of the watcher thread; checks the database data_version every NOTIFY_POLL_INTERVAL seconds."""
+    dbc = sqlite3.connect(filename)
+    version = None
+    while True:
+        try:
+            current = dbc.execute('PRAGMA data_version;').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning('Failed to check the database for changes: %s', str(e))
+            current = version
+        if version is not None and current != version:
+            notify()
+        version = current
+        sleep(NOTIFY_POLL_INTERVAL)
+
+def getTicket(dbc, ticket):
+    """Fetches the status columns of a ticket."""
+    return dbc.execute('SELECT %s FROM tickets WHERE ticket = ?;' % (STATUS_COLUMNS), [ticket]).fetchone()
+
+def wait(dbc, ticket, timeout):
+    """Waits until a ticket is completed.
+    The ticket is fetched again only when a job of this process has completed, or the database has been
+    changed by another connection; the database is checked by a single thread for all the waiting requests.
+    Still, each waiting request holds a server thread; a webhook is the scalable way to wait on many tickets.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        ticket (string): The ticket.
+        timeout (float): Maximum time to wait, in seconds.
+    Returns:
+        (sqlite3.Row) The ticket row, completed unless the timeout has expired; None if the ticket does not exist.
+    """
+    deadline = monotonic() + timeout
+    watched = _watch(dbc)
+    version = dbc.execute('PRAGMA data_version;').fetchone()[0]
+    with _condition:
+        generation = _generation
+    row = getTicket(dbc, ticket)
+    while row is not None and not row['status']:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        with _condition:
+            if _generation == generation:
+                _condition.wait(remaining if watched else min(remaining, NOTIFY_POLL_INTERVAL))
+            changed = _generation != generation
+            generation = _generation
+        if not watched:
+            current = dbc.execute('PRAGMA data_version;').fetchone()[0]
+            changed = changed or current != version
+            version = current
+        if changed:
+            row = getTicket(dbc, ticket)
+    return row
+
+def allowedHost(host, port=None):
+    """Checks whether a webhook may call host.
+    If WEBHOOK_ALLOWED_HOSTS is set, the host should be one of them; otherwise, all the addresses of the host
+    should be public (not loopback, private, link-local or reserved), so that webhooks cannot reach the internal
+    network of the service.
+    Parameters:
+        host (string): The host name or address.
+        port (int): The port, used in the address lookup.
+    Returns:
+        (bool) Whether the host is allowed.
+    """
+    if not host:
+        return False
+    if len(WEBHOOK_ALLOWED_HOSTS) > 0:
+        return host.lower() in WEBHOOK_ALLOWED_HOSTS
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+    except (socket.gaierror, UnicodeError):
+        return False
+    return len(addresses) > 0 and all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses)
+
+def validWebhook(url):
+    """Checks whether url is an acceptable webhook (an absolute http or https URL of an allowed host)."""
+    parsed = urlparse(url)
+    try:
+        port = parsed.port
+    except ValueError:
+        return False
+    return parsed.scheme in ['http', 'https'] and allowedHost(parsed.hostname, port)
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Fails on redirects, which could lead a webhook to a host that is not allowed."""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+def sendWebhook(url, payload):
+    """Posts payload as JSON to url, in a background thread, retrying with backoff on failure.
+    Parameters:
+        url (string): The webhook URL.
+        payload (dict): The body of the request.
+    """
+    data = json.dumps(payload).encode('utf8')
+    def post():
+        for attempt in range(0, WEBHOOK_ATTEMPTS):
+            # The host is resolved again, since its addresses may have changed since the request.
+            if not validWebhook(url):
+                logger.warning('Webhook %s is not allowed.', url)
+                return
+            try:
+                request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+                with _opener.open(request, timeout=WEBHOOK_TIMEOUT):
+                    return
+            except Exception as e:
+                logger.warning('Webhook %s failed (attempt %d): %s', url, attempt + 1, str(e))
+                sleep(2 ** attempt)
+    threading.Thread(target=post, daemon=True).start()
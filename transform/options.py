@@ -0,0 +1,103 @@
+from os import getenv
+from xml.etree import ElementTree
+import json
+
+from osgeo import gdal
+
+# Presets of downstream-friendly outputs: the source type, the output format and its creation options.
+# Presets whose driver is not available are ignored.
+DEFAULT_PRESETS = {
+    'cog': {'type': 'raster', 'format': 'COG'},
+    'flatgeobuf': {'type': 'vector', 'format': 'FlatGeobuf', 'layer_options': {'SPATIAL_INDEX': 'YES'}},
+    'geopackage': {'type': 'vector', 'format': 'GPKG', 'layer_options': {'SPATIAL_INDEX': 'YES'}},
+    'geoparquet': {'type': 'vector', 'format': 'Parquet', 'layer_options': {'COMPRESSION': 'SNAPPY', 'ROW_GROUP_SIZE': '65536'}},
+    'shapefile': {'type': 'vector', 'format': 'ESRI Shapefile', 'layer_options': {'SPATIAL_INDEX': 'YES', 'ENCODING': 'UTF-8'}},
+}
+# A JSON file with additional presets (or overriding the default ones), in the form of DEFAULT_PRESETS.
+PRESETS_FILE = getenv('TRANSFORM_PRESETS')
+
+def presets():
+    """The presets of this server whose driver is available.
+    Returns:
+        (dict) The presets, by name.
+    """
+    available = dict(DEFAULT_PRESETS)
+    if PRESETS_FILE:
+        with open(PRESETS_FILE) as handle:
+            available.update(json.load(handle))
+    return {name: preset for name, preset in available.items() if gdal.GetDriverByName(preset['format']) is not None}
+
+def parseOptions(value):
+    """Parses driver options given by the user or in the environment.
+    Parameters:
+        value (string): A JSON object ({"KEY": "VALUE", ...}), or comma-separated KEY=VALUE pairs.
+    Returns:
+        (dict) The options, with upper case keys.
+    Raises:
+        ValueError: If the options are malformed.
+    """
+    value = value.strip()
+    if value.startswith('{'):
+        options = json.loads(value)
+        if not isinstance(options, dict):
+            raise ValueError('Options should be a JSON object.')
+    else:
+        options = {}
+        for pair in value.split(','):
+            key, separator, option = pair.strip().partition('=')
+            if separator == '' or key == '':
+                raise ValueError('Malformed option: %s' % (pair))
+            options[key] = option
+    return {str(key).strip().upper(): str(option) if not isinstance(option, bool) else ('YES' if option else 'NO') for key, option in options.items()}
+
+def optionList(driver, item=gdal.DMD_CREATIONOPTIONLIST):
+    """Reads the options supported by a driver.
+    Parameters:
+        driver (gdal.Driver): The driver.
+        item (string): The metadata item of the option list (e.g. DMD_CREATIONOPTIONLIST, DS_LAYER_CREATIONOPTIONLIST).
+    Returns:
+        (dict) The type and the allowed values (empty if any) of each option, by name.
+    """
+    xml = driver.GetMetadataItem(item)
+    if not xml:
+        return {}
+    options = {}
+    for option in ElementTree.fromstring(xml).iter('Option'):
+        options[option.get('name').upper()] = (option.get('type') or 'string', [value.text.upper() for value in option.iter('Value') if value.text])
+    return options
+
+def validateOptions(driver, options, item=gdal.DMD_CREATIONOPTIONLIST):
+    """Validates options against the option list of a driver.
+    Parameters:
+        driver (gdal.Driver): The driver.
+        options (dict): The options.
+        item (string): The metadata item of the option list.
+    Returns:
+        (list) The error messages; empty if the options are valid.
+    """
+    supported = optionList(driver, item)
+    errors = []
+    for key, value in options.items():
+        if key not in supported:
+            errors.append("Option %s is not supported by driver %s" % (key, driver.GetDescription()))
+            continue
+        type, values = supported[key]
+        if type == 'string-select' and len(values) > 0 and value.upper() not in values:
+            errors.append("Option %s should be one of: %s" % (key, ', '.join(values)))
+        elif type == 'int':
+            try:
+                int(value)
+            except ValueError:
+                errors.append("Option %s should be an integer" % (key))
+        elif type == 'float':
+            try:
+                float(value)
+            except ValueError:
+                errors.append("Option %s should be a number" % (key))
+        elif type == 'boolean' and value.upper() not in ['YES', 'NO', 'ON', 'OFF', 'TRUE', 'FALSE', '1', '0']:
+            errors.append("Option %s should be a boolean (YES or NO)" % (key))
+    return errors
+
+def formatOptions(options):
+    """Forms the list of KEY=VALUE strings passed to GDAL."""
+    return ['%s=%s' % (key, value) for key, value in (options or {}).items()]
@@ -0,0 +1,260 @@
+from os import path, listdir, getenv, walk, cpu_count
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from logging import getLogger
+from time import perf_counter, time
+from osgeo import gdal
+import tarfile
+import zipfile
+import zlib
+
+from . import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The supported packaging codecs, with the extension of the resulting archive and its mime type.
+CODECS = {
+    'tar': ('.tar', 'application/x-tar'),
+    'gzip': ('.tar.gz', 'application/tar+gzip'),
+    'pgzip': ('.tar.gz', 'application/tar+gzip'),
+    'zstd': ('.tar.zst', 'application/zstd'),
+    'zip': ('.zip', 'application/zip'),
+}
+# The valid compression levels and the default level for each codec.
+LEVELS = {
+    'tar': (0, 0, 0),
+    'gzip': (0, 9, 9),
+    'pgzip': (0, 9, 6),
+    'zstd': (1, 22, 3),
+    'zip': (0, 9, 6),
+}
+# The level of each codec used to store (rather than compress) files that are already compressed; zstd has no
+# such level, so its fastest (negative) level is used, which writes raw blocks for incompressible data.
+STORE_LEVELS = {
+    'tar': 0,
+    'gzip': 0,
+    'pgzip': 0,
+    'zstd': -100,
+    'zip': 0,
+}
+# Server defaults.
+CODEC = getenv('PACKAGING_CODEC') or 'gzip'
+LEVEL = int(getenv('PACKAGING_LEVEL')) if getenv('PACKAGING_LEVEL') else None
+THREADS = int(getenv('PACKAGING_THREADS') or cpu_count() or 1)
+# Share of the bytes (0 to 1) that should be already compressed for a tar-based archive to be stored.
+STORE_RATIO = float(getenv('PACKAGING_STORE_RATIO') or 0.9)
+# Size of each independently compressed block, for multithreaded gzip.
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# File extensions of formats that are already compressed.
+COMPRESSED_EXTENSIONS = ['.zip', '.gz', '.tgz', '.zst', '.bz2', '.xz', '.7z', '.png', '.jpg', '.jpeg', '.jp2', '.webp', '.gif', '.parquet', '.mbtiles', '.pmtiles', '.kmz', '.shz']
+
+logger = getLogger(__name__)
+
+def available():
+    """Lists the codecs available in this installation.
+    Returns:
+        (list) The names of the available codecs.
+    """
+    return [codec for codec in CODECS.keys() if codec != 'zstd' or zstandard is not None]
+
+def extension(codec=None):
+    """Returns the extension of the archive created by codec (e.g. '.tar.gz')."""
+    return CODECS[codec or CODEC][0]
+
+def mimetype(filename):
+    """Returns the mime type of an archive, determined by its extension."""
+    for ext, mime in CODECS.values():
+        if filename.endswith(ext):
+            return mime
+    return 'application/octet-stream'
+
+def isCompressed(filename):
+    """Checks whether a file is already compressed, so that it is not worth compressing it again.
+    Parameters:
+        filename (string): Full path of the file.
+    Returns:
+        (bool) True if the file is compressed.
+    """
+    ext = path.splitext(filename)[1].lower()
+    if ext in COMPRESSED_EXTENSIONS:
+        return True
+    if ext in ['.tif', '.tiff']:
+        try:
+            ds = gdal.Open(filename)
+        except RuntimeError:
+            return False
+        compression = ds.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') if ds is not None else None
+        ds = None
+        return compression is not None and compression.upper() != 'NONE'
+    return False
+
+def _files(src):
+    """Lists (recursively) the files inside src, relative to src."""
+    files = []
+    for root, dirs, filenames in walk(src):
+        for filename in filenames:
+            files.append(path.relpath(path.join(root, filename), src))
+    return sorted(files)
+
+class BlockGzipWriter(object):
+    """A write-only file object compressing its input in independent gzip members, with multiple threads.
+    The concatenation of gzip members is a valid gzip file, readable by any gzip implementation.
+    """
+
+    def __init__(self, fileobj, level, threads=None, block_size=BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads or THREADS
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.pool = ThreadPoolExecutor(max_workers=self.threads)
+
+    @staticmethod
+    def _compress(block, level):
+        """Compresses block into a complete gzip member (zlib releases the GIL while compressing)."""
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(block) + compressor.flush()
+
+    def _drain(self, limit):
+        """Writes completed blocks in order, until at most limit blocks are pending."""
+        while len(self.pending) > limit:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self.pending.append(self.pool.submit(self._compress, block, self.level))
+            self._drain(2 * self.threads)
+        return len(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        """Discards the pending blocks and stops the threads, e.g. when the archive has failed."""
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.buffer = bytearray()
+        self.pool.shutdown()
+
+    def close(self):
+        if len(self.buffer) > 0 or len(self.pending) == 0:
+            self.pending.append(self.pool.submit(self._compress, bytes(self.buffer), self.level))
+            self.buffer = bytearray()
+        self._drain(0)
+        self.pool.shutdown()
+
+def pack(src, codec=None, level=None):
+    """Packs the contents of directory src into a single archive.
+    Files that are already compressed (e.g. compressed GeoTIFF) are stored instead of being compressed again: each
+    one separately with zip; with the tar-based codecs, which compress the whole stream at a single level, when
+    they make up at least STORE_RATIO of the bytes (e.g. a compressed GeoTIFF along with its small sidecar files).
+    The timing and sizes of each packaging are logged and recorded in the metrics, in order to tune the defaults.
+    Parameters:
+        src (string): Full path of the directory.
+        codec (string): One of tar, gzip, pgzip (multithreaded gzip), zstd, zip. If None, PACKAGING_CODEC is used.
+        level (int): The compression level. If None, PACKAGING_LEVEL or the codec default is used.
+    Returns:
+        (string) Full path of the archive, i.e. src followed by the codec extension.
+    """
+    codec = codec or CODEC
+    if codec not in available():
+        raise Exception('Packaging codec %s is not available.' % (codec))
+    minimum, maximum, default = LEVELS[codec]
+    if level is None:
+        level = LEVEL if LEVEL is not None and minimum <= LEVEL <= maximum else default
+    files = _files(src)
+    compressed = [isCompressed(path.join(src, file)) for file in files]
+    sizes = [path.getsize(path.join(src, file)) for file in files]
+    size = sum(sizes)
+    compressed_size = sum(file_size for file_size, is_compressed in zip(sizes, compressed) if is_compressed)
+    if codec == 'zip':
+        store = len(files) > 0 and all(compressed)
+    else:
+        store = len(files) > 0 and any(compressed) and compressed_size >= STORE_RATIO * size
+    if store:
+        level = STORE_LEVELS[codec]
+    result = src + extension(codec)
+
+    start = perf_counter()
+    if codec == 'zip':
+        with zipfile.ZipFile(result, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=level) as handle:
+            for file, is_compressed in zip(files, compressed):
+                compress_type = zipfile.ZIP_STORED if is_compressed else zipfile.ZIP_DEFLATED
+                handle.write(path.join(src, file), arcname=file, compress_type=compress_type)
+    elif codec == 'tar':
+        with tarfile.open(result, "w") as tar:
+            for file in listdir(src):
+                tar.add(path.join(src, file), arcname=file)
+    elif codec == 'gzip':
+        with tarfile.open(result, "w:gz", compresslevel=level) as tar:
+            for file in listdir(src):
+                tar.add(path.join(src, file), arcname=file)
+    elif codec == 'pgzip':
+        with open(result, 'wb') as handle:
+            with BlockGzipWriter(handle, level) as writer:
+                with tarfile.open(fileobj=writer, mode="w|") as tar:
+                    for file in listdir(src):
+                        tar.add(path.join(src, file), arcname=file)
+    elif codec == 'zstd':
+        with open(result, 'wb') as handle:
+            compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+            with compressor.stream_writer(handle) as writer:
+                with tarfile.open(fileobj=writer, mode="w|") as tar:
+                    for file in listdir(src):
+                        tar.add(path.join(src, file), arcname=file)
+    elapsed = perf_counter() - start
+
+    packed = path.getsize(result)
+    logger.info('Packaging: codec=%s, level=%s, stored=%s, size=%s, packed=%s, time=%.3fs, throughput=%.1fMB/s',
+        codec, level, store, size, packed, elapsed, size / (1024 * 1024) / elapsed if elapsed > 0 else 0)
+    labels = {'codec': codec, 'stored': str(store).lower()}
+    metrics.PACKAGING_DURATION.labels(**labels).observe(elapsed)
+    metrics.PACKAGING_INPUT.labels(**labels).observe(size)
+    metrics.PACKAGING_OUTPUT.labels(**labels).observe(packed)
+
+    return result
+
+def streamTar(members, chunk_size=1024 * 1024):
+    """Streams an (uncompressed) tar archive of files, without writing it to disk or holding a whole file in memory.
+    Parameters:
+        members (list): A (name in the archive, full path of the file) tuple for each file; instead of a full path,
+            the content of a file may be given as bytes.
+        chunk_size (int): Size of the chunks read from the files.
+    Returns:
+        (generator) The chunks of the archive.
+    """
+    for name, member in members:
+        info = tarfile.TarInfo(name)
+        info.mode = 0o644
+        if isinstance(member, bytes):
+            info.size = len(member)
+            info.mtime = time()
+        else:
+            info.size = path.getsize(member)
+            info.mtime = path.getmtime(member)
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        if isinstance(member, bytes):
+            yield member
+        else:
+            with open(member, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(chunk_size), b''):
+                    yield chunk
+        if info.size % tarfile.BLOCKSIZE > 0:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+    # The end of the archive: two empty blocks.
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
@@ -0,0 +1,68 @@
+from os import getenv, path, makedirs
+from contextlib import contextmanager
+from io import StringIO
+import cProfile
+import pstats
+import hmac
+
+from osgeo import gdal
+
+# The token expected in the X-Admin-Token header of administrative requests; if not set, they are disabled.
+ADMIN_TOKEN = getenv('ADMIN_TOKEN')
+# Number of functions listed in a profile report.
+PROFILE_STATS_LINES = int(getenv('PROFILE_STATS_LINES') or 50)
+
+def authorized(request):
+    """Checks whether a request carries the admin token."""
+    token = request.headers.get('X-Admin-Token')
+    return ADMIN_TOKEN is not None and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def profileDir():
+    """The directory (inside OUTPUT_DIR) where profiles are stored."""
+    return path.join(getenv('OUTPUT_DIR'), '.profiles')
+
+@contextmanager
+def profiled(ticket):
+    """Profiles the enclosed code with cProfile, and captures the GDAL debug messages of the current thread.
+    The profile is saved as <ticket>.prof and the GDAL trace as <ticket>.log, inside profileDir().
+    Parameters:
+        ticket (string): The ticket of the profiled job.
+    """
+    makedirs(profileDir(), exist_ok=True)
+    messages = []
+    def handler(level, number, message):
+        messages.append('%d %d %s' % (level, number, message))
+    gdal.SetThreadLocalConfigOption('CPL_DEBUG', 'ON')
+    gdal.PushErrorHandler(handler)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        gdal.PopErrorHandler()
+        gdal.SetThreadLocalConfigOption('CPL_DEBUG', None)
+        profile.dump_stats(path.join(profileDir(), ticket + '.prof'))
+        with open(path.join(profileDir(), ticket + '.log'), 'w') as handle:
+            handle.write('\n'.join(messages))
+
+def report(ticket):
+    """Reads the profile of a ticket.
+    Parameters:
+        ticket (string): The ticket.
+    Returns:
+        (dict) The most expensive functions by cumulative time ('stats') and the GDAL trace ('trace'),
+            or None if the ticket was not profiled, or its profile has not been (completely) written yet.
+    """
+    filename = path.join(profileDir(), ticket + '.prof')
+    trace = path.join(profileDir(), ticket + '.log')
+    # The trace is written after the profile, once the job has completed.
+    if not path.isfile(filename) or not path.isfile(trace):
+        return None
+    stream = StringIO()
+    try:
+        pstats.Stats(filename, stream=stream).sort_stats('cumulative').print_stats(PROFILE_STATS_LINES)
+        with open(trace) as handle:
+            return {'stats': stream.getvalue(), 'trace': handle.read()}
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
@@ -0,0 +1,112 @@
+from os import getenv
+from time import monotonic
+from logging import getLogger
+import threading
+
+# Minimum time (in seconds) between two progress reports of a job.
+PROGRESS_INTERVAL = float(getenv('PROGRESS_INTERVAL') or 2)
+
+logger = getLogger(__name__)
+
+class Progress(object):
+    """The progress of a job, reported at a throttled rate.
+    A job goes through successive stages (e.g. transforming, packaging), each one covering a range of the
+    overall percentage. A stage consists of a number of equally weighted tasks (e.g. the layers or the rasters
+    of the source), which may run concurrently; each task reports the fraction completed, usually through a
+    GDAL progress callback. The time spent in each stage is recorded in timings.
+    """
+
+    def __init__(self, report, interval=None):
+        """
+        Parameters:
+            report (function): Called with the percentage, the stage and the estimated remaining seconds
+                (None if unknown); at most once every interval seconds, and whenever the stage changes.
+                If None, progress is not reported, only timed.
+            interval (float): Minimum seconds between reports. If None, PROGRESS_INTERVAL is used.
+        """
+        self.report = report
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.lock = threading.Lock()
+        self.started = monotonic()
+        self.reported = 0
+        self.name = None
+        self.start = 0.0
+        self.end = 0.0
+        self.done = [0.0]
+        self.timings = {}
+        self.stage_started = self.started
+
+    def stage(self, name, start, end, tasks=1):
+        """Enters a new stage.
+        Parameters:
+            name (string): The name of the stage.
+            start (float): The overall percentage at the start of the stage.
+            end (float): The overall percentage at the end of the stage.
+            tasks (int): The number of tasks of the stage.
+        """
+        with self.lock:
+            self._closeStage()
+            self.name = name
+            self.start = start
+            self.end = end
+            self.done = [0.0] * max(tasks, 1)
+        self.flush()
+
+    def _closeStage(self):
+        """Adds the time spent in the current stage to its timing."""
+        now = monotonic()
+        if self.name is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0) + now - self.stage_started
+        self.stage_started = now
+
+    def finish(self):
+        """Ends the last stage.
+        Returns:
+            (dict) The seconds spent in each stage.
+        """
+        with self.lock:
+            self._closeStage()
+            self.name = None
+        return {name: round(seconds, 3) for name, seconds in self.timings.items()}
+
+    def update(self, task, fraction):
+        """Records the fraction (0-1) completed of a task of the current stage."""
+        self.done[task] = min(max(fraction, 0.0), 1.0)
+        if monotonic() - self.reported >= self.interval:
+            self.flush()
+
+    def callback(self, task=0):
+        """Creates a GDAL progress callback for a task of the current stage.
+        Parameters:
+            task (int): The index of the task.
+        Returns:
+            (function) The callback, to be passed to GDAL functions (e.g. gdal.Warp) as callback.
+        """
+        def callback(complete, message, data):
+            self.update(task, complete)
+            return 1
+        return callback
+
+    def percent(self):
+        """The overall percentage completed."""
+        return self.start + (self.end - self.start) * sum(self.done) / len(self.done)
+
+    def eta(self, percent):
+        """Estimates the remaining seconds, assuming a constant rate of progress."""
+        if percent <= 0:
+            return None
+        return (monotonic() - self.started) * (100 - percent) / percent
+
+    def flush(self):
+        """Reports the current progress."""
+        if self.report is None:
+            return
+        with self.lock:
+            self.reported = monotonic()
+            percent = self.percent()
+            name = self.name
+        eta = self.eta(percent)
+        try:
+            self.report(round(percent, 1), name, round(eta) if eta is not None else None)
+        except Exception as e:
+            logger.warning('Failed to report progress: %s', str(e))
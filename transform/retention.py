@@ -0,0 +1,205 @@
+from os import getenv, path, remove, rmdir, listdir, walk, stat
+from shutil import rmtree
+from datetime import datetime, timedelta
+from time import time, sleep
+from logging import getLogger
+import threading
+import json
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import db
+from . import metrics
+from .jobs import JOB_TIMEOUT
+
+# Maximum age (in seconds, since the request) of a result; 0 keeps results regardless of their age.
+RESULT_MAX_AGE = int(getenv('RESULT_MAX_AGE') or 7 * 24 * 3600)
+# Results not accessed (or, if never downloaded, requested) for this many seconds are evicted; 0 disables.
+RESULT_MAX_IDLE = int(getenv('RESULT_MAX_IDLE') or 2 * 24 * 3600)
+# Maximum total size (in MB) of the results; the least recently accessed are evicted first. 0 disables.
+RESULT_MAX_SIZE = int(getenv('RESULT_MAX_SIZE') or 0)
+# Working directories of completed (or unknown) tickets not modified for this many seconds are removed.
+TEMP_MAX_AGE = int(getenv('TEMP_MAX_AGE') or JOB_TIMEOUT)
+# Seconds between two sweeps of the retention service; 0 disables the service (sweeps may still run with
+# `flask retention-sweep`).
+RETENTION_INTERVAL = int(getenv('RETENTION_INTERVAL') or 600)
+
+logger = getLogger(__name__)
+
+def evictResult(dbc, row, reason):
+    """Removes the result file of a ticket and marks the ticket as evicted.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        row (sqlite3.Row): The ticket (ticket and result columns).
+        reason (string): The reason of the eviction (age, idle, quota or missing).
+    """
+    filepath = path.join(getenv('OUTPUT_DIR'), row['result'])
+    try:
+        remove(filepath)
+    except OSError:
+        pass
+    try:
+        # The date directory, once all its results are evicted.
+        rmdir(path.dirname(filepath))
+    except OSError:
+        pass
+    dbc.execute('UPDATE tickets SET evicted_time=CURRENT_TIMESTAMP WHERE ticket=?;', [row['ticket']])
+    metrics.EVICTIONS.labels(reason=reason).inc()
+
+def evictResults(dbc, max_age=None, max_idle=None, max_size=None):
+    """Evicts the results older than max_age or idle for more than max_idle, and then the least recently
+    accessed ones until their total size is at most max_size. Results whose file has been removed are marked
+    as evicted as well.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        max_age (int): Maximum age in seconds; 0 disables. If None, RESULT_MAX_AGE is used.
+        max_idle (int): Maximum idle time in seconds; 0 disables. If None, RESULT_MAX_IDLE is used.
+        max_size (int): Maximum total size in MB; 0 disables. If None, RESULT_MAX_SIZE is used.
+    Returns:
+        (int) The number of evicted results.
+    """
+    max_age = max_age if max_age is not None else RESULT_MAX_AGE
+    max_idle = max_idle if max_idle is not None else RESULT_MAX_IDLE
+    max_size = (max_size if max_size is not None else RESULT_MAX_SIZE) * 1024 * 1024
+    now = datetime.utcnow()
+    # The timestamps are selected as declared columns, so that they are parsed into datetimes; a computed column
+    # (e.g. COALESCE) would be returned as a string.
+    rows = dbc.execute('SELECT ticket, result, result_size, requested_time, accessed_time FROM tickets WHERE result IS NOT NULL AND evicted_time IS NULL ORDER BY COALESCE(accessed_time, requested_time);').fetchall()
+    kept = []
+    evicted = 0
+    for row in rows:
+        if max_age > 0 and row['requested_time'] < now - timedelta(seconds=max_age):
+            reason = 'age'
+        elif max_idle > 0 and (row['accessed_time'] or row['requested_time']) < now - timedelta(seconds=max_idle):
+            reason = 'idle'
+        elif not path.isfile(path.join(getenv('OUTPUT_DIR'), row['result'])):
+            reason = 'missing'
+        else:
+            kept.append(row)
+            continue
+        evictResult(dbc, row, reason)
+        evicted += 1
+    if max_size > 0:
+        sizes = []
+        for row in kept:
+            size = row['result_size']
+            if size is None:
+                # Results of tickets completed before their size was recorded.
+                size = path.getsize(path.join(getenv('OUTPUT_DIR'), row['result']))
+                dbc.execute('UPDATE tickets SET result_size=? WHERE ticket=?;', [size, row['ticket']])
+            sizes.append(size)
+        total = sum(sizes)
+        for row, size in zip(kept, sizes):
+            if total <= max_size:
+                break
+            evictResult(dbc, row, 'quota')
+            evicted += 1
+            total -= size
+    dbc.commit()
+    return evicted
+
+def lastModified(directory):
+    """The latest modification time of directory and the files inside it."""
+    latest = stat(directory).st_mtime
+    for root, dirs, filenames in walk(directory):
+        for name in dirs + filenames:
+            try:
+                latest = max(latest, stat(path.join(root, name)).st_mtime)
+            except OSError:
+                pass
+    return latest
+
+def reapWorkingPaths(dbc, tempdir, max_age=None):
+    """Removes the working directories (named after their ticket) left behind by completed, failed or crashed jobs.
+    The directory of a completed or unknown ticket is removed once it has not been modified for max_age seconds.
+    A pending ticket without a queued job, whose progress has not been updated for JOB_TIMEOUT seconds, has been
+    abandoned (e.g. its process crashed): it fails, and its directory is removed.
+    Parameters:
+        dbc (sqlite3.Connection): The database connection.
+        tempdir (string): The directory of the working paths.
+        max_age (int): Minimum seconds since the last modification. If None, TEMP_MAX_AGE is used.
+    Returns:
+        (int) The number of removed directories.
+    """
+    max_age = max_age if max_age is not None else TEMP_MAX_AGE
+    if not path.isdir(tempdir):
+        return 0
+    oldest = datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT)
+    reaped = 0
+    for ticket in listdir(tempdir):
+        working_path = path.join(tempdir, ticket)
+        if not path.isdir(working_path):
+            continue
+        row = dbc.execute('SELECT status, requested_time, progress_time FROM tickets WHERE ticket=?;', [ticket]).fetchone()
+        if row is not None and row['status'] == 0:
+            if dbc.execute('SELECT id FROM jobs WHERE ticket=?;', [ticket]).fetchone() is not None:
+                continue
+            if max(row['requested_time'], row['progress_time'] or row['requested_time']) >= oldest:
+                continue
+            logger.warning('Ticket %s has been abandoned.', ticket)
+            dbc.execute("UPDATE tickets SET status=1, success=0, stage='failed', comment='Job abandoned.' WHERE ticket=? AND status=0;", [ticket])
+            dbc.commit()
+        elif time() - lastModified(working_path) < max_age:
+            continue
+        rmtree(working_path, ignore_errors=True)
+        reaped += 1
+    return reaped
+
+def claimSweep(dbc):
+    """Claims the next sweep among the processes of the service, at most one every RETENTION_INTERVAL seconds."""
+    now = int(time())
+    dbc.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('retention_sweep', 0);")
+    cursor = dbc.execute("UPDATE counters SET value=? WHERE name='retention_sweep' AND value<=?;", [now, now - RETENTION_INTERVAL])
+    dbc.commit()
+    return cursor.rowcount == 1
+
+def sweep(dbc, tempdir):
+    """Evicts results and reaps working directories.
+    Returns:
+        (dict) The number of evicted results and removed working directories.
+    """
+    result = {'evicted': evictResults(dbc), 'reaped': reapWorkingPaths(dbc, tempdir)}
+    logger.info('Retention sweep: evicted %d results, removed %d working directories.', result['evicted'], result['reaped'])
+    return result
+
+def run(app, tempdir):
+    """The loop of the retention service."""
+    while True:
+        sleep(RETENTION_INTERVAL)
+        try:
+            with app.app_context():
+                dbc = db.get_db()
+                if claimSweep(dbc):
+                    sweep(dbc, tempdir)
+        except Exception as e:
+            logger.exception('Retention sweep failed: %s', str(e))
+
+@click.command('retention-sweep')
+@with_appcontext
+def retention_sweep_command():
+    """Evict expired results and remove abandoned working directories."""
+    click.echo(json.dumps(sweep(db.get_db(), current_app.config['WORKING_DIR'])))
+
+def start(app):
+    """Starts the retention service in a background thread of this process, unless RETENTION_INTERVAL is 0.
+    Parameters:
+        app (Flask): The application.
+    """
+    if RETENTION_INTERVAL > 0:
+        threading.Thread(target=run, args=(app, app.config['WORKING_DIR']), daemon=True, name='retention').start()
+
+def init_app(app, tempdir):
+    """Registers the retention command, and starts the retention service along with the first request; the
+    standalone workers (`flask transform-worker`) start it as well.
+    Parameters:
+        app (Flask): The application.
+        tempdir (string): The directory of the working paths of the jobs.
+    """
+    app.config['WORKING_DIR'] = tempdir
+    app.cli.add_command(retention_sweep_command)
+    if RETENTION_INTERVAL > 0:
+        @app.before_first_request
+        def startRetention():
+            start(app)
@@ -1,4 +1,9 @@
 DROP TABLE IF EXISTS tickets;
+DROP TABLE IF EXISTS cache;
+DROP TABLE IF EXISTS counters;
+DROP TABLE IF EXISTS jobs;
+DROP TABLE IF EXISTS reservations;
+DROP TABLE IF EXISTS batches;
 
 CREATE TABLE tickets (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -9,8 +14,95 @@ CREATE TABLE tickets (
   requested_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   result text,
   filesize INTEGER,
-  comment text
+  comment text,
+  cache_key TEXT,
+  webhook TEXT,
+  progress REAL DEFAULT 0,
+  stage TEXT DEFAULT 'queued',
+  eta INTEGER,
+  progress_time TIMESTAMP,
+  queue_time REAL,
+  upload_time REAL,
+  extract_time REAL,
+  open_time REAL,
+  transform_time REAL,
+  packaging_time REAL,
+  move_time REAL,
+  wait_time REAL,
+  memory_estimate INTEGER,
+  peak_memory INTEGER,
+  output_size INTEGER,
+  result_size INTEGER,
+  accessed_time TIMESTAMP,
+  evicted_time TIMESTAMP,
+  batch TEXT
 );
 
 CREATE UNIQUE INDEX idx_tickets_ticket
 ON tickets (ticket);
+
+CREATE INDEX idx_tickets_status
+ON tickets (status, requested_time);
+
+CREATE INDEX idx_tickets_requested_time
+ON tickets (requested_time);
+
+CREATE INDEX idx_tickets_batch
+ON tickets (batch);
+
+CREATE TABLE cache (
+  key TEXT PRIMARY KEY,
+  result TEXT NOT NULL,
+  size INTEGER,
+  created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  accessed_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  hits INTEGER DEFAULT 0
+);
+
+CREATE INDEX idx_cache_accessed_time
+ON cache (accessed_time);
+
+CREATE TABLE counters (
+  name TEXT PRIMARY KEY,
+  value INTEGER DEFAULT 0
+);
+
+CREATE TABLE jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ticket TEXT NOT NULL,
+  src_path TEXT NOT NULL,
+  working_path TEXT NOT NULL,
+  date TEXT NOT NULL,
+  gdal_params TEXT NOT NULL,
+  state TEXT DEFAULT 'queued',
+  worker TEXT,
+  attempts INTEGER DEFAULT 0,
+  profile INTEGER DEFAULT 0,
+  created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  claimed_time TIMESTAMP
+);
+
+CREATE INDEX idx_jobs_state
+ON jobs (state, id);
+
+CREATE TABLE reservations (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ticket TEXT,
+  host TEXT NOT NULL,
+  pid INTEGER NOT NULL,
+  memory INTEGER NOT NULL,
+  created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_reservations_host
+ON reservations (host, pid);
+
+CREATE TABLE batches (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  batch TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  requested_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX idx_batches_batch
+ON batches (batch);